@@ -1,6 +1,8 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from contextlib import asynccontextmanager
 import sys
 import os
@@ -13,19 +15,41 @@ if BACKEND_DIR not in sys.path:
 
 from shared.config import settings
 from shared.database import get_db, init_db
-from shared.auth import create_access_token, verify_password, get_current_user
-from shared.middleware import setup_cors, setup_gzip, setup_exception_handlers, log_requests_middleware
+from shared.auth import (
+    issue_tokens, oauth2_scheme, password_hasher, revoke_access_token, revoke_refresh_token,
+    rotate_refresh_token, get_current_user,
+)
+from shared.middleware import setup_cors, setup_etags, setup_compression, setup_exception_handlers, log_requests_middleware
 from shared.models import User
-from shared.schemas import TokenResponse, UserResponse, MessageResponse
-import httpx
+from shared.schemas import TokenResponse, UserResponse, MessageResponse, RefreshRequest, LogoutRequest, BatchRequest
+from shared.upstream import upstreams, proxy_request
+from shared.admission import admission, setup_admission
+from shared.cache import response_cache
+from shared.revocation import revoked_tokens
+from shared.singleflight import inflight_gets
+from shared.monolith import mount_local_services, local_services_lifespan
+from shared.dashboard import fetch_dashboard_summary
+from shared.batch import run_batch
+from shared.lastgood import last_good
+from shared.compression import supported_encodings
+from shared.hub import event_hub, parse_last_event_id, parse_topics
 from datetime import timedelta
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup"""
+    """Initialize database, mounted services and upstream connection pools on startup"""
     init_db()
-    yield
-    # Cleanup on shutdown (if needed)
+    async with local_services_lifespan(local_services):
+        await upstreams.start()
+        await response_cache.start()
+        await revoked_tokens.start()
+        await event_hub.start()
+        yield
+        await event_hub.aclose()
+        await revoked_tokens.aclose()
+        await response_cache.aclose()
+        await upstreams.aclose()
+        password_hasher.shutdown()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -35,12 +59,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Setup middleware
+# Setup middleware (admission first, so CORS wraps shed responses)
+setup_admission(app)
 setup_cors(app, settings.CORS_ORIGINS)
-setup_gzip(app)
+setup_etags(app)
+setup_compression(app)
 setup_exception_handlers(app)
 app.middleware("http")(log_requests_middleware)
 
+# Services in "local" mode run in-process; mounted ahead of the proxy routes
+local_services = mount_local_services(app)
+
 
 @app.get("/")
 async def root():
@@ -55,7 +84,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
+    return {"status": "healthy", "circuits": upstreams.circuit_states()}
 
 
 @app.get("/api/health")
@@ -64,19 +93,36 @@ async def api_health_check():
     return {"status": "healthy", "service": "api-gateway"}
 
 
+@app.get("/health/upstreams")
+async def upstream_health():
+    """Connection pool utilisation per upstream service"""
+    return {
+        "upstreams": upstreams.stats(),
+        "cache": response_cache.stats(),
+        "coalescing": inflight_gets.stats(),
+        "password_hashing": password_hasher.stats(),
+        "revocations": revoked_tokens.stats(),
+        "admission": admission.stats(),
+        "last_good": last_good.stats(),
+        "events": event_hub.stats(),
+        "compression": supported_encodings(),
+    }
+
+
 # Authentication endpoints
 @app.post("/api/auth/login", response_model=TokenResponse)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Login endpoint"""
     # Find user by email or employee_id
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         (User.email == form_data.username) | (User.employee_id == form_data.username)
-    ).first()
+    ))
     
-    if not user or not verify_password(form_data.password, user.password_hash):
+    # Hash on the worker pool so a login storm does not stall proxied traffic
+    if not user or not await password_hasher.verify(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -88,14 +134,25 @@ async def login(
             detail="User account is inactive"
         )
     
-    # Create access token
-    access_token = create_access_token(
-        data={"sub": str(user.id), "email": user.email}
-    )
-    
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **issue_tokens(user.id, user.email),
+        "user": UserResponse.from_orm(user)
+    }
+
+
+@app.post("/api/auth/refresh", response_model=TokenResponse)
+async def refresh(body: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """Swap a refresh token for a new token pair without another password check"""
+    payload = await rotate_refresh_token(body.refresh_token)
+    user = await db.get(User, payload["sub"])
+    if not user or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User account is inactive"
+        )
+
+    return {
+        **issue_tokens(user.id, user.email, family=payload["fam"]),
         "user": UserResponse.from_orm(user)
     }
 
@@ -103,15 +160,15 @@ async def login(
 @app.get("/api/auth/me", response_model=UserResponse)
 async def get_current_user_info(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user information"""
     user_id = current_user.get("id")
     user = None
     if user_id:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
     if not user and current_user.get("email"):
-        user = db.query(User).filter(User.email == current_user["email"]).first()
+        user = await db.scalar(select(User).where(User.email == current_user["email"]))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -120,90 +177,109 @@ async def get_current_user_info(
 
 
 @app.post("/api/auth/logout")
-async def logout(current_user: dict = Depends(get_current_user)):
-    """Logout endpoint"""
-    # In a production system, you might want to blacklist the token
+async def logout(body: Optional[LogoutRequest] = None, token: Optional[str] = Depends(oauth2_scheme)):
+    """Logout endpoint: revokes the access token and the refresh token's family"""
+    if token:
+        await revoke_access_token(token)
+    if body and body.refresh_token:
+        await revoke_refresh_token(body.refresh_token)
     return MessageResponse(message="Logged out successfully")
 
 
 # Proxy endpoints to microservices
 from fastapi import Request
-from fastapi.responses import JSONResponse, Response
-
-async def proxy_request(request: Request, service_url: str, path: str):
-    """Proxy request to microservice"""
-    async with httpx.AsyncClient() as client:
-        url = f"{service_url}{path}"
-        headers = dict(request.headers)
-        headers.pop('host', None)
-
-        try:
-            response = await client.request(
-                method=request.method,
-                url=url,
-                headers=headers,
-                content=await request.body(),
-                params=request.query_params,
-                timeout=10.0,
-            )
-            content_type = response.headers.get("content-type", "")
-            if "application/json" in content_type:
-                return JSONResponse(content=response.json(), status_code=response.status_code)
-            return Response(content=response.text, status_code=response.status_code, media_type=content_type or "text/plain")
-        except httpx.RequestError as exc:
-            raise HTTPException(
-                status_code=status.HTTP_502_BAD_GATEWAY,
-                detail=f"Upstream service unavailable at {service_url}. Error: {exc}"
-            )
+from fastapi.responses import StreamingResponse
+
+
+# Live change events, in place of polling dashboard stats
+@app.get("/api/events")
+async def event_stream(
+    request: Request,
+    topics: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """Server-Sent Events for comma-separated topics, e.g. canteen.orders,vigilance.sos (all when omitted)"""
+    if not settings.EVENTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Event stream disabled")
+    last_event_id = parse_last_event_id(
+        request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    )
+    try:
+        subscriber = event_hub.subscribe(parse_topics(topics), last_event_id)
+    except OverflowError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many event subscribers",
+            headers={"Retry-After": "5"},
+        )
+    return StreamingResponse(
+        event_hub.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Aggregated dashboard across all services
+@app.get("/api/dashboard/summary")
+async def dashboard_summary(request: Request, current_user: dict = Depends(get_current_user)):
+    """Dashboard statistics from every service in one round trip"""
+    return await fetch_dashboard_summary(request, current_user, live_events=settings.EVENTS_ENABLED)
+
+
+# Several GETs for one page load in a single round trip
+@app.post("/api/batch")
+async def batch(request: Request, body: BatchRequest, current_user: dict = Depends(get_current_user)):
+    """Run up to BATCH_MAX_ITEMS GETs concurrently; per-item status, timing and body"""
+    return await run_batch(request, body, current_user)
 
 
 # Colony Maintenance Service routes
 @app.api_route("/api/colony/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def colony_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Colony Maintenance Service"""
-    return await proxy_request(request, settings.COLONY_SERVICE_URL, f"/{path}")
+    return await proxy_request(request, "colony", f"/{path}", current_user)
 
 
 # Guest House Service routes
 @app.api_route("/api/guesthouse/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def guesthouse_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Guest House Service"""
-    return await proxy_request(request, settings.GUESTHOUSE_SERVICE_URL, f"/{path}")
+    return await proxy_request(request, "guesthouse", f"/{path}", current_user)
 
 
 # Equipment Service routes
 @app.api_route("/api/equipment/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def equipment_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Equipment Service"""
-    return await proxy_request(request, settings.EQUIPMENT_SERVICE_URL, f"/{path}")
+    return await proxy_request(request, "equipment", f"/{path}", current_user)
 
 
 # Vigilance Service routes
 @app.api_route("/api/vigilance/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def vigilance_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Vigilance Service"""
-    return await proxy_request(request, settings.VIGILANCE_SERVICE_URL, f"/{path}")
+    return await proxy_request(request, "vigilance", f"/{path}", current_user)
 
 
 # Vehicle Service routes
 @app.api_route("/api/vehicle/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def vehicle_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Vehicle Service"""
-    return await proxy_request(request, settings.VEHICLE_SERVICE_URL, f"/{path}")
+    return await proxy_request(request, "vehicle", f"/{path}", current_user)
 
 
 # Visitor Service routes
 @app.api_route("/api/visitor/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def visitor_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Visitor Service"""
-    return await proxy_request(request, settings.VISITOR_SERVICE_URL, f"/{path}")
+    return await proxy_request(request, "visitor", f"/{path}", current_user)
 
 
 # Canteen Service routes
 @app.api_route("/api/canteen/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def canteen_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Canteen Service"""
-    return await proxy_request(request, settings.CANTEEN_SERVICE_URL, f"/{path}")
+    return await proxy_request(request, "canteen", f"/{path}", current_user)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+"""
+Batched GETs for multi-resource page loads.
+
+POST /api/batch takes up to BATCH_MAX_ITEMS sub-requests and runs them
+concurrently through the gateway's own routes, so each one is proxied,
+cached, coalesced, admitted and mounted in-process exactly as if it had been
+sent on its own. The caller's token is verified once for the batch; the
+sub-requests carry the signed identity header instead of the bearer token.
+"""
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+import asyncio
+import time
+
+import httpx
+from fastapi import HTTPException, Request, status
+
+from .auth import IDENTITY_HEADER, sign_identity
+from .config import settings
+from .schemas import BatchItem, BatchRequest
+
+# Gateway routes a batch may not contain: itself, streams, and auth flows
+_EXCLUDED_PREFIXES = ("/api/batch", "/api/events", "/api/auth/")
+
+# Request headers that describe the batch body or the caller's credentials
+_DROPPED_HEADERS = {"authorization", "content-length", "content-type", "accept-encoding", "host", IDENTITY_HEADER}
+
+# Sub-response headers worth passing back to the client
+_KEPT_HEADERS = ("content-type", "x-cache", "age", "x-last-good", "x-fallback", "retry-after", "etag")
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def _rejection(item: BatchItem) -> Optional[Dict[str, Any]]:
+    """Per-item error for a sub-request the batch will not run"""
+    if item.method.upper() not in ("GET", "HEAD"):
+        return {"status": status.HTTP_405_METHOD_NOT_ALLOWED, "body": {"detail": "Only GET and HEAD can be batched"}}
+    if not item.path.startswith("/api/") or item.path.startswith(_EXCLUDED_PREFIXES):
+        return {"status": status.HTTP_400_BAD_REQUEST, "body": {"detail": f"{item.path} cannot be batched"}}
+    return None
+
+
+def _body(response: httpx.Response) -> Any:
+    if not response.content:
+        return None
+    if "application/json" in response.headers.get("content-type", ""):
+        try:
+            return response.json()
+        except ValueError:
+            pass
+    return response.text
+
+
+async def run_batch(request: Request, batch: BatchRequest, current_user: dict) -> Dict[str, Any]:
+    """Run every sub-request and report status, timing and body per item, in request order"""
+    if len(batch.requests) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BATCH_MAX_ITEMS} requests per batch",
+        )
+
+    started = time.perf_counter()
+    headers = {key: value for key, value in request.headers.items() if key not in _DROPPED_HEADERS}
+    headers[IDENTITY_HEADER] = sign_identity(current_user)
+    # Bodies are embedded in JSON, so they are wanted unencoded
+    headers["accept-encoding"] = "identity"
+    limit = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    async def run(client: httpx.AsyncClient, index: int, item: BatchItem) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"id": item.id if item.id is not None else str(index)}
+        rejection = _rejection(item)
+        if rejection is not None:
+            return {**result, **rejection, "elapsed_ms": 0.0}
+
+        async with limit:
+            item_started = time.perf_counter()
+            url = item.path
+            if item.query:
+                url += ("&" if "?" in url else "?") + urlencode(item.query, doseq=True)
+            try:
+                response = await client.request(item.method.upper(), url, headers=headers)
+            except Exception as exc:
+                return {
+                    **result,
+                    "status": status.HTTP_502_BAD_GATEWAY,
+                    "elapsed_ms": _elapsed_ms(item_started),
+                    "body": {"detail": f"Sub-request failed: {exc}"},
+                }
+        return {
+            **result,
+            "status": response.status_code,
+            "elapsed_ms": _elapsed_ms(item_started),
+            "headers": {key: response.headers[key] for key in _KEPT_HEADERS if key in response.headers},
+            "body": _body(response),
+        }
+
+    # Straight back into this app: no network hop, same routes and middleware
+    transport = httpx.ASGITransport(app=request.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        responses = await asyncio.gather(*(run(client, index, item) for index, item in enumerate(batch.requests)))
+
+    return {"responses": responses, "elapsed_ms": _elapsed_ms(started)}
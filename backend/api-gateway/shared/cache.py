@@ -0,0 +1,290 @@
+"""
+Gateway response cache for idempotent GETs.
+
+Entries live in Redis when it is reachable and in a bounded in-process LRU
+otherwise. Every key is indexed under its service so a successful write to
+that service drops all of its cached reads.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+import fnmatch
+import logging
+import time
+
+from fastapi.responses import Response
+
+from .compression import compress
+from .config import settings
+from .etag import etag_matches
+from .pagination import NEXT_CURSOR_HEADER
+
+logger = logging.getLogger(__name__)
+
+# Versioned with the CachedResponse.dumps layout, so entries written by an
+# older gateway are never read back in the wrong shape
+KEY_PREFIX = "epos:cache:v2"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+def _redis():
+    """redis.asyncio, imported only once Redis is configured: it is slow to import"""
+    try:
+        import redis.asyncio as aioredis
+    except ImportError:  # redis is optional; the in-memory LRU is used instead
+        return None
+    return aioredis
+
+
+class CachedResponse:
+    """Body, media type, content-encoding, ETag and next-page cursor of a cached 200 response"""
+
+    def __init__(
+        self,
+        body: bytes,
+        media_type: str,
+        encoding: Optional[str] = None,
+        etag: Optional[str] = None,
+        next_cursor: Optional[str] = None,
+    ):
+        self.body = body
+        self.media_type = media_type
+        self.encoding = encoding
+        self.etag = etag
+        self.next_cursor = next_cursor
+
+    def dumps(self) -> bytes:
+        header = f"{self.media_type}\n{self.encoding or ''}\n{self.etag or ''}\n{self.next_cursor or ''}\n"
+        return header.encode() + self.body
+
+    @classmethod
+    def loads(cls, raw: bytes) -> "CachedResponse":
+        media_type, _, rest = raw.partition(b"\n")
+        encoding, _, rest = rest.partition(b"\n")
+        etag, _, rest = rest.partition(b"\n")
+        next_cursor, _, body = rest.partition(b"\n")
+        return cls(body, media_type.decode(), encoding.decode() or None, etag.decode() or None, next_cursor.decode() or None)
+
+    def encoded(self, encoding: Optional[str]) -> "CachedResponse":
+        """This entry compressed for a client, or as it is when too small to gain"""
+        if encoding is None or len(self.body) < settings.COMPRESSION_MIN_SIZE:
+            return self
+        return CachedResponse(compress(encoding, self.body), self.media_type, encoding, self.etag, self.next_cursor)
+
+    def to_response(self, cache_status: str, if_none_match: Optional[str] = None) -> Response:
+        headers = {"X-Cache": cache_status}
+        if self.next_cursor:
+            headers[NEXT_CURSOR_HEADER] = self.next_cursor
+        if self.etag:
+            headers["ETag"] = self.etag
+            # The client's copy is current: no body, whatever its encoding
+            if etag_matches(if_none_match, self.etag):
+                return Response(status_code=304, headers=headers)
+        if self.encoding:
+            # Already compressed: the compression middleware passes it through
+            headers.update({"Content-Encoding": self.encoding, "Vary": "Accept-Encoding"})
+        return Response(content=self.body, media_type=self.media_type, headers=headers)
+
+
+class MemoryBackend:
+    """Bounded LRU with per-entry expiry"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def generation(self, index: str) -> int:
+        return self._generations.get(index, 0)
+
+    async def set(self, key: str, value: bytes, ttl: int, index: str, generation: int) -> None:
+        if self._generations.get(index, 0) != generation:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, index: str) -> None:
+        self._generations[index] = self._generations.get(index, 0) + 1
+        prefix = f"{index}:"
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Redis entries with a set per service indexing its live keys"""
+
+    name = "redis"
+
+    def __init__(self, client):
+        self.client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def generation(self, index: str) -> int:
+        return int(await self.client.get(f"{index}:generation") or 0)
+
+    async def set(self, key: str, value: bytes, ttl: int, index: str, generation: int) -> None:
+        from redis.exceptions import WatchError
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            try:
+                # Aborted by EXEC if another worker invalidates in between
+                await pipe.watch(f"{index}:generation")
+                if int(await pipe.get(f"{index}:generation") or 0) != generation:
+                    return
+                pipe.multi()
+                pipe.set(key, value, ex=ttl)
+                pipe.sadd(f"{index}:keys", key)
+                await pipe.execute()
+            except WatchError:
+                return
+
+    async def invalidate(self, index: str) -> None:
+        await self.client.incr(f"{index}:generation")
+        keys = await self.client.smembers(f"{index}:keys")
+        await self.client.delete(f"{index}:keys", *keys)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class ResponseCache:
+    """Rule-driven GET cache shared by the gateway entry points"""
+
+    def __init__(self):
+        self.backend = MemoryBackend(settings.CACHE_MAX_ENTRIES)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def start(self) -> None:
+        """Switch to Redis when configured and reachable"""
+        if settings.CACHE_BACKEND != "redis":
+            return
+        aioredis = _redis()
+        if aioredis is None:
+            return
+        client = aioredis.from_url(settings.REDIS_URL, socket_connect_timeout=1)
+        try:
+            await client.ping()
+        except Exception as exc:
+            logger.warning(f"Redis unavailable at {settings.REDIS_URL}, using in-memory cache: {exc}")
+            await client.aclose()
+            return
+        self.backend = RedisBackend(client)
+
+    async def aclose(self) -> None:
+        await self.backend.close()
+        self.backend = MemoryBackend(settings.CACHE_MAX_ENTRIES)
+
+    def rule_for(self, service: str, path: str) -> Optional[Dict[str, Any]]:
+        """
+        First CACHE_RULES entry matching the service and path.
+
+        Rules also mark the shared reads that are coalesced in flight, so they
+        apply even when CACHE_ENABLED is off; get/set then do nothing.
+        """
+        for rule in settings.CACHE_RULES:
+            if fnmatch.fnmatchcase(service, rule["service"]) and fnmatch.fnmatchcase(path, rule["path"]):
+                return rule
+        return None
+
+    def key(self, service: str, path: str, query_items: list, user_id: Optional[str] = None) -> str:
+        """Normalised key: parameter order never splits entries"""
+        key = f"{KEY_PREFIX}:{service}:{path}?{urlencode(sorted(query_items))}"
+        if user_id is not None:
+            key += f"#user={user_id}"
+        return key
+
+    def variant(self, key: str, encoding: Optional[str]) -> str:
+        """Key of the copy compressed with an encoding, so hits skip compression"""
+        return key if encoding is None else f"{key}#enc={encoding}"
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        if not settings.CACHE_ENABLED:
+            return None
+        try:
+            raw = await self.backend.get(key)
+        except Exception as exc:
+            logger.warning(f"Cache read failed for {key}: {exc}")
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CachedResponse.loads(raw)
+
+    async def generation(self, service: str) -> Optional[int]:
+        """
+        The service's invalidation count, to read before fetching a response to cache.
+
+        None when it cannot be read; set() then stores nothing.
+        """
+        if not settings.CACHE_ENABLED:
+            return None
+        try:
+            return await self.backend.generation(f"{KEY_PREFIX}:{service}")
+        except Exception as exc:
+            logger.warning(f"Cache generation read failed for {service}: {exc}")
+            return None
+
+    async def set(
+        self, key: str, service: str, entry: CachedResponse, ttl: int, generation: Optional[int]
+    ) -> None:
+        """
+        Store a response unless the service was written to since `generation`.
+
+        A read that went upstream before a write can finish after that write's
+        invalidate(); storing its body would serve pre-write data for the TTL.
+        """
+        if not settings.CACHE_ENABLED or generation is None:
+            return
+        try:
+            await self.backend.set(key, entry.dumps(), ttl, f"{KEY_PREFIX}:{service}", generation)
+        except Exception as exc:
+            logger.warning(f"Cache write failed for {key}: {exc}")
+
+    async def invalidate(self, service: str) -> None:
+        """Drop every cached read for a service after a write to it"""
+        self.invalidations += 1
+        try:
+            await self.backend.invalidate(f"{KEY_PREFIX}:{service}")
+        except Exception as exc:
+            logger.warning(f"Cache invalidation failed for {service}: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "entries": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,160 @@
+"""
+Aggregated dashboard statistics fanned out across every service
+"""
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from .auth import IDENTITY_HEADER, sign_identity
+from .breaker import CircuitOpenError
+from .cache import CachedResponse, response_cache
+from .config import settings
+from .deadline import DEADLINE_HEADER
+from .lastgood import last_good
+from .singleflight import inflight_gets
+from .upstream import SERVICE_URL_SETTINGS, _forward_headers, upstreams
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_STATS_PATH = "/dashboard/stats"
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def _cache_rule(name: str) -> Optional[Dict[str, Any]]:
+    """Shared-cache rule for a service's stats, so proxied stats and summaries reuse entries"""
+    rule = response_cache.rule_for(name, DASHBOARD_STATS_PATH)
+    if rule is None or rule.get("per_user"):
+        return None
+    return rule
+
+
+async def _fetch_service_stats(name: str, headers: Dict[str, str]) -> Tuple[str, Dict[str, Any]]:
+    """Fetch one service's stats within its deadline; never raises"""
+    deadline = settings.DASHBOARD_DEADLINES.get(name, settings.DASHBOARD_DEADLINE)
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"deadline_ms": deadline * 1000}
+    rule = _cache_rule(name)
+    key = response_cache.key(name, DASHBOARD_STATS_PATH, []) if rule else None
+
+    try:
+        cached = await response_cache.get(key) if key else None
+        if cached is not None:
+            result.update(status="ok", status_code=200, cached=True, data=json.loads(cached.body))
+            result["elapsed_ms"] = _elapsed_ms(started)
+            return name, result
+
+        # The service stops counting once the deadline has passed
+        headers = {**headers, DEADLINE_HEADER: str(int(deadline * 1000))}
+        # As in upstream._cached_proxy: only the caller that starts the fetch may cache it
+        generation = None
+
+        async def fetch():
+            nonlocal generation
+            generation = await response_cache.generation(name) if key else None
+            return await upstreams.get(name).request("GET", DASHBOARD_STATS_PATH, headers=headers)
+
+        response = await asyncio.wait_for(
+            inflight_gets.do(key, fetch) if key else fetch(),
+            timeout=deadline,
+        )
+        result["status_code"] = response.status_code
+        if response.is_success:
+            result["status"] = "ok"
+            result["data"] = response.json()
+            last_good.put(last_good.key(name, DASHBOARD_STATS_PATH, []), response.content, "application/json")
+            if key and response.status_code == 200:
+                entry = CachedResponse(response.content, response.headers.get("content-type", "application/json"))
+                await response_cache.set(key, name, entry, rule["ttl"], generation)
+        else:
+            result["status"] = "error"
+            result["detail"] = response.text[:200]
+    except asyncio.TimeoutError:
+        result["status"] = "timeout"
+    except CircuitOpenError:
+        result["status"] = "circuit_open"
+    except httpx.RequestError as exc:
+        result["status"] = "unavailable"
+        result["detail"] = str(exc)
+    except ValueError:
+        result["status"] = "error"
+        result["detail"] = "Invalid JSON from upstream"
+
+    if result["status"] != "ok":
+        # Show the last real figures, flagged as stale, rather than nothing
+        entry = last_good.get(last_good.key(name, DASHBOARD_STATS_PATH, []))
+        if entry is not None:
+            result.update(data=json.loads(entry.body), stale=True, age_seconds=int(entry.age()))
+
+    result["elapsed_ms"] = _elapsed_ms(started)
+    return name, result
+
+
+async def fetch_dashboard_summary(request: Request, current_user: dict, live_events: bool) -> Dict[str, Any]:
+    """
+    Query every service's /dashboard/stats concurrently.
+
+    The call is bounded by the slowest service's deadline; services that fail
+    or miss their deadline are reported in their status block instead of
+    failing the whole summary. `live_events` tells the client whether this
+    gateway serves /api/events, or whether it should poll instead.
+    """
+    headers = {IDENTITY_HEADER: sign_identity(current_user)}
+    if "authorization" in request.headers:
+        headers["authorization"] = request.headers["authorization"]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(_fetch_service_stats(name, headers) for name in SERVICE_URL_SETTINGS)
+    )
+    services = dict(results)
+    return {
+        "services": services,
+        "complete": all(result["status"] == "ok" for result in services.values()),
+        "elapsed_ms": _elapsed_ms(started),
+        "live_events": live_events,
+    }
+
+
+async def serve_last_good(
+    request: Request,
+    service: str,
+    path: str,
+    current_user: Optional[dict],
+    fallback: dict,
+) -> Response:
+    """
+    Answer a dashboard read from the last-known-good store.
+
+    A stored payload is returned at once, refreshed in the background when it
+    is due. Without one the upstream is awaited, and if that fails as well
+    the fallback is returned marked with X-Fallback: default.
+    """
+    key = last_good.key(service, path, request.query_params.multi_items())
+    headers = _forward_headers(request, current_user)
+    params = request.query_params
+
+    def fetch():
+        return upstreams.get(service).request("GET", path, headers=headers, params=params)
+
+    entry = last_good.get(key)
+    if entry is not None:
+        if last_good.needs_refresh(entry):
+            last_good.refresh(key, fetch)
+        last_good.served += 1
+        return entry.to_response()
+
+    try:
+        entry = await last_good.fetch(key, fetch)
+    except (httpx.HTTPError, CircuitOpenError) as exc:
+        logger.warning(f"{service} {path} unavailable and nothing stored yet: {exc}")
+        return JSONResponse(content=fallback, headers={"X-Fallback": "default"})
+    return entry.to_response()
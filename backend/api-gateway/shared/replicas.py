@@ -0,0 +1,81 @@
+"""
+Service replicas behind one upstream: load balancing and active health probing
+"""
+from typing import Any, Dict, List
+import random
+import time
+
+import httpx
+
+from .config import settings
+
+
+class Replica:
+    """One instance of a service and its live load and health"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.outstanding = 0
+        self.total_requests = 0
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.times_drained = 0
+        self.last_probe_ms = None
+
+    def record_probe(self, ok: bool) -> None:
+        """Drain after repeated failed probes; restore after repeated good ones"""
+        if ok:
+            self.consecutive_failures = 0
+            self.consecutive_successes += 1
+            if not self.healthy and self.consecutive_successes >= settings.HEALTH_PROBE_SUCCESSES:
+                self.healthy = True
+        else:
+            self.consecutive_successes = 0
+            self.consecutive_failures += 1
+            if self.healthy and self.consecutive_failures >= settings.HEALTH_PROBE_FAILURES:
+                self.healthy = False
+                self.times_drained += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "total_requests": self.total_requests,
+            "times_drained": self.times_drained,
+            "last_probe_ms": self.last_probe_ms,
+        }
+
+
+def choose_replica(replicas: List[Replica]) -> Replica:
+    """
+    Pick a replica for the next request.
+
+    Drained replicas are skipped unless every replica is drained, in which
+    case all of them are tried rather than failing outright. "p2c" compares
+    two random replicas; "least_outstanding" scans them all.
+    """
+    candidates = [replica for replica in replicas if replica.healthy] or replicas
+    if len(candidates) == 1:
+        return candidates[0]
+    if settings.UPSTREAM_BALANCER == "p2c":
+        first, second = random.sample(candidates, 2)
+        return first if first.outstanding <= second.outstanding else second
+    # Ties go to the replica that has served least, so idle replicas share work
+    return min(candidates, key=lambda replica: (replica.outstanding, replica.total_requests))
+
+
+async def probe_replica(client: httpx.AsyncClient, replica: Replica) -> bool:
+    """GET the replica's probe path; anything below 500 counts as alive"""
+    started = time.perf_counter()
+    try:
+        response = await client.get(
+            replica.url + settings.HEALTH_PROBE_PATH, timeout=settings.HEALTH_PROBE_TIMEOUT
+        )
+        ok = response.status_code < 500
+    except httpx.HTTPError:
+        ok = False
+    replica.last_probe_ms = round((time.perf_counter() - started) * 1000, 2)
+    replica.record_probe(ok)
+    return ok
@@ -2,9 +2,11 @@ from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, Response
-from mangum import Mangum
-from sqlalchemy.orm import Session
-import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import asyncio
+import importlib
 import sys
 import os
 import json
@@ -12,11 +14,18 @@ import json
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared.database import get_db, init_db, SessionLocal
-from shared.auth import create_access_token, verify_password, get_password_hash, get_current_user
+from shared.database import AsyncSessionLocal, get_db, init_db
+from shared.auth import (
+    issue_tokens, oauth2_scheme, password_hasher, revoke_access_token, revoke_refresh_token,
+    rotate_refresh_token, get_current_user,
+)
 from shared.config import settings
 from shared.models import User
-from shared.schemas import TokenResponse, UserResponse, MessageResponse
+from shared.schemas import TokenResponse, UserResponse, MessageResponse, RefreshRequest, LogoutRequest, BatchRequest
+from shared.admission import admission, setup_admission
+from shared.cache import response_cache
+from shared.revocation import revoked_tokens
+from shared.singleflight import inflight_gets
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -27,42 +36,73 @@ app = FastAPI(
     openapi_url="/api/openapi.json"
 )
 
-def _ensure_default_admin() -> None:
+def _lazy(module: str):
+    """
+    A shared module imported on first use rather than at cold start.
+
+    The proxy stack (upstream, dashboard, lastgood) pulls in httpx and its CA
+    bundle; requests that never proxy, such as sign-ins, do not pay for it.
+    """
+    return importlib.import_module(f"shared.{module}")
+
+
+_admin_lock = asyncio.Lock()
+_admin_checked = False
+
+
+async def _ensure_default_admin() -> None:
     """
     Create a default admin user if none exists and env vars are provided.
     This avoids 401 on first login in a fresh Vercel SQLite database.
-    """
-    email = os.getenv("DEFAULT_ADMIN_EMAIL")
-    password = os.getenv("DEFAULT_ADMIN_PASSWORD")
-    employee_id = os.getenv("DEFAULT_ADMIN_EMPLOYEE_ID", "EMP0001")
-    full_name = os.getenv("DEFAULT_ADMIN_FULL_NAME", "Admin User")
 
-    if not email or not password:
+    Runs once, on the first sign-in rather than at startup, so cold starts
+    serving other requests skip the lookup and the password hash.
+    """
+    global _admin_checked
+    if _admin_checked:
         return
 
-    db = SessionLocal()
-    try:
-        existing = db.query(User).filter(User.email == email).first()
-        if existing:
+    async with _admin_lock:
+        if _admin_checked:
             return
 
-        user = User(
-            email=email,
-            employee_id=employee_id,
-            full_name=full_name,
-            password_hash=get_password_hash(password),
-            is_active=True,
-        )
-        db.add(user)
-        db.commit()
-    finally:
-        db.close()
+        email = os.getenv("DEFAULT_ADMIN_EMAIL")
+        password = os.getenv("DEFAULT_ADMIN_PASSWORD")
+        employee_id = os.getenv("DEFAULT_ADMIN_EMPLOYEE_ID", "EMP0001")
+        full_name = os.getenv("DEFAULT_ADMIN_FULL_NAME", "Admin User")
+
+        if email and password:
+            async with AsyncSessionLocal() as db:
+                existing = await db.scalar(select(User).where(User.email == email))
+                if not existing:
+                    user = User(
+                        email=email,
+                        employee_id=employee_id,
+                        full_name=full_name,
+                        password_hash=await password_hasher.hash(password),
+                        is_active=True,
+                    )
+                    db.add(user)
+                    await db.commit()
+        _admin_checked = True
 
 
 @app.on_event("startup")
-def _startup_init_db():
+async def _startup_init_db():
+    # A schema stamp lookup on warm databases; create_all only when models changed
     init_db()
-    _ensure_default_admin()
+    await response_cache.start()
+    await revoked_tokens.start()
+
+
+@app.on_event("shutdown")
+async def _shutdown_upstreams():
+    await revoked_tokens.aclose()
+    await response_cache.aclose()
+    upstream = sys.modules.get("shared.upstream")
+    if upstream is not None:
+        await upstream.upstreams.aclose()
+    password_hasher.shutdown()
 
 # CORS Configuration for Vercel
 _raw_cors = os.getenv("CORS_ORIGINS", "").strip()
@@ -82,6 +122,9 @@ if _raw_cors:
     except json.JSONDecodeError:
         _cors_origins.extend([origin.strip() for origin in _raw_cors.split(",") if origin.strip()])
 
+# Admission first, so CORS wraps shed responses
+setup_admission(app)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=_cors_origins,
@@ -89,6 +132,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset-paged lists return the next page's cursor here (shared.pagination)
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -141,24 +186,38 @@ async def health_check():
 @app.get("/health")
 async def health_check_alias():
     """Health check alias for Vercel routing"""
-    return {"status": "healthy", "platform": "vercel"}
+    upstream = sys.modules.get("shared.upstream")
+    circuits = upstream.upstreams.circuit_states() if upstream is not None else {}
+    return {"status": "healthy", "platform": "vercel", "circuits": circuits}
 
 
-# Fallback dashboard stats endpoints (used only if downstream service is unavailable)
-async def _proxy_or_fallback(request: Request, service_url: str, path: str, fallback: dict):
-    try:
-        return await proxy_request(request, service_url, path)
-    except HTTPException:
-        return fallback
+@app.get("/api/health/upstreams")
+async def upstream_health():
+    """Connection pool utilisation per upstream service"""
+    return {
+        "upstreams": _lazy("upstream").upstreams.stats(),
+        "cache": response_cache.stats(),
+        "coalescing": inflight_gets.stats(),
+        "password_hashing": password_hasher.stats(),
+        "revocations": revoked_tokens.stats(),
+        "admission": admission.stats(),
+        "last_good": _lazy("lastgood").last_good.stats(),
+    }
+
+
+# Dashboard stats endpoints: last-known-good payload first, zeros only before the first success
+async def _proxy_or_fallback(request: Request, service: str, path: str, fallback: dict, current_user: dict):
+    return await _lazy("dashboard").serve_last_good(request, service, path, current_user, fallback)
 
 
 @app.get("/api/guesthouse/dashboard/stats")
 async def guesthouse_dashboard_stats(request: Request, current_user: dict = Depends(get_current_user)):
     return await _proxy_or_fallback(
         request,
-        settings.GUESTHOUSE_SERVICE_URL,
+        "guesthouse",
         "/dashboard/stats",
-        {"total": 0, "available": 0, "occupied": 0, "maintenance": 0},
+        current_user=current_user,
+        fallback={"total": 0, "available": 0, "occupied": 0, "maintenance": 0},
     )
 
 
@@ -166,9 +225,10 @@ async def guesthouse_dashboard_stats(request: Request, current_user: dict = Depe
 async def visitor_dashboard_stats(request: Request, current_user: dict = Depends(get_current_user)):
     return await _proxy_or_fallback(
         request,
-        settings.VISITOR_SERVICE_URL,
+        "visitor",
         "/dashboard/stats",
-        {"total": 0, "pending": 0, "approved": 0, "rejected": 0},
+        current_user=current_user,
+        fallback={"total": 0, "pending": 0, "approved": 0, "rejected": 0},
     )
 
 
@@ -176,9 +236,10 @@ async def visitor_dashboard_stats(request: Request, current_user: dict = Depends
 async def equipment_dashboard_stats(request: Request, current_user: dict = Depends(get_current_user)):
     return await _proxy_or_fallback(
         request,
-        settings.EQUIPMENT_SERVICE_URL,
+        "equipment",
         "/dashboard/stats",
-        {"total": 0, "available": 0, "in_use": 0, "maintenance": 0},
+        current_user=current_user,
+        fallback={"total": 0, "available": 0, "in_use": 0, "maintenance": 0},
     )
 
 
@@ -186,9 +247,10 @@ async def equipment_dashboard_stats(request: Request, current_user: dict = Depen
 async def vigilance_dashboard_stats(request: Request, current_user: dict = Depends(get_current_user)):
     return await _proxy_or_fallback(
         request,
-        settings.VIGILANCE_SERVICE_URL,
+        "vigilance",
         "/dashboard/stats",
-        {"total": 0, "active": 0, "inactive": 0},
+        current_user=current_user,
+        fallback={"total": 0, "active": 0, "inactive": 0},
     )
 
 
@@ -196,9 +258,10 @@ async def vigilance_dashboard_stats(request: Request, current_user: dict = Depen
 async def vehicle_dashboard_stats(request: Request, current_user: dict = Depends(get_current_user)):
     return await _proxy_or_fallback(
         request,
-        settings.VEHICLE_SERVICE_URL,
+        "vehicle",
         "/dashboard/stats",
-        {"total": 0, "available": 0, "in_use": 0, "maintenance": 0},
+        current_user=current_user,
+        fallback={"total": 0, "available": 0, "in_use": 0, "maintenance": 0},
     )
 
 
@@ -206,9 +269,10 @@ async def vehicle_dashboard_stats(request: Request, current_user: dict = Depends
 async def canteen_dashboard_stats(request: Request, current_user: dict = Depends(get_current_user)):
     return await _proxy_or_fallback(
         request,
-        settings.CANTEEN_SERVICE_URL,
+        "canteen",
         "/dashboard/stats",
-        {"total": 0, "active": 0, "inactive": 0},
+        current_user=current_user,
+        fallback={"total": 0, "active": 0, "inactive": 0},
     )
 
 
@@ -216,110 +280,97 @@ async def canteen_dashboard_stats(request: Request, current_user: dict = Depends
 async def colony_dashboard_stats(request: Request, current_user: dict = Depends(get_current_user)):
     return await _proxy_or_fallback(
         request,
-        settings.COLONY_SERVICE_URL,
+        "colony",
         "/dashboard/stats",
-        {"total": 0, "pending": 0, "in_progress": 0, "resolved": 0},
+        current_user=current_user,
+        fallback={"total": 0, "pending": 0, "in_progress": 0, "resolved": 0},
     )
 
 
-# Proxy endpoints to microservices
-from fastapi import Request
-from fastapi.responses import JSONResponse, Response
+# Aggregated dashboard across all services
+@app.get("/api/dashboard/summary")
+async def dashboard_summary(request: Request, current_user: dict = Depends(get_current_user)):
+    """Dashboard statistics from every service in one round trip"""
+    # Functions cannot hold an event stream open, so dashboards poll here
+    return await _lazy("dashboard").fetch_dashboard_summary(request, current_user, live_events=False)
 
-async def proxy_request(request: Request, service_url: str, path: str):
-    """Proxy request to microservice"""
-    async with httpx.AsyncClient() as client:
-        base_url = service_url.rstrip("/")
-        url = f"{base_url}{path}"
-        headers = dict(request.headers)
-        headers.pop("host", None)
 
-        try:
-            response = await client.request(
-                method=request.method,
-                url=url,
-                headers=headers,
-                content=await request.body(),
-                params=request.query_params,
-                timeout=10.0,
-            )
-            content_type = response.headers.get("content-type", "")
-            if "application/json" in content_type:
-                return JSONResponse(content=response.json(), status_code=response.status_code)
-            return Response(
-                content=response.text,
-                status_code=response.status_code,
-                media_type=content_type or "text/plain",
-            )
-        except httpx.RequestError as exc:
-            raise HTTPException(
-                status_code=status.HTTP_502_BAD_GATEWAY,
-                detail=f"Upstream service unavailable at {service_url}. Error: {exc}"
-            )
+@app.get("/api/events")
+async def event_stream(current_user: dict = Depends(get_current_user)):
+    """Not served on Vercel; clients fall back to polling the summary"""
+    raise HTTPException(status_code=404, detail="Event stream disabled")
+
+
+# Multi-resource page loads (the frontend's batchService)
+@app.post("/api/batch")
+async def batch(request: Request, body: BatchRequest, current_user: dict = Depends(get_current_user)):
+    """Run up to BATCH_MAX_ITEMS GETs concurrently; per-item status, timing and body"""
+    return await _lazy("batch").run_batch(request, body, current_user)
 
 
 # Colony Maintenance Service routes
 @app.api_route("/api/colony/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def colony_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Colony Maintenance Service"""
-    base = settings.COLONY_SERVICE_URL.rstrip("/")
-    return await proxy_request(request, base, f"/{path}")
+    return await _lazy("upstream").proxy_request(request, "colony", f"/{path}", current_user)
 
 
 # Guest House Service routes
 @app.api_route("/api/guesthouse/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def guesthouse_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Guest House Service"""
-    return await proxy_request(request, settings.GUESTHOUSE_SERVICE_URL, f"/{path}")
+    return await _lazy("upstream").proxy_request(request, "guesthouse", f"/{path}", current_user)
 
 
 # Equipment Service routes
 @app.api_route("/api/equipment/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def equipment_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Equipment Service"""
-    return await proxy_request(request, settings.EQUIPMENT_SERVICE_URL, f"/{path}")
+    return await _lazy("upstream").proxy_request(request, "equipment", f"/{path}", current_user)
 
 
 # Vigilance Service routes
 @app.api_route("/api/vigilance/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def vigilance_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Vigilance Service"""
-    return await proxy_request(request, settings.VIGILANCE_SERVICE_URL, f"/{path}")
+    return await _lazy("upstream").proxy_request(request, "vigilance", f"/{path}", current_user)
 
 
 # Vehicle Service routes
 @app.api_route("/api/vehicle/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def vehicle_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Vehicle Service"""
-    return await proxy_request(request, settings.VEHICLE_SERVICE_URL, f"/{path}")
+    return await _lazy("upstream").proxy_request(request, "vehicle", f"/{path}", current_user)
 
 
 # Visitor Service routes
 @app.api_route("/api/visitor/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def visitor_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Visitor Service"""
-    return await proxy_request(request, settings.VISITOR_SERVICE_URL, f"/{path}")
+    return await _lazy("upstream").proxy_request(request, "visitor", f"/{path}", current_user)
 
 
 # Canteen Service routes
 @app.api_route("/api/canteen/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def canteen_proxy(request: Request, path: str, current_user: dict = Depends(get_current_user)):
     """Proxy to Canteen Service"""
-    return await proxy_request(request, settings.CANTEEN_SERVICE_URL, f"/{path}")
+    return await _lazy("upstream").proxy_request(request, "canteen", f"/{path}", current_user)
 
 # Authentication endpoints
 @app.post("/api/auth/login", response_model=TokenResponse)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Login endpoint"""
+    await _ensure_default_admin()
     # Find user by email or employee_id
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         (User.email == form_data.username) | (User.employee_id == form_data.username)
-    ).first()
+    ))
     
-    if not user or not verify_password(form_data.password, user.password_hash):
+    # Hash on the worker pool so a login storm does not stall proxied traffic
+    if not user or not await password_hasher.verify(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -331,22 +382,43 @@ async def login(
             detail="User account is inactive"
         )
     
-    # Create access token
-    access_token = create_access_token(
-        data={"sub": str(user.id), "email": user.email}
-    )
-    
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **issue_tokens(user.id, user.email),
+        "user": UserResponse.from_orm(user)
+    }
+
+
+@app.post("/api/auth/refresh", response_model=TokenResponse)
+async def refresh(body: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """Swap a refresh token for a new token pair without another password check"""
+    payload = await rotate_refresh_token(body.refresh_token)
+    user = await db.get(User, payload["sub"])
+    if not user or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User account is inactive"
+        )
+
+    return {
+        **issue_tokens(user.id, user.email, family=payload["fam"]),
         "user": UserResponse.from_orm(user)
     }
 
 @app.post("/api/auth/logout")
-async def logout():
-    """Logout endpoint"""
+async def logout(body: Optional[LogoutRequest] = None, token: Optional[str] = Depends(oauth2_scheme)):
+    """Logout endpoint: revokes the access token and the refresh token's family"""
+    if token:
+        await revoke_access_token(token)
+    if body and body.refresh_token:
+        await revoke_refresh_token(body.refresh_token)
     return MessageResponse(message="Logged out successfully")
 
 
-# Vercel serverless handler
-handler = Mangum(app)
+def __getattr__(name: str):
+    """Vercel serverless handler, built on first access: the Vercel runtime serves `app` directly"""
+    if name == "handler":
+        from mangum import Mangum
+
+        globals()["handler"] = Mangum(app)
+        return globals()["handler"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
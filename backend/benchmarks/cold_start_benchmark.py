@@ -0,0 +1,129 @@
+"""
+Cold start of the Vercel gateway entry point, with a budget.
+
+Each run is a fresh interpreter that imports api/index.py, runs the startup
+hooks and serves one request, the way a new serverless instance does. The
+first run creates the schema; the rest find its stamp, as instances behind a
+database that already exists do. Exits non-zero when the median cold start
+of those runs exceeds the budget, so CI catches a regression.
+
+    python benchmarks/cold_start_benchmark.py --runs 7 --budget-ms 1500
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Modules the entry point should not load before they are needed
+DEFERRED = ("httpx", "mangum", "passlib", "redis")
+
+CHILD = """
+import asyncio, json, sys, time
+
+started = time.perf_counter()
+sys.path.insert(0, {api_dir!r})
+import index
+imported = time.perf_counter()
+loaded = [name for name in {deferred!r} if name in sys.modules]
+
+
+async def cold_start():
+    app = index.app
+    messages = []
+
+    async def receive():
+        return {{"type": "http.request", "body": b"", "more_body": False}}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {{
+        "type": "http", "asgi": {{"version": "3.0"}}, "http_version": "1.1", "method": "GET",
+        "scheme": "https", "path": "/", "raw_path": b"/", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"gateway")], "client": ("127.0.0.1", 0), "server": ("gateway", 443),
+    }}
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        await app(scope, receive, send)
+        served = time.perf_counter()
+    return ready, served, messages[0]["status"]
+
+
+ready, served, status = asyncio.run(cold_start())
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (served - ready) * 1000,
+    "total_ms": (served - started) * 1000,
+    "status": status,
+    "loaded": loaded,
+}}))
+"""
+
+
+def _cold_start(db_url: str) -> dict:
+    env = {
+        **os.environ,
+        "DATABASE_URL": db_url,
+        "CACHE_BACKEND": "memory",
+        "DEFAULT_ADMIN_EMAIL": "admin@example.com",
+        "DEFAULT_ADMIN_PASSWORD": "Bench@123",
+    }
+    code = CHILD.format(api_dir=str(BASE_DIR / "api-gateway" / "api"), deferred=DEFERRED)
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _row(label: str, sample: dict) -> str:
+    return (
+        f"{label:<14} import {sample['import_ms']:>7.1f} ms"
+        f"  startup {sample['startup_ms']:>6.1f} ms"
+        f"  first request {sample['first_request_ms']:>5.1f} ms"
+        f"  total {sample['total_ms']:>7.1f} ms"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp()) / "epos_cold_start.db"
+    db_url = f"sqlite:///{db_path}"
+    try:
+        first = _cold_start(db_url)
+        print(_row("new database", first))
+        samples = [_cold_start(db_url) for _ in range(args.runs)]
+    finally:
+        db_path.unlink(missing_ok=True)
+
+    median = {key: statistics.median(sample[key] for sample in samples) for key in first if key.endswith("_ms")}
+    print(_row(f"median of {args.runs}", median))
+
+    failures = []
+    loaded = sorted({name for sample in [first, *samples] for name in sample["loaded"]})
+    if loaded:
+        failures.append(f"imported at cold start: {', '.join(loaded)}")
+    if any(sample["status"] != 200 for sample in [first, *samples]):
+        failures.append("first request did not return 200")
+    if median["total_ms"] > args.budget_ms:
+        failures.append(f"median cold start {median['total_ms']:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print(f"OK   within the {args.budget_ms:.0f} ms budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+CPU per MB served: compressing at every hop vs once, per encoding.
+
+"double gzip" is the old chain: the service gzips (GZipMiddleware, level 9),
+the gateway's httpx client inflates it, and the gateway gzips it again. The
+other rows compress once in the service and relay the bytes untouched, as the
+proxy now does. br and zstd rows appear when brotli / zstandard are installed.
+
+    python benchmarks/compression_benchmark.py --size-kb 256 --rounds 40
+"""
+from pathlib import Path
+import argparse
+import json
+import sys
+import time
+import zlib
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from shared.compression import ENCODERS, compress  # noqa: E402
+from shared.config import settings  # noqa: E402
+
+
+def _payload(size_kb: int) -> bytes:
+    """Order list JSON of roughly the requested size"""
+    orders, body = [], b"[]"
+    i = 0
+    while len(body) < size_kb * 1024:
+        orders.extend(
+            {
+                "id": f"{n:08x}-0000-4000-8000-000000000000",
+                "order_number": f"ORD2026{n:08d}",
+                "token_number": n % 999 + 1,
+                "meal_type": ("breakfast", "lunch", "dinner")[n % 3],
+                "status": ("pending", "confirmed", "served")[n % 3],
+                "items": [{"item_name": f"dish {n % 37}", "quantity": n % 3 + 1, "unit_price": 40.0}],
+                "total_amount": 40.0 * (n % 3 + 1),
+            }
+            for n in range(i, i + 200)
+        )
+        i += 200
+        body = json.dumps(orders).encode()
+    return body
+
+
+def _gzip9(body: bytes) -> bytes:
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress(body) + compressor.flush()
+
+
+def _double_gzip(body: bytes) -> bytes:
+    wire = _gzip9(body)  # service
+    inflated = zlib.decompress(wire, zlib.MAX_WBITS | 16)  # gateway httpx client
+    return _gzip9(inflated)  # gateway GZipMiddleware
+
+
+def _measure(label: str, chain, body: bytes, rounds: int) -> None:
+    started = time.process_time()
+    for _ in range(rounds):
+        served = chain(body)
+    cpu = time.process_time() - started
+    megabytes = len(body) * rounds / (1024 * 1024)
+    print(
+        f"{label:<26} {cpu / megabytes * 1000:>9.1f} ms CPU/MB"
+        f" {len(served) / len(body):>8.1%} of original"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--rounds", type=int, default=40)
+    args = parser.parse_args()
+
+    body = _payload(args.size_kb)
+    print(f"payload {len(body) / 1024:.0f} KB JSON, {args.rounds} rounds\n")
+    _measure("double gzip (before)", _double_gzip, body, args.rounds)
+    _measure("gzip level 9 once", _gzip9, body, args.rounds)
+    levels = {"gzip": settings.GZIP_LEVEL, "br": settings.BROTLI_QUALITY, "zstd": settings.ZSTD_LEVEL}
+    for encoding in ENCODERS:
+        _measure(
+            f"{encoding} level {levels[encoding]} once",
+            lambda data, encoding=encoding: compress(encoding, data),
+            body,
+            args.rounds,
+        )
+
+
+if __name__ == "__main__":
+    main()
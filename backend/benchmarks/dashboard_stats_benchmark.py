@@ -0,0 +1,133 @@
+"""
+Queries and latency of GET /dashboard/stats, per service.
+
+Loads each service's app against its own scratch database, fills every
+table the service declares with --rows synthetic rows (enum values drawn
+at random, timestamps spread over the last 30 days so the "today" metrics
+match some of them), then calls the dashboard route --repeat times,
+counting the statements it sends and timing each call.
+
+Run it on both sides of a change to compare them:
+
+    python benchmarks/dashboard_stats_benchmark.py --rows 20000
+    python benchmarks/dashboard_stats_benchmark.py --services vigilance visitor --repeat 50
+"""
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Boolean, Date, DateTime, Enum, Float, Integer, String, event
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SERVICES = ["vigilance", "guesthouse", "vehicle", "equipment", "colony-maintenance", "visitor"]
+# Tables owned by shared modules rather than the service's dashboard
+SKIPPED_TABLES = {"users", "document_counters"}
+
+os.environ["SEED_DATA_ON_STARTUP"] = "false"
+os.environ["SEED_ON_FIRST_BOOT"] = "false"
+
+
+def _load(service: str):
+    """The service's main module, with fresh shared/models/schemas modules"""
+    for name in list(sys.modules):
+        if name in ("shared", "models", "schemas") or name.startswith("shared."):
+            del sys.modules[name]
+    service_dir = BASE_DIR / "services" / service
+    sys.path[:0] = [str(BASE_DIR), str(service_dir)]
+    try:
+        spec = importlib.util.spec_from_file_location(f"{service}_main", service_dir / "main.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        del sys.path[:2]
+    return module
+
+
+def _value(column, now: datetime):
+    kind = column.type
+    if column.primary_key:
+        return str(uuid.uuid4())
+    if isinstance(kind, Enum):
+        return random.choice(list(kind.enum_class) if kind.enum_class else kind.enums)
+    if isinstance(kind, DateTime):
+        return now - timedelta(seconds=random.randint(0, 30 * 86400))
+    if isinstance(kind, Date):
+        return (now - timedelta(days=random.randint(0, 30))).date()
+    if isinstance(kind, Boolean):
+        return random.random() < 0.8
+    if isinstance(kind, Integer):
+        return random.randint(0, 5)
+    if isinstance(kind, Float):
+        return round(random.uniform(0, 500), 2)
+    if isinstance(kind, String):
+        return uuid.uuid4().hex[: min(kind.length or 32, 32)]
+    return "[]"
+
+
+def fill(engine, metadata, rows: int) -> None:
+    now = datetime.utcnow()
+    for table in metadata.sorted_tables:
+        if table.name in SKIPPED_TABLES:
+            continue
+        with engine.begin() as conn:
+            for offset in range(0, rows, 5_000):
+                conn.execute(table.insert(), [
+                    {column.name: _value(column, now) for column in table.columns}
+                    for _ in range(offset, min(rows, offset + 5_000))
+                ])
+
+
+def run(service: str, rows: int, repeat: int) -> None:
+    db_path = BASE_DIR / "data" / f"epos_bench_{uuid.uuid4().hex}.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    try:
+        module = _load(service)
+        from shared.auth import get_current_user
+        from shared.database import Base, async_engine, engine
+
+        module.app.dependency_overrides[get_current_user] = lambda: {"id": str(uuid.uuid4()), "roles": ["admin"]}
+        statements = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(1))
+
+        with TestClient(module.app) as client:
+            fill(engine, Base.metadata, rows)
+            client.get("/dashboard/stats").raise_for_status()  # warm the pool and caches
+            statements.clear()
+            latencies = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                client.get("/dashboard/stats").raise_for_status()
+                latencies.append(time.perf_counter() - started)
+        print(
+            f"{service:<20} {len(statements) // repeat:>4} queries"
+            f"  p50 {statistics.median(latencies) * 1000:>8.1f} ms"
+            f"  max {max(latencies) * 1000:>8.1f} ms"
+        )
+    finally:
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--services", nargs="+", default=SERVICES)
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per table")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"{args.rows} rows per table, {args.repeat} calls per service\n")
+    for service in args.services:
+        run(service, args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Request throughput vs requests in flight: blocking Session vs AsyncSession.
+
+Both routes run the same query from an `async def` handler. "sync" is how the
+services used to work: a blocking Session, so every query holds up the
+event loop and requests queue behind each other however many are in flight.
+"async" is shared.database.get_db: the handler awaits the query and
+the loop serves other requests meanwhile, so throughput grows with in-flight
+requests until the database or its pool is the limit.
+
+Each query waits out a simulated round trip (pg_sleep; registered as a
+function on SQLite) so the result reflects waiting on the database, as with
+a networked Postgres, rather than how many cores the machine has.
+
+    python benchmarks/db_concurrency_benchmark.py --requests 400 --in-flight 1 4 16
+    python benchmarks/db_concurrency_benchmark.py --database-url postgresql://...
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--requests", type=int, default=400)
+parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 4, 16])
+parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated database round trip")
+parser.add_argument("--database-url", default=None)
+args = parser.parse_args()
+
+db_path = BASE_DIR / "data" / f"epos_bench_{uuid.uuid4().hex}.db"
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{db_path}"
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+
+from shared.database import SessionLocal, async_engine, engine, get_db  # noqa: E402
+
+QUERY = text("SELECT pg_sleep(:seconds)")
+PARAMS = {"seconds": args.latency_ms / 1000}
+
+if engine.dialect.name == "sqlite":
+    def _register_sleep(dbapi_connection, connection_record):
+        dbapi_connection.create_function("pg_sleep", 1, time.sleep)
+
+    event.listen(engine, "connect", _register_sleep)
+    event.listen(async_engine.sync_engine, "connect", _register_sleep)
+
+
+app = FastAPI()
+
+
+@app.get("/sync")
+async def blocking():
+    db = SessionLocal()
+    try:
+        db.execute(QUERY, PARAMS)
+    finally:
+        db.close()
+    return {"ok": True}
+
+
+@app.get("/async")
+async def awaiting(db: AsyncSession = Depends(get_db)):
+    await db.execute(QUERY, PARAMS)
+    return {"ok": True}
+
+
+async def _drive(client: httpx.AsyncClient, path: str, requests: int, in_flight: int) -> dict:
+    latencies = []
+    limit = asyncio.Semaphore(in_flight)
+
+    async def one():
+        async with limit:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+
+    for _ in range(in_flight):  # open the pool's connections
+        await client.get(path)
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "req_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+    }
+
+
+async def main() -> None:
+    print(f"{args.requests} requests, {args.latency_ms} ms per query, {engine.dialect.name}\n")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for path in ("/sync", "/async"):
+            baseline = None
+            for in_flight in args.in_flight:
+                result = await _drive(client, path, args.requests, in_flight)
+                baseline = baseline or result["req_per_s"]
+                print(
+                    f"{path[1:]:<6} in flight {in_flight:>3}  {result['req_per_s']:>8.1f} req/s"
+                    f"  x{result['req_per_s'] / baseline:>4.1f}  p50 {result['p50_ms']:>7.1f} ms"
+                )
+            print()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        db_path.unlink(missing_ok=True)
@@ -0,0 +1,114 @@
+"""
+Cost of one list page by depth: skip/limit vs keyset cursors.
+
+Fills a patrol-log-shaped table (scan_time, id, with the composite index
+the list endpoints use) and times shared.pagination.paginate fetching a
+page at increasing depths, once by skip and once by the cursor of the row
+before it. Offset pages get slower the deeper they are, since the
+database walks every row it skips; cursor pages seek straight to theirs.
+
+    python benchmarks/keyset_pagination_benchmark.py --rows 500000 --depths 0 1000 10000 100000 400000
+    python benchmarks/keyset_pagination_benchmark.py --database-url postgresql://...
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--rows", type=int, default=500_000)
+parser.add_argument("--page-size", type=int, default=100)
+parser.add_argument("--depths", type=int, nargs="+", default=[0, 1_000, 10_000, 100_000, 400_000])
+parser.add_argument("--repeat", type=int, default=20, help="timed fetches per depth")
+parser.add_argument("--database-url", default=None)
+args = parser.parse_args()
+
+db_path = BASE_DIR / "data" / f"epos_bench_{uuid.uuid4().hex}.db"
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{db_path}"
+
+from fastapi import Response  # noqa: E402
+from sqlalchemy import Column, DateTime, Index, String, select  # noqa: E402
+
+from shared.database import AsyncSessionLocal, Base, engine  # noqa: E402
+from shared.pagination import NEXT_CURSOR_HEADER, encode_cursor, paginate  # noqa: E402
+
+
+class BenchLog(Base):
+    __tablename__ = "bench_patrol_logs"
+    __table_args__ = (Index("ix_bench_patrol_logs_scan_time_id", "scan_time", "id"),)
+
+    id = Column(String(36), primary_key=True)
+    scan_time = Column(DateTime, nullable=False)
+    guard_id = Column(String(36), nullable=False)
+
+
+def fill(rows: int) -> None:
+    BenchLog.__table__.drop(engine, checkfirst=True)
+    BenchLog.__table__.create(engine)
+    started = datetime(2024, 1, 1)
+    guards = [str(uuid.uuid4()) for _ in range(50)]
+    with engine.begin() as conn:
+        for offset in range(0, rows, 10_000):
+            conn.execute(BenchLog.__table__.insert(), [
+                # Several scans per second, so sort values tie as in real logs
+                {"id": str(uuid.uuid4()), "scan_time": started + timedelta(seconds=n // 3), "guard_id": guards[n % 50]}
+                for n in range(offset, min(rows, offset + 10_000))
+            ])
+
+
+async def timed(fetch) -> float:
+    samples = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        await fetch()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def main() -> None:
+    print(f"{args.rows} rows, {args.page_size} per page, {engine.dialect.name}: filling...")
+    fill(args.rows)
+    query = select(BenchLog)
+    column, id_column = BenchLog.scan_time, BenchLog.id
+
+    print(f"\n{'depth':>9}  {'offset ms':>10}  {'cursor ms':>10}")
+    async with AsyncSessionLocal() as db:
+        for depth in args.depths:
+            cursor = None
+            if depth:
+                # The cursor a client would hold after reading the previous page
+                before = (await db.scalars(
+                    query.order_by(column.desc(), id_column.desc()).offset(depth - 1).limit(1)
+                )).one()
+                cursor = encode_cursor(before.scan_time, before.id)
+
+            async def by_offset():
+                return await paginate(db, query, column, id_column, Response(), depth, args.page_size)
+
+            async def by_cursor():
+                return await paginate(db, query, column, id_column, Response(), 0, args.page_size, cursor)
+
+            assert [row.id for row in await by_offset()] == [row.id for row in await by_cursor()]
+            print(f"{depth:>9}  {await timed(by_offset):>10.2f}  {await timed(by_cursor):>10.2f}")
+
+    response = Response()
+    async with AsyncSessionLocal() as db:
+        await paginate(db, query, column, id_column, response, 0, args.page_size)
+    assert NEXT_CURSOR_HEADER in response.headers
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        BenchLog.__table__.drop(engine, checkfirst=True)
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
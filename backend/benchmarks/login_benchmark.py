@@ -0,0 +1,126 @@
+"""
+Login storm benchmark: password hashing inline vs on the worker pool.
+
+Runs the gateway in-process, fires concurrent logins and meanwhile measures
+event-loop lag and the latency of a cheap endpoint that stands in for proxied
+traffic.
+
+    python benchmarks/login_benchmark.py --logins 200 --concurrency 10
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "api-gateway"))
+sys.path.insert(0, str(BASE_DIR))
+
+db_path = BASE_DIR / "data" / f"epos_bench_{uuid.uuid4().hex}.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+import httpx  # noqa: E402
+
+from main import app  # noqa: E402
+from shared.auth import get_password_hash, password_hasher  # noqa: E402
+from shared.database import SessionLocal  # noqa: E402
+from shared.models import User  # noqa: E402
+
+PASSWORD = "Bench@123"
+
+
+def _create_user() -> str:
+    db = SessionLocal()
+    try:
+        user = User(
+            employee_id="BENCH0001",
+            email="bench@example.com",
+            full_name="Bench User",
+            password_hash=get_password_hash(PASSWORD),
+            is_active=True,
+        )
+        db.add(user)
+        db.commit()
+        return user.email
+    finally:
+        db.close()
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+async def _probe_loop(lags, stop, interval=0.005):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def _probe_endpoint(client, latencies, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/api/health")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def run(workers: int, logins: int, concurrency: int, email: str) -> dict:
+    password_hasher.shutdown()
+    password_hasher.workers = workers
+    password_hasher.max_queue = logins
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        lags, latencies = [], []
+        stop = asyncio.Event()
+        probes = [
+            asyncio.create_task(_probe_loop(lags, stop)),
+            asyncio.create_task(_probe_endpoint(client, latencies, stop)),
+        ]
+        limit = asyncio.Semaphore(concurrency)
+
+        async def login():
+            async with limit:
+                response = await client.post(
+                    "/api/auth/login", data={"username": email, "password": PASSWORD}
+                )
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*probes)
+
+    return {
+        "mode": f"pool({workers})" if workers else "inline",
+        "logins_per_s": round(logins / elapsed, 1),
+        "loop_lag_p99_ms": round(_percentile(lags, 99), 1),
+        "loop_lag_max_ms": round(max(lags) * 1000, 1),
+        "health_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "health_p99_ms": round(_percentile(latencies, 99), 1),
+    }
+
+
+async def main(args) -> None:
+    async with app.router.lifespan_context(app):
+        email = _create_user()
+        for workers in (0, args.workers):
+            print(await run(workers, args.logins, args.concurrency, email))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        db_path.unlink(missing_ok=True)
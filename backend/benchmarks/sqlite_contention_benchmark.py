@@ -0,0 +1,109 @@
+"""
+Write contention on one SQLite file shared by several processes, per profile.
+
+docker-compose runs the gateway and all seven services against the same
+epos.db. Each worker process here stands in for one of them: it creates
+orders the way the services do (count the rows, insert the next number,
+commit) and reads the newest page after each write. "default" is SQLite's
+rollback journal with a full fsync per commit; "production" is the
+SQLITE_PRAGMAS profile (WAL, synchronous=NORMAL, busy_timeout, ...).
+
+    python benchmarks/sqlite_contention_benchmark.py --processes 8 --writes 200
+"""
+from pathlib import Path
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, func, select
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+orders = Table(
+    "bench_orders",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("order_number", String(20), nullable=False),
+    Column("created_at", DateTime, server_default=func.now()),
+)
+
+
+def _worker(profile: str, db_url: str, writes: int, start, results) -> None:
+    os.environ["DATABASE_URL"] = db_url
+    os.environ["SQLITE_PROFILE"] = profile
+    sys.path.insert(0, str(BASE_DIR))
+    from sqlalchemy.exc import OperationalError
+    from shared.database import SessionLocal
+
+    latencies, locked = [], 0
+    start.wait()
+    started = time.perf_counter()
+    for _ in range(writes):
+        write_started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            count = db.scalar(select(func.count()).select_from(orders))
+            db.execute(orders.insert().values(order_number=f"ORD{count + 1:08d}"))
+            db.commit()
+            db.execute(select(orders).order_by(orders.c.id.desc()).limit(20)).all()
+            latencies.append(time.perf_counter() - write_started)
+        except OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            db.rollback()
+            locked += 1
+        finally:
+            db.close()
+    results.put({"elapsed": time.perf_counter() - started, "latencies": latencies, "locked": locked})
+
+
+def run(profile: str, processes: int, writes: int) -> None:
+    db_path = Path(tempfile.mkdtemp()) / f"epos_contention_{profile}.db"
+    db_url = f"sqlite:///{db_path}"
+    setup = create_engine(db_url)
+    orders.create(setup)
+    setup.dispose()
+
+    context = multiprocessing.get_context("spawn")
+    start, results = context.Barrier(processes), context.Queue()
+    workers = [
+        context.Process(target=_worker, args=(profile, db_url, writes, start, results)) for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    samples = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    latencies = sorted(latency for sample in samples for latency in sample["latencies"])
+    locked = sum(sample["locked"] for sample in samples)
+    elapsed = max(sample["elapsed"] for sample in samples)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+    print(
+        f"{profile:<10} {len(latencies) / elapsed:>8.1f} writes/s"
+        f"  p50 {statistics.median(latencies) * 1000 if latencies else 0.0:>7.1f} ms"
+        f"  p99 {p99 * 1000:>8.1f} ms"
+        f"  database is locked: {locked}"
+    )
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200, help="writes per process")
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"])
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.writes} writes\n")
+    for profile in args.profiles:
+        run(profile, args.processes, args.writes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Gateway -> service latency over loopback TCP vs a Unix domain socket.
+
+A small JSON service runs under uvicorn in a background thread, listening on
+both a loopback port and a socket. Requests go through the gateway's proxy
+(in-process) and, to isolate the hop itself, straight through the upstream
+pool.
+
+    python benchmarks/uds_benchmark.py --requests 3000 --concurrency 16
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "api-gateway"))
+sys.path.insert(0, str(BASE_DIR))
+
+db_path = BASE_DIR / "data" / f"epos_bench_{uuid.uuid4().hex}.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+os.environ["CACHE_BACKEND"] = "memory"
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from main import app  # noqa: E402
+from shared.auth import get_current_user  # noqa: E402
+from shared.config import settings  # noqa: E402
+from shared.upstream import upstreams  # noqa: E402
+
+VEHICLES = [{"id": i, "registration": f"OD-02-{i:04d}", "status": "available"} for i in range(20)]
+
+
+async def _vehicles(request):
+    return JSONResponse(VEHICLES)
+
+
+service = Starlette(routes=[Route("/vehicles", _vehicles)])
+
+
+def _serve(config: uvicorn.Config) -> uvicorn.Server:
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+async def _drive(call, requests: int, concurrency: int) -> dict:
+    latencies = []
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with limit:
+            started = time.perf_counter()
+            response = await call()
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+
+    for _ in range(50):  # warm the pool
+        await call()
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "req_per_s": round(requests / elapsed),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+    }
+
+
+async def run(transport: str, port: int, socket_path: str, args) -> None:
+    settings.SERVICE_SOCKETS = {"vehicle": socket_path} if transport == "uds" else {}
+    settings.VEHICLE_SERVICE_URL = f"http://127.0.0.1:{port}"
+    pool = upstreams.configure("vehicle")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gateway") as client:
+        proxy = await _drive(lambda: client.get("/api/vehicle/vehicles"), args.requests, args.concurrency)
+    hop = await _drive(lambda: pool.request("GET", "/vehicles"), args.requests, args.concurrency)
+    await pool.close()
+    print(f"{transport:<4} proxy {proxy}")
+    print(f"{transport:<4} hop   {hop}")
+
+
+async def main(args) -> None:
+    async def _user():
+        return {"id": "bench", "email": "bench@example.com", "roles": ["admin"]}
+
+    app.dependency_overrides[get_current_user] = _user
+    settings.CACHE_ENABLED = False
+    async with app.router.lifespan_context(app):
+        for transport in ("tcp", "uds"):
+            await run(transport, args.port, args.socket, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    args.port = _free_port()
+    args.socket = os.path.join(tempfile.mkdtemp(), "vehicle.sock")
+
+    servers = [
+        _serve(uvicorn.Config(service, host="127.0.0.1", port=args.port, log_level="warning", lifespan="off")),
+        _serve(uvicorn.Config(service, uds=args.socket, log_level="warning", lifespan="off")),
+    ]
+    try:
+        asyncio.run(main(args))
+    finally:
+        for server in servers:
+            server.should_exit = True
+        db_path.unlink(missing_ok=True)
@@ -1,6 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select
 from typing import List, Optional
 from datetime import datetime, date, timedelta
 import sys
@@ -8,10 +10,14 @@ import os
 import tempfile
 sys.path.append('../..')
 
-from shared.database import get_db, init_db
+from shared.database import SessionLocal, get_db, init_db
 from shared.auth import get_current_user
 from shared.middleware import setup_middleware
+from shared.events import publish_event
+from shared.etag import conditional_get
 from shared.config import settings
+from shared.sequences import DocumentNumbers, seed_document_counters
+from shared.pagination import paginate
 
 from models import (
     Worker, Menu, MenuItem, Order, Consumption,
@@ -29,6 +35,11 @@ from schemas import (
     DashboardStats, KioskOrderCreate
 )
 
+# Document numbers, reserved in blocks from document_counters
+WORKER_NUMBERS = DocumentNumbers("W", Worker.worker_number)
+ORDER_NUMBERS = DocumentNumbers("ORD", Order.order_number, width=8)
+ITEM_CODES = DocumentNumbers("INV", Inventory.item_code, yearly=False)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Canteen Management Service",
@@ -180,28 +191,31 @@ def _seed_canteen_data(db: Session) -> None:
             db.commit()
 
 
+def _seed_with_session() -> None:
+    db = SessionLocal()
+    try:
+        _seed_canteen_data(db)
+    finally:
+        db.close()
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
     init_db()
     if _should_seed() and _should_seed_first_boot("canteen"):
-        db = next(get_db())
-        try:
-            _seed_canteen_data(db)
-            _mark_seeded("canteen")
-        finally:
-            db.close()
+        _seed_with_session()
+        _mark_seeded("canteen")
+    seed_document_counters()
 
 
 @app.post("/admin/seed")
 async def seed_canteen_data(request: Request, current_user: dict = Depends(get_current_user)):
     _require_seed_token(request)
-    db = next(get_db())
-    try:
-        _seed_canteen_data(db)
-        return {"seeded": True}
-    finally:
-        db.close()
+    # Bulk seeding is synchronous; keep it off the event loop
+    await run_in_threadpool(_seed_with_session)
+    await run_in_threadpool(seed_document_counters)
+    return {"seeded": True}
 
 
 @app.get("/")
@@ -214,12 +228,11 @@ async def root():
 async def create_worker(
     worker_data: WorkerCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new worker"""
     # Generate worker number
-    count = db.query(Worker).count()
-    worker_number = f"W{datetime.now().year}{count + 1:06d}"
+    worker_number = await WORKER_NUMBERS.next()
     
     worker = Worker(
         worker_number=worker_number,
@@ -227,8 +240,8 @@ async def create_worker(
     )
     
     db.add(worker)
-    db.commit()
-    db.refresh(worker)
+    await db.commit()
+    await db.refresh(worker)
     
     return worker
 
@@ -240,17 +253,17 @@ async def get_workers(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all workers"""
-    query = db.query(Worker)
+    query = select(Worker)
     
     if worker_type:
-        query = query.filter(Worker.worker_type == worker_type)
+        query = query.where(Worker.worker_type == worker_type)
     if is_active is not None:
-        query = query.filter(Worker.is_active == is_active)
+        query = query.where(Worker.is_active == is_active)
     
-    workers = query.offset(skip).limit(limit).all()
+    workers = (await db.scalars(query.offset(skip).limit(limit))).all()
     return workers
 
 
@@ -258,10 +271,10 @@ async def get_workers(
 async def get_worker(
     worker_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get worker by ID"""
-    worker = db.query(Worker).filter(Worker.id == worker_id).first()
+    worker = await db.get(Worker, worker_id)
     if not worker:
         raise HTTPException(status_code=404, detail="Worker not found")
     return worker
@@ -272,10 +285,10 @@ async def update_worker(
     worker_id: str,
     worker_data: WorkerUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update worker"""
-    worker = db.query(Worker).filter(Worker.id == worker_id).first()
+    worker = await db.get(Worker, worker_id)
     if not worker:
         raise HTTPException(status_code=404, detail="Worker not found")
     
@@ -283,8 +296,8 @@ async def update_worker(
         setattr(worker, field, value)
     
     worker.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(worker)
+    await db.commit()
+    await db.refresh(worker)
     
     return worker
 
@@ -294,7 +307,7 @@ async def update_worker(
 async def create_menu(
     menu_data: MenuCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new menu"""
     menu = Menu(
@@ -303,8 +316,8 @@ async def create_menu(
     )
     
     db.add(menu)
-    db.commit()
-    db.refresh(menu)
+    await db.commit()
+    await db.refresh(menu)
     
     return menu
 
@@ -317,37 +330,42 @@ async def get_menus(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all menus"""
-    query = db.query(Menu)
+    query = select(Menu)
     
     if menu_date:
-        query = query.filter(Menu.menu_date == menu_date)
+        query = query.where(Menu.menu_date == menu_date)
     if meal_type:
-        query = query.filter(Menu.meal_type == meal_type)
+        query = query.where(Menu.meal_type == meal_type)
     if is_published is not None:
-        query = query.filter(Menu.is_published == is_published)
+        query = query.where(Menu.is_published == is_published)
     
-    menus = query.order_by(Menu.menu_date.desc()).offset(skip).limit(limit).all()
+    menus = (await db.scalars(query.order_by(Menu.menu_date.desc()).offset(skip).limit(limit))).all()
     return menus
 
 
 @app.get("/menus/today")
 async def get_today_menus(
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get today's published menus"""
     today = date.today()
-    menus = db.query(Menu).filter(
+    query = select(Menu).where(
         and_(
             Menu.menu_date == today,
             Menu.is_published == True,
             Menu.is_active == True
         )
-    ).all()
-    return menus
+    )
+    not_modified = await conditional_get(request, response, db, query, Menu.updated_at, today)
+    if not_modified is not None:
+        return not_modified
+    return (await db.scalars(query)).all()
 
 
 @app.put("/menus/{menu_id}", response_model=MenuResponse)
@@ -355,10 +373,10 @@ async def update_menu(
     menu_id: str,
     menu_data: MenuUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update menu"""
-    menu = db.query(Menu).filter(Menu.id == menu_id).first()
+    menu = await db.get(Menu, menu_id)
     if not menu:
         raise HTTPException(status_code=404, detail="Menu not found")
     
@@ -366,8 +384,8 @@ async def update_menu(
         setattr(menu, field, value)
     
     menu.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(menu)
+    await db.commit()
+    await db.refresh(menu)
     
     return menu
 
@@ -377,14 +395,14 @@ async def update_menu(
 async def create_menu_item(
     item_data: MenuItemCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new menu item"""
     item = MenuItem(**item_data.dict())
     
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     
     return item
 
@@ -393,12 +411,12 @@ async def create_menu_item(
 async def get_menu_items(
     menu_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all items for a menu"""
-    items = db.query(MenuItem).filter(
+    items = (await db.scalars(select(MenuItem).where(
         MenuItem.menu_id == menu_id
-    ).order_by(MenuItem.display_order).all()
+    ).order_by(MenuItem.display_order))).all()
     return items
 
 
@@ -407,18 +425,18 @@ async def update_menu_item(
     item_id: str,
     item_data: MenuItemUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update menu item"""
-    item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
+    item = await db.get(MenuItem, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
     for field, value in item_data.dict(exclude_unset=True).items():
         setattr(item, field, value)
     
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     
     return item
 
@@ -428,15 +446,15 @@ async def update_menu_item(
 async def create_order(
     order_data: OrderCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new order"""
     import json
     
     # Generate order number and token
-    count = db.query(Order).count()
-    order_number = f"ORD{datetime.now().year}{count + 1:08d}"
-    token_number = (count % 999) + 1
+    year, value = await ORDER_NUMBERS.allocate()
+    order_number = ORDER_NUMBERS.format(year, value)
+    token_number = (value - 1) % 999 + 1
     
     # Convert items to JSON
     items_json = json.dumps([item.dict() for item in order_data.items]) if order_data.items else "[]"
@@ -450,45 +468,50 @@ async def create_order(
     )
     
     db.add(order)
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await db.refresh(order)
     
+    publish_event("canteen.orders", "created", {
+        "id": order.id, "order_number": order.order_number, "token_number": order.token_number,
+        "meal_type": order.meal_type, "status": order.status, "total_amount": order.total_amount,
+    })
     return order
 
 
 @app.get("/orders", response_model=List[OrderResponse])
 async def get_orders(
+    response: Response,
     status: Optional[str] = None,
     meal_type: Optional[str] = None,
     order_date: Optional[date] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all orders"""
-    query = db.query(Order)
+    query = select(Order)
     
     if status:
-        query = query.filter(Order.status == status)
+        query = query.where(Order.status == status)
     if meal_type:
-        query = query.filter(Order.meal_type == meal_type)
+        query = query.where(Order.meal_type == meal_type)
     if order_date:
-        query = query.filter(func.date(Order.order_date) == order_date)
+        query = query.where(func.date(Order.order_date) == order_date)
     
-    orders = query.order_by(Order.order_date.desc()).offset(skip).limit(limit).all()
-    return orders
+    return await paginate(db, query, Order.order_date, Order.id, response, skip, limit, cursor)
 
 
 @app.get("/orders/my-orders", response_model=List[OrderResponse])
 async def get_my_orders(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user's orders"""
-    orders = db.query(Order).filter(
+    orders = (await db.scalars(select(Order).where(
         Order.worker_id == current_user["id"]
-    ).order_by(Order.order_date.desc()).limit(50).all()
+    ).order_by(Order.order_date.desc()).limit(50))).all()
     return orders
 
 
@@ -497,10 +520,10 @@ async def update_order_status(
     order_id: str,
     status: OrderStatus,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update order status"""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -510,9 +533,10 @@ async def update_order_status(
     if status == OrderStatus.SERVED:
         order.served_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await db.refresh(order)
     
+    publish_event("canteen.orders", "updated", {"id": order.id, "status": order.status})
     return order
 
 
@@ -520,32 +544,32 @@ async def update_order_status(
 @app.post("/kiosk/order")
 async def create_kiosk_order(
     order_data: KioskOrderCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create order from kiosk (biometric authentication)"""
     import json
     
     # Verify worker by biometric ID
-    worker = db.query(Worker).filter(
+    worker = await db.scalar(select(Worker).where(
         Worker.biometric_id == order_data.biometric_id,
         Worker.is_active == True,
         Worker.canteen_access == True
-    ).first()
+    ))
     
     if not worker:
         raise HTTPException(status_code=404, detail="Worker not found or access denied")
     
     # Generate order number and token
-    count = db.query(Order).count()
-    order_number = f"ORD{datetime.now().year}{count + 1:08d}"
-    token_number = (count % 999) + 1
+    year, value = await ORDER_NUMBERS.allocate()
+    order_number = ORDER_NUMBERS.format(year, value)
+    token_number = (value - 1) % 999 + 1
     
     # Calculate total and build items list
     total_amount = 0
     items_list = []
     
     for item_data in order_data.items:
-        menu_item = db.query(MenuItem).filter(MenuItem.id == item_data.item_id).first()
+        menu_item = await db.get(MenuItem, item_data.item_id)
         if not menu_item:
             continue
         
@@ -577,9 +601,13 @@ async def create_kiosk_order(
     )
     
     db.add(order)
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await db.refresh(order)
     
+    publish_event("canteen.orders", "created", {
+        "id": order.id, "order_number": order.order_number, "token_number": order.token_number,
+        "meal_type": order.meal_type, "status": order.status, "total_amount": order.total_amount,
+    })
     return {
         "order_number": order.order_number,
         "token_number": order.token_number,
@@ -594,7 +622,7 @@ async def create_kiosk_order(
 async def record_consumption(
     consumption_data: ConsumptionCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Record meal consumption"""
     consumption = Consumption(
@@ -603,8 +631,8 @@ async def record_consumption(
     )
     
     db.add(consumption)
-    db.commit()
-    db.refresh(consumption)
+    await db.commit()
+    await db.refresh(consumption)
     
     return consumption
 
@@ -616,17 +644,17 @@ async def get_consumptions(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get consumption records"""
-    query = db.query(Consumption)
+    query = select(Consumption)
     
     if consumption_date:
-        query = query.filter(func.date(Consumption.consumption_time) == consumption_date)
+        query = query.where(func.date(Consumption.consumption_time) == consumption_date)
     if meal_type:
-        query = query.filter(Consumption.meal_type == meal_type)
+        query = query.where(Consumption.meal_type == meal_type)
     
-    consumptions = query.order_by(Consumption.consumption_time.desc()).offset(skip).limit(limit).all()
+    consumptions = (await db.scalars(query.order_by(Consumption.consumption_time.desc()).offset(skip).limit(limit))).all()
     return consumptions
 
 
@@ -635,12 +663,11 @@ async def get_consumptions(
 async def create_inventory_item(
     item_data: InventoryCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new inventory item"""
     # Generate item code
-    count = db.query(Inventory).count()
-    item_code = f"INV{count + 1:06d}"
+    item_code = await ITEM_CODES.next()
     
     item = Inventory(
         item_code=item_code,
@@ -648,8 +675,8 @@ async def create_inventory_item(
     )
     
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     
     return item
 
@@ -661,17 +688,17 @@ async def get_inventory(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get inventory items"""
-    query = db.query(Inventory)
+    query = select(Inventory)
     
     if status:
-        query = query.filter(Inventory.status == status)
+        query = query.where(Inventory.status == status)
     if category:
-        query = query.filter(Inventory.category == category)
+        query = query.where(Inventory.category == category)
     
-    items = query.offset(skip).limit(limit).all()
+    items = (await db.scalars(query.offset(skip).limit(limit))).all()
     return items
 
 
@@ -680,10 +707,10 @@ async def update_inventory_item(
     item_id: str,
     item_data: InventoryUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update inventory item"""
-    item = db.query(Inventory).filter(Inventory.id == item_id).first()
+    item = await db.get(Inventory, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Inventory item not found")
     
@@ -691,8 +718,8 @@ async def update_inventory_item(
         setattr(item, field, value)
     
     item.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     
     return item
 
@@ -702,7 +729,7 @@ async def update_inventory_item(
 async def submit_feedback(
     feedback_data: FeedbackCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Submit meal feedback"""
     feedback = Feedback(
@@ -711,8 +738,8 @@ async def submit_feedback(
     )
     
     db.add(feedback)
-    db.commit()
-    db.refresh(feedback)
+    await db.commit()
+    await db.refresh(feedback)
     
     return feedback
 
@@ -723,15 +750,15 @@ async def get_feedback(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get feedback records"""
-    query = db.query(Feedback)
+    query = select(Feedback)
     
     if rating:
-        query = query.filter(Feedback.rating == rating)
+        query = query.where(Feedback.rating == rating)
     
-    feedbacks = query.order_by(Feedback.created_at.desc()).offset(skip).limit(limit).all()
+    feedbacks = (await db.scalars(query.order_by(Feedback.created_at.desc()).offset(skip).limit(limit))).all()
     return feedbacks
 
 
@@ -739,51 +766,51 @@ async def get_feedback(
 @app.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard statistics"""
     today = date.today()
     
     # Total workers
-    total_workers = db.query(Worker).filter(Worker.is_active == True).count()
+    total_workers = await db.scalar(select(func.count()).select_from(Worker).where(Worker.is_active == True))
     
     # Today's orders
-    today_orders = db.query(Order).filter(
+    today_orders = await db.scalar(select(func.count()).select_from(Order).where(
         func.date(Order.order_date) == today
-    ).count()
+    ))
     
     # Today's consumption
-    today_consumption = db.query(Consumption).filter(
+    today_consumption = await db.scalar(select(func.count()).select_from(Consumption).where(
         func.date(Consumption.consumption_time) == today
-    ).count()
+    ))
     
     # Pending orders
-    pending_orders = db.query(Order).filter(
+    pending_orders = await db.scalar(select(func.count()).select_from(Order).where(
         Order.status.in_([OrderStatus.PENDING, OrderStatus.CONFIRMED, OrderStatus.PREPARING])
-    ).count()
+    ))
     
     # Low stock items
     # Treat items at/below reorder level or minimum stock as low/out of stock
-    low_stock_items = db.query(Inventory).filter(
+    low_stock_items = await db.scalar(select(func.count()).select_from(Inventory).where(
         or_(
             Inventory.current_stock <= Inventory.reorder_level,
             Inventory.current_stock <= Inventory.minimum_stock
         )
-    ).count()
+    ))
     
     # Average rating (last 30 days)
     thirty_days_ago = today - timedelta(days=30)
     # Use overall_rating for average; filter nulls to avoid SQL errors
-    avg_rating = db.query(func.avg(Feedback.overall_rating)).filter(
+    avg_rating = await db.scalar(select(func.avg(Feedback.overall_rating)).where(
         Feedback.overall_rating.isnot(None),
         func.date(Feedback.created_at) >= thirty_days_ago
-    ).scalar() or 0
+    )) or 0
     
     # Revenue today
-    today_revenue = db.query(func.sum(Order.total_amount)).filter(
+    today_revenue = await db.scalar(select(func.sum(Order.total_amount)).where(
         func.date(Order.order_date) == today,
         Order.payment_status == PaymentStatus.PAID
-    ).scalar() or 0
+    )) or 0
     
     return {
         "total_workers": total_workers,
@@ -797,5 +824,5 @@ async def get_dashboard_stats(
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8007)
+    from shared.server import serve
+    serve(app, "canteen", port=8007)
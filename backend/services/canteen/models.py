@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, Boolean, Enum as SQLEnum, Float, Integer, ForeignKey, Date
+from sqlalchemy import Column, String, Text, DateTime, Boolean, Enum as SQLEnum, Float, Integer, ForeignKey, Date, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -157,6 +157,8 @@ class MenuItem(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    # Keyset paging for GET /orders
+    __table_args__ = (Index("ix_orders_order_date_id", "order_date", "id"),)
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     order_number = Column(String(50), unique=True, nullable=False, index=True)
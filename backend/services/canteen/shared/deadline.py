@@ -0,0 +1,68 @@
+"""
+Request deadlines propagated from the client through the gateway to the services.
+
+The client may say how long it will wait (X-Request-Timeout, seconds). The
+gateway forwards the time left as X-Request-Deadline-Ms on every upstream call,
+and services stop read work once it has passed: nobody is waiting for the
+answer any more.
+"""
+from contextvars import ContextVar
+from typing import Optional
+import time
+
+from fastapi import Request
+
+CLIENT_TIMEOUT_HEADER = "x-request-timeout"
+DEADLINE_HEADER = "x-request-deadline-ms"
+
+# Monotonic deadline of the request being served, if it has one
+_deadline: ContextVar[Optional[float]] = ContextVar("epos_request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised by check_deadline once the current request's deadline has passed"""
+
+
+def client_budget(request: Request, default: float) -> float:
+    """Seconds the caller is prepared to wait, capped at the gateway's own timeout"""
+    try:
+        budget = float(request.headers.get(CLIENT_TIMEOUT_HEADER, default))
+    except ValueError:
+        return default
+    return max(0.0, min(budget, default))
+
+
+def budget_from_header(request: Request) -> Optional[float]:
+    """Seconds left according to the gateway's deadline header, if present"""
+    raw = request.headers.get(DEADLINE_HEADER)
+    if raw is None:
+        return None
+    try:
+        return int(raw) / 1000
+    except ValueError:
+        return None
+
+
+def set_deadline(seconds: Optional[float]):
+    """Start the deadline for the current context; returns a reset token"""
+    deadline = None if seconds is None else time.monotonic() + seconds
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token) -> None:
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline() -> None:
+    """Abort work for a caller that has already given up"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Request deadline passed {-left:.3f}s ago")
@@ -0,0 +1,147 @@
+"""
+Document numbers (ORD2026..., GP2026..., MR2026...) without count()+1.
+
+Each sequence keeps its next unreserved value per year in document_counters.
+A process reserves SEQUENCE_BLOCK_SIZE values at a time with one UPDATE ...
+RETURNING in its own short transaction (hi-lo), then hands them out from
+memory, so a create costs no query at all most of the time and two
+processes, or two requests in one, never get the same number. Numbers are
+unique and zero-padded as before, but no longer dense: a block that a
+process did not use up before it stopped is skipped.
+
+seed_document_counters() is the migration from count()+1: it moves every
+counter past the highest number already issued, and runs at service start.
+A counter with no row yet (a new year, a database that never ran the
+migration) is seeded the same way when it is first needed.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, String, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .config import settings
+from .database import Base, async_engine, engine
+
+
+class DocumentCounter(Base):
+    """Next unreserved number per sequence and year"""
+    __tablename__ = "document_counters"
+
+    sequence = Column(String(100), primary_key=True)  # "<table>.<prefix>", e.g. "orders.ORD"
+    year = Column(Integer, primary_key=True)  # 0 for numbers that do not restart each year
+    next_value = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+_counters = DocumentCounter.__table__
+_registry: List["DocumentNumbers"] = []
+
+
+class DocumentNumbers:
+    """Numbers for one document type, e.g. DocumentNumbers("ORD", Order.order_number, width=8)"""
+
+    def __init__(self, prefix: str, column, width: int = 6, yearly: bool = True):
+        self.prefix = prefix
+        self.column = column
+        self.width = width
+        self.yearly = yearly
+        # Prefixes are not unique across services (VR, INV), table names are
+        self.sequence = f"{column.table.name}.{prefix}"
+        self._blocks: Dict[int, List[List[int]]] = {}
+        _registry.append(self)
+
+    def format(self, year: int, value: int) -> str:
+        return f"{self.prefix}{year if self.yearly else ''}{value:0{self.width}d}"
+
+    async def next(self) -> str:
+        return self.format(*await self.allocate())
+
+    async def allocate(self) -> Tuple[int, int]:
+        """(year, value) of the next number for this process"""
+        year = datetime.now().year if self.yearly else 0
+        value = self._take(year)
+        while value is None:
+            start = await self._reserve(year, settings.SEQUENCE_BLOCK_SIZE)
+            self._blocks.setdefault(year, []).append([start, start + settings.SEQUENCE_BLOCK_SIZE])
+            value = self._take(year)
+        return year, value
+
+    def _take(self, year: int):
+        # No await between the check and the update: safe for concurrent requests
+        blocks = self._blocks.get(year, [])
+        while blocks:
+            block = blocks[0]
+            if block[0] < block[1]:
+                block[0] += 1
+                return block[0] - 1
+            blocks.pop(0)
+        return None
+
+    async def _reserve(self, year: int, size: int) -> int:
+        """First value of a newly reserved block"""
+        key = (_counters.c.sequence == self.sequence) & (_counters.c.year == year)
+        while True:
+            async with async_engine.begin() as conn:
+                end = (await conn.execute(
+                    update(_counters)
+                    .where(key)
+                    .values(next_value=_counters.c.next_value + size, updated_at=datetime.utcnow())
+                    .returning(_counters.c.next_value)
+                )).scalar()
+            if end is not None:
+                return end - size
+            try:
+                async with async_engine.begin() as conn:
+                    start = (await conn.run_sync(self._issued_maximum, year)) + 1
+                    await conn.execute(
+                        insert(_counters).values(sequence=self.sequence, year=year, next_value=start + size)
+                    )
+                return start
+            except IntegrityError:
+                continue  # another process created the row first; reserve from it
+
+    def _issued_maxima(self, connection, year: Optional[int] = None) -> Dict[int, int]:
+        """Highest number already issued, per year (one entry, 0, for a sequence that does not restart)"""
+        year_digits = 4 if self.yearly else 0
+        after_prefix = len(self.prefix) + 1  # substr() counts from 1
+        value = func.substr(self.column, after_prefix + year_digits)
+        issued = select(func.max(value)).where(
+            self.column.like(f"{self.prefix}{year if self.yearly and year is not None else ''}%"),
+            # Zero-padded to the same width, so the largest string is the largest number
+            func.length(self.column) == len(self.prefix) + year_digits + self.width,
+        )
+        if self.yearly:
+            issued_year = func.substr(self.column, after_prefix, year_digits)
+            issued = issued.add_columns(issued_year).group_by(issued_year)
+
+        maxima = {}
+        for row in connection.execute(issued):
+            number, issued_in = row[0], (row[1] if self.yearly else "0")
+            if number is not None and number.isdigit() and issued_in.isdigit():
+                maxima[int(issued_in)] = int(number)
+        return maxima
+
+    def _issued_maximum(self, connection, year: int) -> int:
+        return self._issued_maxima(connection, year).get(year, 0)
+
+
+def seed_document_counters() -> None:
+    """Move every registered counter past the highest number its table already holds"""
+    for numbers in _registry:
+        with engine.connect() as conn:
+            maxima = numbers._issued_maxima(conn)
+        for year, issued in maxima.items():
+            key = (_counters.c.sequence == numbers.sequence) & (_counters.c.year == year)
+            try:
+                with engine.begin() as conn:
+                    # Only ever forward: a block may have been reserved since the maxima were read
+                    conn.execute(
+                        update(_counters).where(key, _counters.c.next_value <= issued).values(next_value=issued + 1)
+                    )
+                    if conn.execute(select(_counters.c.next_value).where(key)).scalar() is None:
+                        conn.execute(insert(_counters).values(sequence=numbers.sequence, year=year, next_value=issued + 1))
+            except IntegrityError:
+                pass  # seeded concurrently by another replica
+        # Blocks reserved before the data was seeded may overlap it
+        numbers._blocks.clear()
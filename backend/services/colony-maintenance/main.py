@@ -1,5 +1,8 @@
 from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from typing import List, Optional
 from datetime import datetime, timedelta
 import sys
@@ -7,11 +10,14 @@ import os
 import tempfile
 sys.path.append('../..')
 
-from shared.database import get_db, init_db
+from shared.database import SessionLocal, get_db, init_db
+from shared.aggregates import Aggregate, average, collect, count
 from shared.auth import get_current_user
-from shared.middleware import setup_cors, setup_gzip, setup_exception_handlers
+from shared.middleware import setup_cors, setup_etags, setup_compression, setup_exception_handlers, setup_deadlines
+from shared.events import setup_events
 from shared.config import settings
 from shared.file_handler import save_upload_file
+from shared.sequences import DocumentNumbers, seed_document_counters
 
 from models import (
     MaintenanceRequest, Vendor, Asset, ServiceCategory,
@@ -29,6 +35,9 @@ from schemas import (
     TechnicianCreate, TechnicianUpdate, TechnicianResponse
 )
 
+# Document numbers, reserved in blocks from document_counters
+REQUEST_NUMBERS = DocumentNumbers("MR", MaintenanceRequest.request_number)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Colony Maintenance Management Service",
@@ -38,8 +47,11 @@ app = FastAPI(
 
 # Setup middleware
 setup_cors(app, settings.CORS_ORIGINS)
-setup_gzip(app)
+setup_etags(app)
+setup_compression(app)
 setup_exception_handlers(app)
+setup_deadlines(app)
+setup_events(app)
 
 
 @app.on_event("startup")
@@ -47,12 +59,9 @@ async def startup_event():
     """Initialize database on startup"""
     init_db()
     if _should_seed() and _should_seed_first_boot("colony"):
-        db = next(get_db())
-        try:
-            _seed_colony_data(db)
-            _mark_seeded("colony")
-        finally:
-            db.close()
+        _seed_with_session()
+        _mark_seeded("colony")
+    seed_document_counters()
 
 
 def _should_seed() -> bool:
@@ -247,28 +256,33 @@ async def root():
     return {"service": "Colony Maintenance Management", "status": "running"}
 
 
-@app.post("/admin/seed")
-async def seed_colony_data(request: Request, current_user: dict = Depends(get_current_user)):
-    _require_seed_token(request)
-    db = next(get_db())
+def _seed_with_session() -> None:
+    db = SessionLocal()
     try:
         _seed_colony_data(db)
-        return {"seeded": True}
     finally:
         db.close()
 
 
+@app.post("/admin/seed")
+async def seed_colony_data(request: Request, current_user: dict = Depends(get_current_user)):
+    _require_seed_token(request)
+    # Bulk seeding is synchronous; keep it off the event loop
+    await run_in_threadpool(_seed_with_session)
+    await run_in_threadpool(seed_document_counters)
+    return {"seeded": True}
+
+
 # Maintenance Request Endpoints
 @app.post("/requests", response_model=MaintenanceRequestResponse)
 async def create_maintenance_request(
     request_data: MaintenanceRequestCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new maintenance request"""
     # Generate request number
-    count = db.query(MaintenanceRequest).count()
-    request_number = f"MR{datetime.now().year}{count + 1:06d}"
+    request_number = await REQUEST_NUMBERS.next()
     
     # Create request
     request = MaintenanceRequest(
@@ -278,11 +292,11 @@ async def create_maintenance_request(
     )
     
     db.add(request)
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
 
     _log_status_change(db, request.id, request.status, current_user.get("id"))
-    db.commit()
+    await db.commit()
     
     return request
 
@@ -294,21 +308,21 @@ async def get_maintenance_requests(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all maintenance requests"""
-    query = db.query(MaintenanceRequest)
+    query = select(MaintenanceRequest)
     
     # Filter by status
     if status:
-        query = query.filter(MaintenanceRequest.status == status)
+        query = query.where(MaintenanceRequest.status == status)
     
     # Filter by category
     if category:
-        query = query.filter(MaintenanceRequest.category == category)
+        query = query.where(MaintenanceRequest.category == category)
     
     # Get requests
-    requests = query.order_by(MaintenanceRequest.created_at.desc()).offset(skip).limit(limit).all()
+    requests = (await db.scalars(query.order_by(MaintenanceRequest.created_at.desc()).offset(skip).limit(limit))).all()
     return requests
 
 
@@ -316,10 +330,10 @@ async def get_maintenance_requests(
 async def get_maintenance_request(
     request_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific maintenance request"""
-    request = db.query(MaintenanceRequest).filter(MaintenanceRequest.id == request_id).first()
+    request = await db.get(MaintenanceRequest, request_id)
     
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -332,10 +346,10 @@ async def update_maintenance_request(
     request_id: str,
     request_data: MaintenanceRequestUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a maintenance request"""
-    request = db.query(MaintenanceRequest).filter(MaintenanceRequest.id == request_id).first()
+    request = await db.get(MaintenanceRequest, request_id)
     
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -352,8 +366,8 @@ async def update_maintenance_request(
         if new_status == RequestStatus.COMPLETED:
             request.completed_at = datetime.utcnow()
 
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     
     return request
 
@@ -363,10 +377,10 @@ async def assign_maintenance_request(
     request_id: str,
     assign_data: MaintenanceRequestAssign,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Assign vendor/technician and move to ASSIGNED."""
-    request = db.query(MaintenanceRequest).filter(MaintenanceRequest.id == request_id).first()
+    request = await db.get(MaintenanceRequest, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -377,8 +391,8 @@ async def assign_maintenance_request(
     request.status = RequestStatus.ASSIGNED
     _log_status_change(db, request.id, request.status, current_user.get("id"))
 
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     return request
 
 
@@ -387,10 +401,10 @@ async def change_request_status(
     request_id: str,
     status_change: MaintenanceStatusChange,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Change request status with history and optional notes/cost."""
-    request = db.query(MaintenanceRequest).filter(MaintenanceRequest.id == request_id).first()
+    request = await db.get(MaintenanceRequest, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
@@ -401,8 +415,8 @@ async def change_request_status(
         request.completed_at = datetime.utcnow()
 
     history = _log_status_change(db, request.id, request.status, current_user.get("id"), status_change.notes)
-    db.commit()
-    db.refresh(history)
+    await db.commit()
+    await db.refresh(history)
     return history
 
 
@@ -411,10 +425,10 @@ async def submit_feedback(
     request_id: str,
     feedback_data: FeedbackCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Submit feedback for a completed request"""
-    request = db.query(MaintenanceRequest).filter(MaintenanceRequest.id == request_id).first()
+    request = await db.get(MaintenanceRequest, request_id)
     
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -422,7 +436,7 @@ async def submit_feedback(
     request.rating = feedback_data.rating
     request.feedback = feedback_data.feedback
     
-    db.commit()
+    await db.commit()
     return {"message": "Feedback submitted successfully"}
 
 
@@ -431,10 +445,10 @@ async def upload_attachment(
     request_id: str,
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Upload attachment for maintenance request"""
-    request = db.query(MaintenanceRequest).filter(MaintenanceRequest.id == request_id).first()
+    request = await db.get(MaintenanceRequest, request_id)
     
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -453,7 +467,7 @@ async def upload_attachment(
     )
     
     db.add(attachment)
-    db.commit()
+    await db.commit()
     
     return {"message": "File uploaded successfully", "file": file_info}
 
@@ -463,13 +477,13 @@ async def upload_attachment(
 async def create_vendor(
     vendor_data: VendorCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new vendor"""
     vendor = Vendor(**vendor_data.dict())
     db.add(vendor)
-    db.commit()
-    db.refresh(vendor)
+    await db.commit()
+    await db.refresh(vendor)
     return vendor
 
 
@@ -477,15 +491,15 @@ async def create_vendor(
 async def get_vendors(
     is_active: Optional[bool] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all vendors"""
-    query = db.query(Vendor)
+    query = select(Vendor)
     
     if is_active is not None:
-        query = query.filter(Vendor.is_active == is_active)
+        query = query.where(Vendor.is_active == is_active)
     
-    vendors = query.all()
+    vendors = (await db.scalars(query)).all()
     return vendors
 
 @app.put("/vendors/{vendor_id}", response_model=VendorResponse)
@@ -493,17 +507,17 @@ async def update_vendor(
     vendor_id: str,
     vendor_data: VendorUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    vendor = db.query(Vendor).filter(Vendor.id == vendor_id).first()
+    vendor = await db.get(Vendor, vendor_id)
     if not vendor:
         raise HTTPException(status_code=404, detail="Vendor not found")
 
     for field, value in vendor_data.dict(exclude_unset=True).items():
         setattr(vendor, field, value)
 
-    db.commit()
-    db.refresh(vendor)
+    await db.commit()
+    await db.refresh(vendor)
     return vendor
 
 
@@ -512,13 +526,13 @@ async def update_vendor(
 async def create_asset(
     asset_data: AssetCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new asset"""
     asset = Asset(**asset_data.dict())
     db.add(asset)
-    db.commit()
-    db.refresh(asset)
+    await db.commit()
+    await db.refresh(asset)
     return asset
 
 
@@ -527,18 +541,18 @@ async def get_assets(
     quarter_number: Optional[str] = None,
     asset_type: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all assets"""
-    query = db.query(Asset)
+    query = select(Asset)
     
     if quarter_number:
-        query = query.filter(Asset.quarter_number == quarter_number)
+        query = query.where(Asset.quarter_number == quarter_number)
     
     if asset_type:
-        query = query.filter(Asset.asset_type == asset_type)
+        query = query.where(Asset.asset_type == asset_type)
     
-    assets = query.all()
+    assets = (await db.scalars(query)).all()
     return assets
 
 @app.put("/assets/{asset_id}", response_model=AssetResponse)
@@ -546,17 +560,17 @@ async def update_asset(
     asset_id: str,
     asset_data: AssetUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    asset = db.query(Asset).filter(Asset.id == asset_id).first()
+    asset = await db.get(Asset, asset_id)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
 
     for field, value in asset_data.dict(exclude_unset=True).items():
         setattr(asset, field, value)
 
-    db.commit()
-    db.refresh(asset)
+    await db.commit()
+    await db.refresh(asset)
     return asset
 
 
@@ -564,48 +578,31 @@ async def update_asset(
 @app.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard statistics"""
-    total_requests = db.query(MaintenanceRequest).count()
-    pending_requests = db.query(MaintenanceRequest).filter(
-        MaintenanceRequest.status.in_(
+    stats = await collect(db, Aggregate(
+        MaintenanceRequest,
+        total_requests=count(),
+        pending_requests=count(MaintenanceRequest.status.in_(
             [RequestStatus.SUBMITTED, RequestStatus.ASSIGNED, RequestStatus.MATERIALS_REQUIRED]
-        )
-    ).count()
-    in_progress = db.query(MaintenanceRequest).filter(
-        MaintenanceRequest.status == RequestStatus.IN_PROGRESS
-    ).count()
-    completed = db.query(MaintenanceRequest).filter(
-        MaintenanceRequest.status.in_([RequestStatus.COMPLETED, RequestStatus.CLOSED])
-    ).count()
-    
-    overdue_requests = db.query(MaintenanceRequest).filter(
-        MaintenanceRequest.status.in_([RequestStatus.SUBMITTED, RequestStatus.ASSIGNED, RequestStatus.IN_PROGRESS])
-    ).count()
-
-    active_recurring = db.query(RecurringMaintenance).filter(RecurringMaintenance.is_active == True).count()
-
-    open_assignments = db.query(MaintenanceRequest).filter(
-        MaintenanceRequest.status == RequestStatus.ASSIGNED
-    ).count()
-    
-    # Calculate average rating
-    avg_rating_result = db.query(MaintenanceRequest.rating).filter(
-        MaintenanceRequest.rating.isnot(None)
-    ).all()
-    avg_rating = sum(r[0] for r in avg_rating_result) / len(avg_rating_result) if avg_rating_result else 0
+        )),
+        in_progress_requests=count(MaintenanceRequest.status == RequestStatus.IN_PROGRESS),
+        completed_requests=count(MaintenanceRequest.status.in_([RequestStatus.COMPLETED, RequestStatus.CLOSED])),
+        overdue_requests=count(
+            MaintenanceRequest.status.in_([RequestStatus.SUBMITTED, RequestStatus.ASSIGNED, RequestStatus.IN_PROGRESS])
+        ),
+        open_assignments=count(MaintenanceRequest.status == RequestStatus.ASSIGNED),
+        avg_rating=average(MaintenanceRequest.rating),
+    ), Aggregate(
+        RecurringMaintenance,
+        active_recurring=count(RecurringMaintenance.is_active == True),
+    ))
     
     return {
-        "total_requests": total_requests,
-        "pending_requests": pending_requests,
-        "in_progress_requests": in_progress,
-        "completed_requests": completed,
+        **stats,
         "avg_resolution_time": 48.5,  # Placeholder
-        "avg_rating": avg_rating,
-        "overdue_requests": overdue_requests,
-        "active_recurring": active_recurring,
-        "open_assignments": open_assignments
+        "avg_rating": stats["avg_rating"] or 0
     }
 
 
@@ -614,12 +611,12 @@ async def get_dashboard_stats(
 async def create_category(
     category_data: ServiceCategoryCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     category = ServiceCategory(**category_data.dict())
     db.add(category)
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
     return category
 
 
@@ -627,12 +624,12 @@ async def create_category(
 async def get_categories(
     is_active: Optional[bool] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(ServiceCategory)
+    query = select(ServiceCategory)
     if is_active is not None:
-        query = query.filter(ServiceCategory.is_active == is_active)
-    return query.order_by(ServiceCategory.name).all()
+        query = query.where(ServiceCategory.is_active == is_active)
+    return (await db.scalars(query.order_by(ServiceCategory.name))).all()
 
 
 @app.put("/categories/{category_id}", response_model=ServiceCategoryResponse)
@@ -640,15 +637,15 @@ async def update_category(
     category_id: str,
     category_data: ServiceCategoryUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    category = db.query(ServiceCategory).filter(ServiceCategory.id == category_id).first()
+    category = await db.get(ServiceCategory, category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     for field, value in category_data.dict(exclude_unset=True).items():
         setattr(category, field, value)
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
     return category
 
 
@@ -657,12 +654,12 @@ async def update_category(
 async def create_recurring(
     recurring_data: RecurringMaintenanceCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     rec = RecurringMaintenance(**recurring_data.dict())
     db.add(rec)
-    db.commit()
-    db.refresh(rec)
+    await db.commit()
+    await db.refresh(rec)
     return rec
 
 
@@ -670,12 +667,12 @@ async def create_recurring(
 async def list_recurring(
     is_active: Optional[bool] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(RecurringMaintenance)
+    query = select(RecurringMaintenance)
     if is_active is not None:
-        query = query.filter(RecurringMaintenance.is_active == is_active)
-    return query.order_by(RecurringMaintenance.next_schedule_date).all()
+        query = query.where(RecurringMaintenance.is_active == is_active)
+    return (await db.scalars(query.order_by(RecurringMaintenance.next_schedule_date))).all()
 
 
 @app.put("/recurring/{recurring_id}", response_model=RecurringMaintenanceResponse)
@@ -683,15 +680,15 @@ async def update_recurring(
     recurring_id: str,
     recurring_data: RecurringMaintenanceUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    rec = db.query(RecurringMaintenance).filter(RecurringMaintenance.id == recurring_id).first()
+    rec = await db.get(RecurringMaintenance, recurring_id)
     if not rec:
         raise HTTPException(status_code=404, detail="Recurring maintenance not found")
     for field, value in recurring_data.dict(exclude_unset=True).items():
         setattr(rec, field, value)
-    db.commit()
-    db.refresh(rec)
+    await db.commit()
+    await db.refresh(rec)
     return rec
 
 
@@ -700,12 +697,12 @@ async def update_recurring(
 async def create_technician(
     technician_data: TechnicianCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     tech = Technician(**technician_data.dict())
     db.add(tech)
-    db.commit()
-    db.refresh(tech)
+    await db.commit()
+    await db.refresh(tech)
     return tech
 
 
@@ -714,14 +711,14 @@ async def list_technicians(
     vendor_id: Optional[str] = None,
     is_active: Optional[bool] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Technician)
+    query = select(Technician)
     if vendor_id:
-        query = query.filter(Technician.vendor_id == vendor_id)
+        query = query.where(Technician.vendor_id == vendor_id)
     if is_active is not None:
-        query = query.filter(Technician.is_active == is_active)
-    return query.order_by(Technician.name).all()
+        query = query.where(Technician.is_active == is_active)
+    return (await db.scalars(query.order_by(Technician.name))).all()
 
 
 @app.put("/technicians/{technician_id}", response_model=TechnicianResponse)
@@ -729,18 +726,18 @@ async def update_technician(
     technician_id: str,
     technician_data: TechnicianUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    tech = db.query(Technician).filter(Technician.id == technician_id).first()
+    tech = await db.get(Technician, technician_id)
     if not tech:
         raise HTTPException(status_code=404, detail="Technician not found")
     for field, value in technician_data.dict(exclude_unset=True).items():
         setattr(tech, field, value)
-    db.commit()
-    db.refresh(tech)
+    await db.commit()
+    await db.refresh(tech)
     return tech
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    from shared.server import serve
+    serve(app, "colony", port=8001)
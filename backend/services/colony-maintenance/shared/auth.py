@@ -1,33 +1,146 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 from .config import settings
-from .database import get_db
+from .revocation import revoked_tokens
 
-# Password hashing context
-# Use a portable default hash to avoid native bcrypt backend issues in serverless.
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256", "bcrypt"],
-    default="pbkdf2_sha256",
-    deprecated="auto",
-)
+# Password hashing context, built on first use: only sign-in paths hash, and
+# importing passlib is a noticeable share of a serverless cold start
+_pwd_context = None
 
-# OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+
+def _password_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        # Use a portable default hash to avoid native bcrypt backend issues in serverless.
+        _pwd_context = CryptContext(
+            schemes=["pbkdf2_sha256", "bcrypt"],
+            default="pbkdf2_sha256",
+            deprecated="auto",
+        )
+    return _pwd_context
+
+
+# OAuth2 scheme (a verified identity header from the gateway can stand in for the token)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
+
+# Header carrying the identity the gateway has already verified
+IDENTITY_HEADER = "x-epos-identity"
+_IDENTITY_KEY = hashlib.sha256(f"epos-identity:{settings.SECRET_KEY}".encode()).digest()
+
+# token hash -> (exp timestamp, user), oldest first
+_verified_tokens: "OrderedDict[str, tuple]" = OrderedDict()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return _password_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Generate password hash"""
-    return pwd_context.hash(password)
+    return _password_context().hash(password)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on a bounded thread pool.
+
+    PBKDF2 takes tens of milliseconds and hashlib releases the GIL while it
+    runs, so the event loop keeps serving other requests during a login.
+    When more hashes are waiting than the queue allows, callers get a 503
+    instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.running = 0
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.total_time = 0.0
+
+    async def run(self, fn, *args):
+        if self.workers <= 0:
+            started = time.perf_counter()
+            result = fn(*args)
+            self.completed += 1
+            self.total_time += time.perf_counter() - started
+            return result
+
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-ins in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="epos-hash")
+
+        submitted = time.perf_counter()
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+
+        def job():
+            started = time.perf_counter()
+            self.total_wait += started - submitted
+            self.running += 1
+            try:
+                return fn(*args)
+            finally:
+                self.running -= 1
+                self.total_time += time.perf_counter() - started
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "running": self.running,
+            "queue_depth": self.pending - self.running,
+            "peak_pending": self.peak_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / self.completed * 1000, 2) if self.completed else 0.0,
+            "avg_hash_ms": round(self.total_time / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -38,11 +151,92 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
+def create_refresh_token(user_id: str, email: Optional[str], family: Optional[str] = None) -> str:
+    """
+    Create a single-use refresh token.
+
+    Every token rotated out of the same login shares a family id, so a reused
+    refresh token can revoke the whole chain.
+    """
+    payload = {
+        "sub": user_id,
+        "email": email,
+        "type": "refresh",
+        "jti": uuid.uuid4().hex,
+        "fam": family or uuid.uuid4().hex,
+        "exp": datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def issue_tokens(user_id: str, email: Optional[str], family: Optional[str] = None) -> Dict[str, str]:
+    """Access/refresh pair returned by login and refresh"""
+    return {
+        "access_token": create_access_token(data={"sub": str(user_id), "email": email}),
+        "refresh_token": create_refresh_token(str(user_id), email, family),
+        "token_type": "bearer",
+    }
+
+
+def _decode_refresh_token(token: str) -> Dict[str, Any]:
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        payload = {}
+    if payload.get("type") != "refresh" or not payload.get("sub"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+        )
+    return payload
+
+
+async def rotate_refresh_token(token: str) -> Dict[str, Any]:
+    """
+    Spend a refresh token and return its payload.
+
+    The token is revoked so it cannot be used twice. Presenting one that was
+    already spent revokes its whole family, which logs out whoever copied it.
+    """
+    payload = _decode_refresh_token(token)
+    jti, family = f"jti:{payload.get('jti')}", f"fam:{payload.get('fam')}"
+    if await revoked_tokens.is_revoked(family, strict=True):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token revoked")
+
+    # Check and revoke in one step, so two concurrent refreshes cannot both pass
+    spent = await revoked_tokens.spend(jti, payload["exp"])
+    if spent is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token revoked")
+    if not spent:
+        await revoked_tokens.revoke(family, payload["exp"])
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token already used")
+    return payload
+
+
+async def revoke_refresh_token(token: str) -> None:
+    """Revoke a refresh token's family; invalid tokens are ignored"""
+    try:
+        payload = _decode_refresh_token(token)
+    except HTTPException:
+        return
+    await revoked_tokens.revoke(f"fam:{payload.get('fam')}", payload["exp"])
+
+
+async def revoke_access_token(token: str) -> None:
+    """Revoke an access token until it expires; invalid tokens are ignored"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return
+    if payload.get("jti"):
+        await revoked_tokens.revoke(f"jti:{payload['jti']}", payload.get("exp", 0))
+
+
 def decode_token(token: str) -> Dict[str, Any]:
     """Decode and verify JWT token"""
     try:
@@ -56,15 +250,52 @@ def decode_token(token: str) -> Dict[str, Any]:
         )
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> Dict[str, Any]:
-    """Get current authenticated user"""
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def sign_identity(user: Dict[str, Any]) -> str:
+    """Compact HMAC-signed identity for forwarding to the services"""
+    payload = _b64encode(json.dumps(user, separators=(",", ":")).encode())
+    signature = _b64encode(hmac.new(_IDENTITY_KEY, payload.encode(), hashlib.sha256).digest())
+    return f"{payload}.{signature}"
+
+
+def verify_identity(identity: str) -> Optional[Dict[str, Any]]:
+    """Return the user in a signed identity header, or None if invalid or expired"""
+    payload, _, signature = identity.partition(".")
+    expected = _b64encode(hmac.new(_IDENTITY_KEY, payload.encode(), hashlib.sha256).digest())
+    if not hmac.compare_digest(signature, expected):
+        return None
+    try:
+        user = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if user.get("exp", 0) <= time.time():
+        return None
+    return user
+
+
+def _user_from_token(token: str) -> Dict[str, Any]:
+    """Decode a bearer token, reusing the result until the token expires"""
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    cached = _verified_tokens.get(token_hash)
+    if cached is not None:
+        expires_at, user = cached
+        if expires_at > time.time():
+            _verified_tokens.move_to_end(token_hash)
+            return user
+        del _verified_tokens[token_hash]
+
     payload = decode_token(token)
     user_id: str = payload.get("sub")
     
-    if user_id is None:
+    # Refresh tokens are only good at /api/auth/refresh
+    if user_id is None or payload.get("type") == "refresh":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
@@ -72,14 +303,44 @@ async def get_current_user(
     
     # Query user from database
     # This is a placeholder - implement actual user model query
-    user = {"id": user_id, "email": payload.get("email")}
-    
-    if user is None:
+    user = {
+        "id": user_id,
+        "email": payload.get("email"),
+        "exp": payload.get("exp", 0),
+        "jti": payload.get("jti"),
+    }
+
+    _verified_tokens[token_hash] = (user["exp"], user)
+    while len(_verified_tokens) > settings.TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+    return user
+
+
+async def get_current_user(
+    request: Request,
+    token: Optional[str] = Depends(oauth2_scheme)
+) -> Dict[str, Any]:
+    """Get current authenticated user"""
+    # Fast path: the gateway already verified the token and signed the result
+    identity = request.headers.get(IDENTITY_HEADER)
+    if identity:
+        user = verify_identity(identity)
+        if user is not None:
+            return user
+
+    if token is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user = _user_from_token(token)
+    if user.get("jti") and await revoked_tokens.is_revoked(f"jti:{user['jti']}"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revoked",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-    
     return user
 
 
@@ -1,7 +1,7 @@
 from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
-from mangum import Mangum
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 import sys
@@ -11,7 +11,9 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from shared.database import get_db
+from shared.aggregates import Aggregate, average, collect, count
 from shared.auth import get_current_user
+from shared.sequences import DocumentNumbers
 from models import MaintenanceRequest, Vendor, Asset, RequestStatus
 from schemas import (
     MaintenanceRequestCreate, MaintenanceRequestUpdate, MaintenanceRequestResponse,
@@ -19,6 +21,9 @@ from schemas import (
     FeedbackCreate, DashboardStats
 )
 
+# Document numbers, reserved in blocks from document_counters
+REQUEST_NUMBERS = DocumentNumbers("MR", MaintenanceRequest.request_number)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Colony Maintenance Service",
@@ -46,11 +51,10 @@ async def root():
 async def create_maintenance_request(
     request_data: MaintenanceRequestCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new maintenance request"""
-    count = db.query(MaintenanceRequest).count()
-    request_number = f"MR{datetime.now().year}{count + 1:06d}"
+    request_number = await REQUEST_NUMBERS.next()
     
     request = MaintenanceRequest(
         request_number=request_number,
@@ -59,8 +63,8 @@ async def create_maintenance_request(
     )
     
     db.add(request)
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     
     return request
 
@@ -71,52 +75,48 @@ async def get_maintenance_requests(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all maintenance requests"""
-    query = db.query(MaintenanceRequest)
+    query = select(MaintenanceRequest)
     
     if status:
-        query = query.filter(MaintenanceRequest.status == status)
+        query = query.where(MaintenanceRequest.status == status)
     
     if category:
-        query = query.filter(MaintenanceRequest.category == category)
+        query = query.where(MaintenanceRequest.category == category)
     
-    requests = query.offset(skip).limit(limit).all()
+    requests = (await db.scalars(query.offset(skip).limit(limit))).all()
     return requests
 
 @app.get("/api/colony/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard statistics"""
-    total_requests = db.query(MaintenanceRequest).count()
-    pending_requests = db.query(MaintenanceRequest).filter(
-        MaintenanceRequest.status.in_(
+    stats = await collect(db, Aggregate(
+        MaintenanceRequest,
+        total_requests=count(),
+        pending_requests=count(MaintenanceRequest.status.in_(
             [RequestStatus.SUBMITTED, RequestStatus.ASSIGNED, RequestStatus.MATERIALS_REQUIRED]
-        )
-    ).count()
-    in_progress = db.query(MaintenanceRequest).filter(
-        MaintenanceRequest.status == RequestStatus.IN_PROGRESS
-    ).count()
-    completed = db.query(MaintenanceRequest).filter(
-        MaintenanceRequest.status.in_([RequestStatus.COMPLETED, RequestStatus.CLOSED])
-    ).count()
-    
-    avg_rating_result = db.query(MaintenanceRequest.rating).filter(
-        MaintenanceRequest.rating.isnot(None)
-    ).all()
-    avg_rating = sum(r[0] for r in avg_rating_result) / len(avg_rating_result) if avg_rating_result else 0
+        )),
+        in_progress_requests=count(MaintenanceRequest.status == RequestStatus.IN_PROGRESS),
+        completed_requests=count(MaintenanceRequest.status.in_([RequestStatus.COMPLETED, RequestStatus.CLOSED])),
+        avg_rating=average(MaintenanceRequest.rating),
+    ))
     
     return {
-        "total_requests": total_requests,
-        "pending_requests": pending_requests,
-        "in_progress_requests": in_progress,
-        "completed_requests": completed,
+        **stats,
         "avg_resolution_time": 48.5,
-        "avg_rating": avg_rating
+        "avg_rating": stats["avg_rating"] or 0
     }
 
-# Vercel serverless handler
-handler = Mangum(app)
+def __getattr__(name: str):
+    """Vercel serverless handler, built on first access: the Vercel runtime serves `app` directly"""
+    if name == "handler":
+        from mangum import Mangum
+
+        globals()["handler"] = Mangum(app)
+        return globals()["handler"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
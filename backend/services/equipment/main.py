@@ -1,5 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from typing import List, Optional
 from datetime import datetime, timedelta
 import sys
@@ -9,12 +12,15 @@ import tempfile
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from shared.database import get_db, engine
+from shared.database import SessionLocal, get_db, init_db
+from shared.aggregates import Aggregate, collect, count
 from shared.middleware import setup_middleware
 from shared.auth import get_current_user
 from shared.models import User
+from shared.sequences import DocumentNumbers, seed_document_counters
+from shared.pagination import paginate
 
-from models import Base, Equipment, OperatorCertification, EquipmentBooking, UsageLog, MaintenanceSchedule, SafetyPermit, EquipmentStatus, BookingStatus, EquipmentType
+from models import Equipment, OperatorCertification, EquipmentBooking, UsageLog, MaintenanceSchedule, SafetyPermit, EquipmentStatus, BookingStatus, EquipmentType
 from schemas import (
     EquipmentCreate, EquipmentUpdate, EquipmentResponse,
     CertificationCreate, CertificationResponse,
@@ -25,7 +31,11 @@ from schemas import (
     DashboardStats
 )
 
-Base.metadata.create_all(bind=engine)
+# Document numbers, reserved in blocks from document_counters
+BOOKING_NUMBERS = DocumentNumbers("EQ", EquipmentBooking.booking_number)
+PERMIT_NUMBERS = DocumentNumbers("SP", SafetyPermit.permit_number)
+
+init_db()
 
 app = FastAPI(title="Equipment Management Service", version="1.0.0")
 setup_middleware(app)
@@ -106,15 +116,20 @@ def _seed_equipment_data(db: Session) -> None:
     db.commit()
 
 
+def _seed_with_session() -> None:
+    db = SessionLocal()
+    try:
+        _seed_equipment_data(db)
+    finally:
+        db.close()
+
+
 @app.on_event("startup")
 async def startup_event():
     if _should_seed() and _should_seed_first_boot("equipment"):
-        db = next(get_db())
-        try:
-            _seed_equipment_data(db)
-            _mark_seeded("equipment")
-        finally:
-            db.close()
+        _seed_with_session()
+        _mark_seeded("equipment")
+    seed_document_counters()
 
 @app.get("/")
 async def root():
@@ -124,24 +139,22 @@ async def root():
 @app.post("/admin/seed")
 async def seed_equipment_data(request: Request, current_user: User = Depends(get_current_user)):
     _require_seed_token(request)
-    db = next(get_db())
-    try:
-        _seed_equipment_data(db)
-        return {"seeded": True}
-    finally:
-        db.close()
+    # Bulk seeding is synchronous; keep it off the event loop
+    await run_in_threadpool(_seed_with_session)
+    await run_in_threadpool(seed_document_counters)
+    return {"seeded": True}
 
 # Equipment Management
 @app.post("/equipment", response_model=EquipmentResponse)
 async def create_equipment(
     equipment_data: EquipmentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     equipment = Equipment(**equipment_data.model_dump())
     db.add(equipment)
-    db.commit()
-    db.refresh(equipment)
+    await db.commit()
+    await db.refresh(equipment)
     return equipment
 
 @app.get("/equipment", response_model=List[EquipmentResponse])
@@ -150,23 +163,23 @@ async def list_equipment(
     equipment_type: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Equipment)
+    query = select(Equipment)
     if status:
-        query = query.filter(Equipment.status == status)
+        query = query.where(Equipment.status == status)
     if equipment_type:
-        query = query.filter(Equipment.equipment_type == equipment_type)
-    return query.order_by(Equipment.created_at.desc()).offset(skip).limit(limit).all()
+        query = query.where(Equipment.equipment_type == equipment_type)
+    return (await db.scalars(query.order_by(Equipment.created_at.desc()).offset(skip).limit(limit))).all()
 
 @app.get("/equipment/{equipment_id}", response_model=EquipmentResponse)
 async def get_equipment(
     equipment_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    equipment = db.query(Equipment).filter(Equipment.id == equipment_id).first()
+    equipment = await db.get(Equipment, equipment_id)
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     return equipment
@@ -175,31 +188,31 @@ async def get_equipment(
 async def update_equipment(
     equipment_id: str,
     equipment_data: EquipmentUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    equipment = db.query(Equipment).filter(Equipment.id == equipment_id).first()
+    equipment = await db.get(Equipment, equipment_id)
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     
     for key, value in equipment_data.model_dump(exclude_unset=True).items():
         setattr(equipment, key, value)
     
-    db.commit()
-    db.refresh(equipment)
+    await db.commit()
+    await db.refresh(equipment)
     return equipment
 
 # Operator Certifications
 @app.post("/certifications", response_model=CertificationResponse)
 async def create_certification(
     cert_data: CertificationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     certification = OperatorCertification(**cert_data.model_dump())
     db.add(certification)
-    db.commit()
-    db.refresh(certification)
+    await db.commit()
+    await db.refresh(certification)
     return certification
 
 @app.get("/certifications", response_model=List[CertificationResponse])
@@ -207,35 +220,35 @@ async def list_certifications(
     operator_id: Optional[str] = None,
     equipment_type: Optional[str] = None,
     active_only: bool = True,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(OperatorCertification)
+    query = select(OperatorCertification)
     if operator_id:
-        query = query.filter(OperatorCertification.operator_id == operator_id)
+        query = query.where(OperatorCertification.operator_id == operator_id)
     if equipment_type:
-        query = query.filter(OperatorCertification.equipment_type == equipment_type)
+        query = query.where(OperatorCertification.equipment_type == equipment_type)
     if active_only:
-        query = query.filter(
+        query = query.where(
             OperatorCertification.is_active == True,
             OperatorCertification.expiry_date > datetime.now()
         )
-    return query.all()
+    return (await db.scalars(query)).all()
 
 # Verify operator certification
 @app.get("/certifications/verify/{operator_id}/{equipment_type}")
 async def verify_certification(
     operator_id: str,
     equipment_type: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    certification = db.query(OperatorCertification).filter(
+    certification = await db.scalar(select(OperatorCertification).where(
         OperatorCertification.operator_id == operator_id,
         OperatorCertification.equipment_type == equipment_type,
         OperatorCertification.is_active == True,
         OperatorCertification.expiry_date > datetime.now()
-    ).first()
+    ))
     
     return {
         "is_certified": certification is not None,
@@ -246,43 +259,39 @@ async def verify_certification(
 @app.post("/bookings", response_model=BookingResponse)
 async def create_booking(
     booking_data: BookingCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     # Check equipment availability
-    equipment = db.query(Equipment).filter(Equipment.id == booking_data.equipment_id).first()
+    equipment = await db.get(Equipment, booking_data.equipment_id)
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     
     # Check operator certification if required
     if equipment.requires_certification:
-        certification = db.query(OperatorCertification).filter(
+        certification = await db.scalar(select(OperatorCertification).where(
             OperatorCertification.operator_id == booking_data.operator_id,
             OperatorCertification.equipment_type == equipment.equipment_type,
             OperatorCertification.is_active == True,
             OperatorCertification.expiry_date > datetime.now()
-        ).first()
+        ))
         
         if not certification:
             raise HTTPException(status_code=400, detail="Operator not certified for this equipment type")
     
     # Check for overlapping bookings
-    overlapping = db.query(EquipmentBooking).filter(
+    overlapping = await db.scalar(select(EquipmentBooking).where(
         EquipmentBooking.equipment_id == booking_data.equipment_id,
         EquipmentBooking.status.in_([BookingStatus.APPROVED, BookingStatus.ACTIVE]),
         EquipmentBooking.start_time < booking_data.end_time,
         EquipmentBooking.end_time > booking_data.start_time
-    ).first()
+    ))
     
     if overlapping:
         raise HTTPException(status_code=400, detail="Equipment not available for selected time slot")
     
     # Generate booking number
-    year = datetime.now().year
-    count = db.query(EquipmentBooking).filter(
-        EquipmentBooking.booking_number.like(f"EQ{year}%")
-    ).count()
-    booking_number = f"EQ{year}{count + 1:06d}"
+    booking_number = await BOOKING_NUMBERS.next()
     
     booking = EquipmentBooking(
         **booking_data.model_dump(),
@@ -290,41 +299,45 @@ async def create_booking(
         requested_by_id=_get_user_id(current_user)
     )
     db.add(booking)
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    await db.refresh(booking)
     return booking
 
 @app.get("/bookings", response_model=List[BookingResponse])
 async def list_bookings(
+    response: Response,
     status: Optional[BookingStatus] = None,
     equipment_id: Optional[str] = None,
     operator_id: Optional[str] = None,
     from_date: Optional[datetime] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(EquipmentBooking)
+    query = select(EquipmentBooking)
     if status:
-        query = query.filter(EquipmentBooking.status == status)
+        query = query.where(EquipmentBooking.status == status)
     if equipment_id:
-        query = query.filter(EquipmentBooking.equipment_id == equipment_id)
+        query = query.where(EquipmentBooking.equipment_id == equipment_id)
     if operator_id:
-        query = query.filter(EquipmentBooking.operator_id == operator_id)
+        query = query.where(EquipmentBooking.operator_id == operator_id)
     if from_date:
-        query = query.filter(EquipmentBooking.start_time >= from_date)
+        query = query.where(EquipmentBooking.start_time >= from_date)
     
-    return query.order_by(EquipmentBooking.start_time.desc()).offset(skip).limit(limit).all()
+    return await paginate(
+        db, query, EquipmentBooking.start_time, EquipmentBooking.id, response, skip, limit, cursor
+    )
 
 @app.put("/bookings/{booking_id}", response_model=BookingResponse)
 async def update_booking(
     booking_id: str,
     booking_data: BookingUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    booking = db.query(EquipmentBooking).filter(EquipmentBooking.id == booking_id).first()
+    booking = await db.get(EquipmentBooking, booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -333,31 +346,31 @@ async def update_booking(
     
     # Update equipment status
     if booking_data.status == BookingStatus.ACTIVE:
-        equipment = db.query(Equipment).filter(Equipment.id == booking.equipment_id).first()
+        equipment = await db.get(Equipment, booking.equipment_id)
         equipment.status = EquipmentStatus.IN_USE
         booking.actual_start_time = datetime.now()
     elif booking_data.status == BookingStatus.COMPLETED:
-        equipment = db.query(Equipment).filter(Equipment.id == booking.equipment_id).first()
+        equipment = await db.get(Equipment, booking.equipment_id)
         equipment.status = EquipmentStatus.AVAILABLE
         booking.actual_end_time = datetime.now()
     
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    await db.refresh(booking)
     return booking
 
 @app.post("/bookings/{booking_id}/approve")
 async def approve_booking(
     booking_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    booking = db.query(EquipmentBooking).filter(EquipmentBooking.id == booking_id).first()
+    booking = await db.get(EquipmentBooking, booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
     booking.status = BookingStatus.APPROVED
     booking.approved_by_id = _get_user_id(current_user)
-    db.commit()
+    await db.commit()
     
     return {"message": "Booking approved", "booking_id": booking_id}
 
@@ -365,22 +378,22 @@ async def approve_booking(
 @app.post("/usage-logs", response_model=UsageLogResponse)
 async def create_usage_log(
     log_data: UsageLogCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     usage_log = UsageLog(**log_data.model_dump())
     db.add(usage_log)
-    db.commit()
-    db.refresh(usage_log)
+    await db.commit()
+    await db.refresh(usage_log)
     return usage_log
 
 @app.get("/usage-logs/{booking_id}", response_model=UsageLogResponse)
 async def get_usage_log(
     booking_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    usage_log = db.query(UsageLog).filter(UsageLog.booking_id == booking_id).first()
+    usage_log = await db.scalar(select(UsageLog).where(UsageLog.booking_id == booking_id))
     if not usage_log:
         raise HTTPException(status_code=404, detail="Usage log not found")
     return usage_log
@@ -389,18 +402,18 @@ async def get_usage_log(
 @app.post("/maintenance", response_model=MaintenanceResponse)
 async def create_maintenance(
     maintenance_data: MaintenanceCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     maintenance = MaintenanceSchedule(**maintenance_data.model_dump())
     db.add(maintenance)
     
     # Update equipment status
-    equipment = db.query(Equipment).filter(Equipment.id == maintenance_data.equipment_id).first()
+    equipment = await db.get(Equipment, maintenance_data.equipment_id)
     equipment.status = EquipmentStatus.MAINTENANCE
     
-    db.commit()
-    db.refresh(maintenance)
+    await db.commit()
+    await db.refresh(maintenance)
     return maintenance
 
 @app.get("/maintenance", response_model=List[MaintenanceResponse])
@@ -409,25 +422,25 @@ async def list_maintenance(
     pending_only: bool = False,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(MaintenanceSchedule)
+    query = select(MaintenanceSchedule)
     if equipment_id:
-        query = query.filter(MaintenanceSchedule.equipment_id == equipment_id)
+        query = query.where(MaintenanceSchedule.equipment_id == equipment_id)
     if pending_only:
-        query = query.filter(MaintenanceSchedule.completed_date == None)
+        query = query.where(MaintenanceSchedule.completed_date == None)
     
-    return query.order_by(MaintenanceSchedule.scheduled_date.desc()).offset(skip).limit(limit).all()
+    return (await db.scalars(query.order_by(MaintenanceSchedule.scheduled_date.desc()).offset(skip).limit(limit))).all()
 
 @app.put("/maintenance/{maintenance_id}", response_model=MaintenanceResponse)
 async def update_maintenance(
     maintenance_id: str,
     maintenance_data: MaintenanceUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    maintenance = db.query(MaintenanceSchedule).filter(MaintenanceSchedule.id == maintenance_id).first()
+    maintenance = await db.get(MaintenanceSchedule, maintenance_id)
     if not maintenance:
         raise HTTPException(status_code=404, detail="Maintenance record not found")
     
@@ -436,26 +449,22 @@ async def update_maintenance(
     
     # If completed, update equipment status
     if maintenance_data.completed_date:
-        equipment = db.query(Equipment).filter(Equipment.id == maintenance.equipment_id).first()
+        equipment = await db.get(Equipment, maintenance.equipment_id)
         equipment.status = EquipmentStatus.AVAILABLE
     
-    db.commit()
-    db.refresh(maintenance)
+    await db.commit()
+    await db.refresh(maintenance)
     return maintenance
 
 # Safety Permits
 @app.post("/safety-permits", response_model=SafetyPermitResponse)
 async def create_safety_permit(
     permit_data: SafetyPermitCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     # Generate permit number
-    year = datetime.now().year
-    count = db.query(SafetyPermit).filter(
-        SafetyPermit.permit_number.like(f"SP{year}%")
-    ).count()
-    permit_number = f"SP{year}{count + 1:06d}"
+    permit_number = await PERMIT_NUMBERS.next()
     
     permit = SafetyPermit(
         **permit_data.model_dump(),
@@ -463,17 +472,17 @@ async def create_safety_permit(
         issued_by_id=_get_user_id(current_user)
     )
     db.add(permit)
-    db.commit()
-    db.refresh(permit)
+    await db.commit()
+    await db.refresh(permit)
     return permit
 
 @app.get("/safety-permits/{permit_id}", response_model=SafetyPermitResponse)
 async def get_safety_permit(
     permit_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    permit = db.query(SafetyPermit).filter(SafetyPermit.id == permit_id).first()
+    permit = await db.get(SafetyPermit, permit_id)
     if not permit:
         raise HTTPException(status_code=404, detail="Safety permit not found")
     return permit
@@ -481,46 +490,36 @@ async def get_safety_permit(
 # Dashboard Stats
 @app.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    total_equipment = db.query(Equipment).count()
-    available_equipment = db.query(Equipment).filter(Equipment.status == EquipmentStatus.AVAILABLE).count()
-    in_use_equipment = db.query(Equipment).filter(Equipment.status == EquipmentStatus.IN_USE).count()
-    maintenance_equipment = db.query(Equipment).filter(Equipment.status == EquipmentStatus.MAINTENANCE).count()
-    
-    total_bookings = db.query(EquipmentBooking).count()
-    active_bookings = db.query(EquipmentBooking).filter(
-        EquipmentBooking.status.in_([BookingStatus.APPROVED, BookingStatus.ACTIVE])
-    ).count()
-    pending_approvals = db.query(EquipmentBooking).filter(
-        EquipmentBooking.status == BookingStatus.REQUESTED
-    ).count()
-    
-    utilization_rate = (in_use_equipment / total_equipment * 100) if total_equipment > 0 else 0
+    stats = await collect(db, Aggregate(
+        Equipment,
+        total_equipment=count(),
+        available_equipment=count(Equipment.status == EquipmentStatus.AVAILABLE),
+        in_use_equipment=count(Equipment.status == EquipmentStatus.IN_USE),
+        maintenance_equipment=count(Equipment.status == EquipmentStatus.MAINTENANCE),
+    ), Aggregate(
+        EquipmentBooking,
+        total_bookings=count(),
+        active_bookings=count(EquipmentBooking.status.in_([BookingStatus.APPROVED, BookingStatus.ACTIVE])),
+        pending_approvals=count(EquipmentBooking.status == BookingStatus.REQUESTED),
+    ), Aggregate(
+        MaintenanceSchedule,
+        pending_maintenance=count(MaintenanceSchedule.completed_date == None),
+    ), Aggregate(
+        OperatorCertification,
+        expired_certifications=count(
+            OperatorCertification.expiry_date < datetime.now(),
+            OperatorCertification.is_active == True
+        ),
+    ))
     
-    pending_maintenance = db.query(MaintenanceSchedule).filter(
-        MaintenanceSchedule.completed_date == None
-    ).count()
+    total_equipment = stats["total_equipment"]
+    utilization_rate = (stats["in_use_equipment"] / total_equipment * 100) if total_equipment > 0 else 0
     
-    expired_certifications = db.query(OperatorCertification).filter(
-        OperatorCertification.expiry_date < datetime.now(),
-        OperatorCertification.is_active == True
-    ).count()
-    
-    return {
-        "total_equipment": total_equipment,
-        "available_equipment": available_equipment,
-        "in_use_equipment": in_use_equipment,
-        "maintenance_equipment": maintenance_equipment,
-        "total_bookings": total_bookings,
-        "active_bookings": active_bookings,
-        "pending_approvals": pending_approvals,
-        "utilization_rate": round(utilization_rate, 2),
-        "pending_maintenance": pending_maintenance,
-        "expired_certifications": expired_certifications
-    }
+    return {**stats, "utilization_rate": round(utilization_rate, 2)}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8003)
+    from shared.server import serve
+    serve(app, "equipment", port=8003)
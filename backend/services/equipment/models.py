@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, Enum, Text, Index
 from sqlalchemy.orm import relationship
 import enum
 
@@ -75,6 +75,8 @@ class OperatorCertification(Base):
 
 class EquipmentBooking(Base):
     __tablename__ = "equipment_bookings"
+    # Keyset paging for GET /bookings
+    __table_args__ = (Index("ix_equipment_bookings_start_time_id", "start_time", "id"),)
 
     id = Column(String(36), primary_key=True, default=generate_uuid)
     booking_number = Column(String(50), unique=True, nullable=False, index=True)
@@ -24,6 +24,23 @@ class Settings(BaseSettings):
     
     # Database - Use absolute path for SQLite
     DATABASE_URL: str = _DEFAULT_DB_URL
+    # SQLite connection profile. "production" applies SQLITE_PRAGMAS to every
+    # new connection so the gateway and services can share one file: WAL lets
+    # readers carry on beside the writer, and writers wait busy_timeout for
+    # each other instead of failing with "database is locked". "default"
+    # keeps SQLite's own settings. WAL sticks to the file once set.
+    SQLITE_PROFILE: str = "production"
+    SQLITE_PRAGMAS: dict = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",  # fsync at checkpoints, not every commit; safe with WAL
+        "busy_timeout": 5000,  # ms
+        "cache_size": -65536,  # negative is KiB: 64 MiB page cache per connection
+        "mmap_size": 268435456,  # 256 MiB of the file read through mmap
+        "temp_store": "MEMORY",
+    }
+    # Document numbers (ORD, GP, MR, ...) each process reserves per round trip
+    # to document_counters; numbers left in a block when a process stops are skipped
+    SEQUENCE_BLOCK_SIZE: int = 20
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
@@ -33,6 +50,9 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 8  # 8 minutes
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    TOKEN_CACHE_SIZE: int = 10000  # verified tokens kept per process
+    PASSWORD_HASH_WORKERS: int = 4  # threads for password hashing; 0 hashes inline
+    PASSWORD_HASH_MAX_QUEUE: int = 100  # hashes waiting beyond this get a 503
     
     # CORS
     CORS_ORIGINS: list = [
@@ -71,6 +91,113 @@ class Settings(BaseSettings):
     VEHICLE_SERVICE_URL: str = "http://localhost:8005"
     VISITOR_SERVICE_URL: str = "http://localhost:8006"
     CANTEEN_SERVICE_URL: str = "http://localhost:8007"
+    # "remote" proxies to *_SERVICE_URL; "local" mounts the service inside the gateway
+    SERVICE_MODES: dict = {}
+    
+    # Upstream connection pools (API gateway -> services)
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 30.0  # seconds
+    UPSTREAM_TIMEOUT: float = 10.0  # seconds
+    UPSTREAM_CONNECT_TIMEOUT: float = 3.0  # seconds
+    # Per-service overrides, e.g. {"canteen": {"max_connections": 200, "timeout": 5}}
+    UPSTREAM_OVERRIDES: dict = {}
+    # Relay bodies chunk by chunk instead of buffering and re-serialising JSON
+    PROXY_STREAMING: bool = True
+    
+    # Unix domain sockets per service for single-host installs, e.g.
+    # {"canteen": "/run/epos/canteen.sock"}; the service listens on it instead
+    # of its port and the gateway connects to it instead of *_SERVICE_URL
+    SERVICE_SOCKETS: dict = {}
+    
+    # Response compression, encodings in server preference order; br and zstd
+    # are offered only where the brotli / zstandard packages are installed
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1000  # bytes
+    COMPRESSION_ENCODINGS: list = ["zstd", "br", "gzip"]
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 4
+    ZSTD_LEVEL: int = 3
+    
+    # Replicas per service, e.g. {"canteen": ["http://canteen-1:8007", "http://canteen-2:8007"]};
+    # services not listed use their *_SERVICE_URL. Balancer: "least_outstanding" or "p2c".
+    SERVICE_REPLICAS: dict = {}
+    UPSTREAM_BALANCER: str = "least_outstanding"
+    HEALTH_PROBE_PATH: str = "/"
+    HEALTH_PROBE_INTERVAL: float = 5.0  # seconds; 0 disables probing
+    HEALTH_PROBE_TIMEOUT: float = 1.0
+    HEALTH_PROBE_FAILURES: int = 2  # failed probes in a row before a replica is drained
+    HEALTH_PROBE_SUCCESSES: int = 2  # good probes in a row before it takes traffic again
+    
+    # Per-upstream circuit breaker
+    BREAKER_ENABLED: bool = True
+    BREAKER_WINDOW: int = 20  # most recent calls considered
+    BREAKER_MIN_CALLS: int = 5  # calls needed before the circuit can open
+    BREAKER_FAILURE_RATE: float = 0.5  # share of bad calls that opens the circuit
+    BREAKER_SLOW_CALL_SECONDS: float = 5.0  # slower calls count as bad
+    BREAKER_OPEN_SECONDS: float = 15.0  # cool-down before half-open trials
+    BREAKER_HALF_OPEN_CALLS: int = 1  # trial calls allowed while half-open
+    
+    # Aggregated dashboard (/api/dashboard/summary)
+    DASHBOARD_DEADLINE: float = 3.0  # seconds, per service
+    DASHBOARD_DEADLINES: dict = {}  # per-service overrides, e.g. {"vigilance": 1.5}
+    
+    # Gateway admission control: per-class concurrency limits and queues.
+    # limit 0 means never queued; queue is how many may wait; timeout in seconds.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_CLASSES: dict = {
+        "critical": {"limit": 0},
+        "standard": {"limit": 0},
+        "reads": {"limit": 64, "queue": 128, "timeout": 5.0},
+        "reports": {"limit": 8, "queue": 32, "timeout": 2.0},
+        "streams": {"limit": 0},  # long-lived event streams, bounded by EVENTS_MAX_SUBSCRIBERS
+    }
+    # Matched in order against the method and the gateway path
+    ADMISSION_RULES: list = [
+        {"class": "critical", "path": "/api/vigilance/sos*"},
+        {"class": "critical", "methods": ["POST", "PUT", "PATCH"], "path": "/api/vigilance/incidents*"},
+        {"class": "critical", "methods": ["POST", "PUT", "PATCH"], "path": "/api/visitor/entry-exit*"},
+        {"class": "critical", "path": "/health*"},
+        {"class": "critical", "path": "/api/health*"},
+        {"class": "streams", "methods": ["GET"], "path": "/api/events"},
+        {"class": "standard", "methods": ["POST", "PUT", "PATCH", "DELETE", "OPTIONS"], "path": "*"},
+        {"class": "reports", "path": "/api/dashboard/*"},
+        {"class": "reports", "path": "/api/*/dashboard/*"},
+    ]
+    ADMISSION_DEFAULT_CLASS: str = "reads"
+    
+    # Last-known-good dashboard payloads served while a refresh runs (seconds)
+    LAST_GOOD_REFRESH_AFTER: float = 10.0
+    LAST_GOOD_MAX_AGE: float = 86400.0  # older payloads are not worth showing
+    LAST_GOOD_MAX_ENTRIES: int = 500
+    
+    # Server-Sent Events hub (GET /api/events); relayed through Redis when reachable
+    EVENTS_ENABLED: bool = True
+    EVENTS_BACKLOG: int = 1000  # recent events kept for Last-Event-ID resumes
+    EVENTS_SUBSCRIBER_QUEUE: int = 256  # a client further behind is told to resync
+    EVENTS_MAX_SUBSCRIBERS: int = 1000
+    EVENTS_HEARTBEAT: float = 15.0  # seconds between keepalive comments
+    EVENTS_RETRY_MS: int = 3000  # reconnect delay suggested to clients
+    
+    # POST /api/batch: GETs per batch and how many of them run at once
+    BATCH_MAX_ITEMS: int = 20
+    BATCH_CONCURRENCY: int = 8
+    
+    # Gateway GET response cache ("redis" falls back to memory when unreachable)
+    CACHE_ENABLED: bool = True
+    CACHE_BACKEND: str = "redis"
+    CACHE_MAX_ENTRIES: int = 1000  # in-memory LRU size
+    # Matched in order against the service and its local path; ttl in seconds.
+    # per_user keeps a separate entry per authenticated user.
+    CACHE_RULES: list = [
+        {"service": "canteen", "path": "/menus*", "ttl": 60},
+        {"service": "canteen", "path": "/menu-items/menu/*", "ttl": 60},
+        {"service": "canteen", "path": "/orders/my-orders", "ttl": 10, "per_user": True},
+        {"service": "guesthouse", "path": "/rooms*", "ttl": 30},
+        {"service": "vigilance", "path": "/checkpoints*", "ttl": 300},
+        {"service": "colony", "path": "/categories", "ttl": 300},
+        {"service": "*", "path": "/dashboard/stats", "ttl": 15},
+    ]
     
     class Config:
         env_file = str(BACKEND_DIR / ".env")
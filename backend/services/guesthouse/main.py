@@ -1,6 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
+from sqlalchemy import func, select, text
 from typing import List, Optional
 from datetime import datetime, timedelta
 import sys
@@ -10,12 +12,18 @@ import tempfile
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from shared.database import get_db, engine
+from shared.database import SessionLocal, get_db, init_db
+from shared.deadline import DeadlineExceeded
+from shared.aggregates import Aggregate, collect, count, total
 from shared.middleware import setup_middleware
+from shared.events import publish_event
+from shared.etag import conditional_get
 from shared.auth import get_current_user
 from shared.models import User
+from shared.sequences import DocumentNumbers, seed_document_counters
+from shared.pagination import paginate
 
-from models import Base, Room, Booking, Billing, Housekeeping, RoomStatus, BookingStatus, RoomType
+from models import Room, Booking, Billing, Housekeeping, RoomStatus, BookingStatus, RoomType
 from schemas import (
     RoomCreate, RoomUpdate, RoomResponse,
     BookingCreate, BookingUpdate, BookingResponse,
@@ -25,8 +33,12 @@ from schemas import (
     DashboardStats, AvailabilityResponse
 )
 
+# Document numbers, reserved in blocks from document_counters
+BOOKING_NUMBERS = DocumentNumbers("GH", Booking.booking_number)
+INVOICE_NUMBERS = DocumentNumbers("INV", Billing.invoice_number)
+
 # Create tables
-Base.metadata.create_all(bind=engine)
+init_db()
 
 app = FastAPI(title="Guest House Management Service", version="1.0.0")
 setup_middleware(app)
@@ -142,22 +154,27 @@ def _normalize_guesthouse_enums(db: Session) -> None:
     db.commit()
 
 
+def _seed_with_session() -> None:
+    db = SessionLocal()
+    try:
+        _seed_guesthouse_data(db)
+    finally:
+        db.close()
+
+
 @app.on_event("startup")
 async def startup_event():
-    if _should_seed() and _should_seed_first_boot("guesthouse"):
-        db = next(get_db())
-        try:
+    db = SessionLocal()
+    try:
+        if _should_seed() and _should_seed_first_boot("guesthouse"):
             _seed_guesthouse_data(db)
             _normalize_guesthouse_enums(db)
             _mark_seeded("guesthouse")
-        finally:
-            db.close()
-    else:
-        db = next(get_db())
-        try:
+        else:
             _normalize_guesthouse_enums(db)
-        finally:
-            db.close()
+    finally:
+        db.close()
+    seed_document_counters()
 
 @app.get("/")
 async def root():
@@ -167,54 +184,73 @@ async def root():
 @app.post("/admin/seed")
 async def seed_guesthouse_data(request: Request, current_user: User = Depends(get_current_user)):
     _require_seed_token(request)
-    db = next(get_db())
-    try:
-        _seed_guesthouse_data(db)
-        return {"seeded": True}
-    finally:
-        db.close()
+    # Bulk seeding is synchronous; keep it off the event loop
+    await run_in_threadpool(_seed_with_session)
+    await run_in_threadpool(seed_document_counters)
+    return {"seeded": True}
 
 # Room Management
 @app.post("/rooms", response_model=RoomResponse)
 async def create_room(
     room_data: RoomCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     room = Room(**room_data.model_dump())
     db.add(room)
-    db.commit()
-    db.refresh(room)
+    await db.commit()
+    await db.refresh(room)
+    publish_event("guesthouse.rooms", "created", {
+        "id": room.id, "room_number": room.room_number, "status": room.status,
+    })
     return room
 
 @app.get("/rooms", response_model=List[RoomResponse])
 async def list_rooms(
+    request: Request,
+    response: Response,
     status: Optional[RoomStatus] = None,
     room_type: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    query = select(Room)
+    if status:
+        query = query.where(Room.status == status)
+    if room_type:
+        query = query.where(Room.room_type == room_type)
+    # Outside the fallback below, so a failure here is an error rather than
+    # an empty list the client and gateway would cache and revalidate
+    not_modified = await conditional_get(request, response, db, query, Room.updated_at)
+    if not_modified is not None:
+        return not_modified
     try:
-        query = db.query(Room)
-        if status:
-            query = query.filter(Room.status == status)
-        if room_type:
-            query = query.filter(Room.room_type == room_type)
-        return query.offset(skip).limit(limit).all()
+        return (await db.scalars(query.offset(skip).limit(limit))).all()
+    except (HTTPException, DeadlineExceeded):
+        # An abandoned read must not look like an empty result the gateway may cache
+        raise
     except Exception as e:
         print(f"Error fetching rooms: {str(e)}")
+        # The validator describes the rows, not this placeholder
+        del response.headers["etag"]
         # Return empty list instead of crashing
         return []
 
 @app.get("/rooms/{room_id}", response_model=RoomResponse)
 async def get_room(
     room_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    room = db.query(Room).filter(Room.id == room_id).first()
+    query = select(Room).where(Room.id == room_id)
+    not_modified = await conditional_get(request, response, db, query, Room.updated_at)
+    if not_modified is not None:
+        return not_modified
+    room = await db.scalar(query)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     return room
@@ -223,52 +259,51 @@ async def get_room(
 async def update_room(
     room_id: str,
     room_data: RoomUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await db.get(Room, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    for key, value in room_data.model_dump(exclude_unset=True).items():
+    changes = room_data.model_dump(exclude_unset=True)
+    for key, value in changes.items():
         setattr(room, key, value)
     
-    db.commit()
-    db.refresh(room)
+    await db.commit()
+    await db.refresh(room)
+    if "status" in changes:
+        publish_event("guesthouse.rooms", "updated", {"id": room.id, "status": room.status})
     return room
 
 # Booking Management
 @app.post("/bookings", response_model=BookingResponse)
 async def create_booking(
     booking_data: BookingCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     user_id = current_user.get("id") if isinstance(current_user, dict) else getattr(current_user, "id", None)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid user context")
     # Check room availability
-    room = db.query(Room).filter(Room.id == booking_data.room_id).first()
+    room = await db.get(Room, booking_data.room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
     # Check for overlapping bookings
-    overlapping = db.query(Booking).filter(
+    overlapping = await db.scalar(select(Booking).where(
         Booking.room_id == booking_data.room_id,
         Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.CHECKED_IN]),
         Booking.check_in_date < booking_data.check_out_date,
         Booking.check_out_date > booking_data.check_in_date
-    ).first()
+    ))
     
     if overlapping:
         raise HTTPException(status_code=400, detail="Room not available for selected dates")
     
     # Generate booking number
-    year = datetime.now().year
-    count = db.query(Booking).filter(
-        Booking.booking_number.like(f"GH{year}%")
-    ).count()
-    booking_number = f"GH{year}{count + 1:06d}"
+    booking_number = await BOOKING_NUMBERS.next()
     
     booking = Booking(
         **booking_data.model_dump(),
@@ -277,36 +312,40 @@ async def create_booking(
     )
     try:
         db.add(booking)
-        db.commit()
-        db.refresh(booking)
+        await db.commit()
+        await db.refresh(booking)
         return booking
     except Exception as exc:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create booking: {exc}")
 
 @app.get("/bookings", response_model=List[BookingResponse])
 async def list_bookings(
+    response: Response,
     status: Optional[BookingStatus] = None,
     room_id: Optional[str] = None,
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
-        query = db.query(Booking)
+        query = select(Booking)
         if status:
-            query = query.filter(Booking.status == status)
+            query = query.where(Booking.status == status)
         if room_id:
-            query = query.filter(Booking.room_id == room_id)
+            query = query.where(Booking.room_id == room_id)
         if from_date:
-            query = query.filter(Booking.check_in_date >= from_date)
+            query = query.where(Booking.check_in_date >= from_date)
         if to_date:
-            query = query.filter(Booking.check_out_date <= to_date)
+            query = query.where(Booking.check_out_date <= to_date)
         
-        return query.order_by(Booking.check_in_date.desc()).offset(skip).limit(limit).all()
+        return await paginate(db, query, Booking.check_in_date, Booking.id, response, skip, limit, cursor)
+    except (HTTPException, DeadlineExceeded):
+        raise
     except Exception as e:
         print(f"Error fetching bookings: {str(e)}")
         return []
@@ -314,10 +353,10 @@ async def list_bookings(
 @app.get("/bookings/{booking_id}", response_model=BookingResponse)
 async def get_booking(
     booking_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.get(Booking, booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     return booking
@@ -326,28 +365,28 @@ async def get_booking(
 async def update_booking(
     booking_id: str,
     booking_data: BookingUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.get(Booking, booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
     for key, value in booking_data.model_dump(exclude_unset=True).items():
         setattr(booking, key, value)
     
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    await db.refresh(booking)
     return booking
 
 # Check-in/Check-out
 @app.post("/checkin")
 async def check_in(
     request: CheckInRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    booking = db.query(Booking).filter(Booking.id == request.booking_id).first()
+    booking = await db.get(Booking, request.booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -355,19 +394,20 @@ async def check_in(
     booking.status = BookingStatus.CHECKED_IN
     
     # Update room status
-    room = db.query(Room).filter(Room.id == booking.room_id).first()
+    room = await db.get(Room, booking.room_id)
     room.status = RoomStatus.OCCUPIED
     
-    db.commit()
+    await db.commit()
+    publish_event("guesthouse.rooms", "updated", {"id": room.id, "status": room.status})
     return {"message": "Check-in successful", "booking_id": booking.id}
 
 @app.post("/checkout")
 async def check_out(
     request: CheckOutRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    booking = db.query(Booking).filter(Booking.id == request.booking_id).first()
+    booking = await db.get(Booking, request.booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -375,19 +415,18 @@ async def check_out(
     booking.status = BookingStatus.CHECKED_OUT
     
     # Update room status
-    room = db.query(Room).filter(Room.id == booking.room_id).first()
+    room = await db.get(Room, booking.room_id)
     room.status = RoomStatus.AVAILABLE
     
     # Generate billing if not exists
-    billing = db.query(Billing).filter(Billing.booking_id == booking.id).first()
+    billing = await db.scalar(select(Billing).where(Billing.booking_id == booking.id))
     if not billing:
         days = (booking.actual_check_out - booking.actual_check_in).days or 1
         room_charges = days * room.daily_rate
         tax_amount = room_charges * 0.18  # 18% GST
         total = room_charges + tax_amount
         
-        invoice_count = db.query(Billing).count()
-        invoice_number = f"INV{datetime.now().year}{invoice_count + 1:06d}"
+        invoice_number = await INVOICE_NUMBERS.next()
         
         billing = Billing(
             booking_id=booking.id,
@@ -406,17 +445,18 @@ async def check_out(
     )
     db.add(housekeeping)
     
-    db.commit()
+    await db.commit()
+    publish_event("guesthouse.rooms", "updated", {"id": room.id, "status": room.status})
     return {"message": "Check-out successful", "booking_id": booking.id, "invoice_number": billing.invoice_number}
 
 # Billing
 @app.get("/billing/{booking_id}", response_model=BillingResponse)
 async def get_billing(
     booking_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    billing = db.query(Billing).filter(Billing.booking_id == booking_id).first()
+    billing = await db.scalar(select(Billing).where(Billing.booking_id == booking_id))
     if not billing:
         raise HTTPException(status_code=404, detail="Billing not found")
     return billing
@@ -425,10 +465,10 @@ async def get_billing(
 async def update_billing(
     billing_id: str,
     billing_data: BillingUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    billing = db.query(Billing).filter(Billing.id == billing_id).first()
+    billing = await db.get(Billing, billing_id)
     if not billing:
         raise HTTPException(status_code=404, detail="Billing not found")
     
@@ -447,21 +487,21 @@ async def update_billing(
     if billing_data.paid:
         billing.payment_date = datetime.now()
     
-    db.commit()
-    db.refresh(billing)
+    await db.commit()
+    await db.refresh(billing)
     return billing
 
 # Housekeeping
 @app.post("/housekeeping", response_model=HousekeepingResponse)
 async def create_housekeeping_task(
     task_data: HousekeepingCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     task = Housekeeping(**task_data.model_dump())
     db.add(task)
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 @app.get("/housekeeping", response_model=List[HousekeepingResponse])
@@ -470,25 +510,25 @@ async def list_housekeeping_tasks(
     room_id: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Housekeeping)
+    query = select(Housekeeping)
     if status:
-        query = query.filter(Housekeeping.status == status)
+        query = query.where(Housekeeping.status == status)
     if room_id:
-        query = query.filter(Housekeeping.room_id == room_id)
+        query = query.where(Housekeeping.room_id == room_id)
     
-    return query.order_by(Housekeeping.created_at.desc()).offset(skip).limit(limit).all()
+    return (await db.scalars(query.order_by(Housekeeping.created_at.desc()).offset(skip).limit(limit))).all()
 
 @app.put("/housekeeping/{task_id}", response_model=HousekeepingResponse)
 async def update_housekeeping_task(
     task_id: str,
     task_data: HousekeepingUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    task = db.query(Housekeeping).filter(Housekeeping.id == task_id).first()
+    task = await db.get(Housekeeping, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Housekeeping task not found")
     
@@ -500,8 +540,8 @@ async def update_housekeeping_task(
     elif task_data.status == "completed" and not task.completed_at:
         task.completed_at = datetime.now()
     
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 # Availability Check
@@ -510,25 +550,25 @@ async def check_availability(
     check_in_date: datetime = Query(...),
     check_out_date: datetime = Query(...),
     room_type: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     # Get all rooms
-    query = db.query(Room).filter(Room.status == RoomStatus.AVAILABLE)
+    query = select(Room).where(Room.status == RoomStatus.AVAILABLE)
     if room_type:
-        query = query.filter(Room.room_type == room_type)
+        query = query.where(Room.room_type == room_type)
     
-    all_rooms = query.all()
+    all_rooms = (await db.scalars(query)).all()
     
     # Filter out booked rooms
     available_rooms = []
     for room in all_rooms:
-        overlapping = db.query(Booking).filter(
+        overlapping = await db.scalar(select(Booking).where(
             Booking.room_id == room.id,
             Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.CHECKED_IN]),
             Booking.check_in_date < check_out_date,
             Booking.check_out_date > check_in_date
-        ).first()
+        ))
         
         if not overlapping:
             available_rooms.append(room)
@@ -542,77 +582,63 @@ async def check_availability(
 # Dashboard Stats
 @app.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
-        total_rooms = db.query(Room).count()
-        available_rooms = db.query(Room).filter(Room.status == RoomStatus.AVAILABLE).count()
-        occupied_rooms = db.query(Room).filter(Room.status == RoomStatus.OCCUPIED).count()
-        maintenance_rooms = db.query(Room).filter(Room.status == RoomStatus.MAINTENANCE).count()
-        
-        total_bookings = db.query(Booking).count()
-        active_bookings = db.query(Booking).filter(
-            Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.CHECKED_IN])
-        ).count()
-
-        pending_bookings = db.query(Booking).filter(
-            Booking.status == BookingStatus.PENDING
-        ).count()
-
-        checked_in_guests = db.query(Booking).filter(
-            Booking.status == BookingStatus.CHECKED_IN
-        ).count()
-        
         today = datetime.now().date()
-        checked_in_today = db.query(Booking).filter(
-            Booking.actual_check_in >= datetime.combine(today, datetime.min.time()),
-            Booking.actual_check_in < datetime.combine(today + timedelta(days=1), datetime.min.time())
-        ).count()
-        
-        checking_out_today = db.query(Booking).filter(
-            Booking.check_out_date >= datetime.combine(today, datetime.min.time()),
-            Booking.check_out_date < datetime.combine(today + timedelta(days=1), datetime.min.time()),
-            Booking.status == BookingStatus.CHECKED_IN
-        ).count()
-        
-        occupancy_rate = (occupied_rooms / total_rooms * 100) if total_rooms > 0 else 0
-        
-        pending_housekeeping = db.query(Housekeeping).filter(
-            Housekeeping.status == "pending"
-        ).count()
-
+        start_of_today = datetime.combine(today, datetime.min.time())
+        start_of_tomorrow = start_of_today + timedelta(days=1)
         start_of_month = datetime(today.year, today.month, 1)
         if today.month == 12:
             start_of_next_month = datetime(today.year + 1, 1, 1)
         else:
             start_of_next_month = datetime(today.year, today.month + 1, 1)
 
-        revenue_today = db.query(func.sum(Billing.total_amount)).filter(
-            func.date(Billing.created_at) == today
-        ).scalar() or 0
-
-        revenue_month = db.query(func.sum(Billing.total_amount)).filter(
-            Billing.created_at >= start_of_month,
-            Billing.created_at < start_of_next_month
-        ).scalar() or 0
+        stats = await collect(db, Aggregate(
+            Room,
+            total_rooms=count(),
+            available_rooms=count(Room.status == RoomStatus.AVAILABLE),
+            occupied_rooms=count(Room.status == RoomStatus.OCCUPIED),
+            maintenance_rooms=count(Room.status == RoomStatus.MAINTENANCE),
+        ), Aggregate(
+            Booking,
+            total_bookings=count(),
+            active_bookings=count(Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.CHECKED_IN])),
+            pending_bookings=count(Booking.status == BookingStatus.PENDING),
+            checked_in_guests=count(Booking.status == BookingStatus.CHECKED_IN),
+            checked_in_today=count(
+                Booking.actual_check_in >= start_of_today,
+                Booking.actual_check_in < start_of_tomorrow
+            ),
+            checking_out_today=count(
+                Booking.check_out_date >= start_of_today,
+                Booking.check_out_date < start_of_tomorrow,
+                Booking.status == BookingStatus.CHECKED_IN
+            ),
+        ), Aggregate(
+            Housekeeping,
+            pending_housekeeping=count(Housekeeping.status == "pending"),
+        ), Aggregate(
+            Billing,
+            revenue_today=total(Billing.total_amount, func.date(Billing.created_at) == today),
+            revenue_month=total(
+                Billing.total_amount,
+                Billing.created_at >= start_of_month,
+                Billing.created_at < start_of_next_month
+            ),
+        ))
+        total_rooms = stats["total_rooms"]
+        occupancy_rate = (stats["occupied_rooms"] / total_rooms * 100) if total_rooms > 0 else 0
         
         return {
-            "total_rooms": total_rooms,
-            "available_rooms": available_rooms,
-            "occupied_rooms": occupied_rooms,
-            "maintenance_rooms": maintenance_rooms,
-            "total_bookings": total_bookings,
-            "active_bookings": active_bookings,
-            "pending_bookings": pending_bookings,
-            "checked_in_guests": checked_in_guests,
-            "checked_in_today": checked_in_today,
-            "checking_out_today": checking_out_today,
+            **stats,
             "occupancy_rate": round(occupancy_rate, 2),
-            "pending_housekeeping": pending_housekeeping,
-            "revenue_today": round(revenue_today, 2),
-            "revenue_month": round(revenue_month, 2)
+            "revenue_today": round(stats["revenue_today"], 2),
+            "revenue_month": round(stats["revenue_month"], 2)
         }
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error fetching dashboard stats: {str(e)}")
         return {
@@ -629,5 +655,5 @@ async def get_dashboard_stats(
         }
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8002)
+    from shared.server import serve
+    serve(app, "guesthouse", port=8002)
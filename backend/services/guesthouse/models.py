@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Enum as SQLEnum, Text, Boolean
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Enum as SQLEnum, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -56,6 +56,8 @@ class Room(Base):
 
 class Booking(Base):
     __tablename__ = "guesthouse_bookings"
+    # Keyset paging for GET /bookings
+    __table_args__ = (Index("ix_guesthouse_bookings_check_in_date_id", "check_in_date", "id"),)
 
     id = Column(String(36), primary_key=True, default=generate_uuid)
     booking_number = Column(String(50), unique=True, nullable=False, index=True)
@@ -1,6 +1,8 @@
 from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 from typing import List, Optional
 from datetime import datetime, timedelta
 import sys
@@ -10,10 +12,12 @@ import tempfile
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from shared.database import get_db, engine
+from shared.database import SessionLocal, get_db, engine
+from shared.aggregates import Aggregate, average, collect, count, total
 from shared.middleware import setup_middleware
 from shared.auth import get_current_user
 from shared.models import User
+from shared.sequences import DocumentNumbers, seed_document_counters
 
 from models import Base, Vehicle, Driver, VehicleRequisition, Trip, FuelLog, TripFeedback, RequisitionStatus, TripStatus, VehicleStatus, VehicleType
 from schemas import (
@@ -26,6 +30,9 @@ from schemas import (
     DashboardStats
 )
 
+# Document numbers, reserved in blocks from document_counters
+REQUISITION_NUMBERS = DocumentNumbers("VR", VehicleRequisition.requisition_number)
+
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Vehicle Requisition Service", version="1.0.0")
@@ -119,15 +126,20 @@ def _seed_vehicle_data(db: Session) -> None:
         db.commit()
 
 
+def _seed_with_session() -> None:
+    db = SessionLocal()
+    try:
+        _seed_vehicle_data(db)
+    finally:
+        db.close()
+
+
 @app.on_event("startup")
 async def startup_event():
     if _should_seed() and _should_seed_first_boot("vehicle"):
-        db = next(get_db())
-        try:
-            _seed_vehicle_data(db)
-            _mark_seeded("vehicle")
-        finally:
-            db.close()
+        _seed_with_session()
+        _mark_seeded("vehicle")
+    seed_document_counters()
 
 @app.get("/")
 async def root():
@@ -137,51 +149,47 @@ async def root():
 @app.post("/admin/seed")
 async def seed_vehicle_data(request: Request, current_user: User = Depends(get_current_user)):
     _require_seed_token(request)
-    db = next(get_db())
-    try:
-        _seed_vehicle_data(db)
-        return {"seeded": True}
-    finally:
-        db.close()
+    # Bulk seeding is synchronous; keep it off the event loop
+    await run_in_threadpool(_seed_with_session)
+    await run_in_threadpool(seed_document_counters)
+    return {"seeded": True}
 
 # Vehicles
 @app.post("/vehicles", response_model=VehicleResponse)
-async def create_vehicle(vehicle_data: VehicleCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_vehicle(vehicle_data: VehicleCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     vehicle = Vehicle(**vehicle_data.model_dump())
     db.add(vehicle)
-    db.commit()
-    db.refresh(vehicle)
+    await db.commit()
+    await db.refresh(vehicle)
     return vehicle
 
 @app.get("/vehicles", response_model=List[VehicleResponse])
-async def list_vehicles(status: Optional[VehicleStatus] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    query = db.query(Vehicle)
+async def list_vehicles(status: Optional[VehicleStatus] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    query = select(Vehicle)
     if status:
-        query = query.filter(Vehicle.status == status)
-    return query.offset(skip).limit(limit).all()
+        query = query.where(Vehicle.status == status)
+    return (await db.scalars(query.offset(skip).limit(limit))).all()
 
 # Drivers
 @app.post("/drivers", response_model=DriverResponse)
-async def create_driver(driver_data: DriverCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_driver(driver_data: DriverCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     driver = Driver(**driver_data.model_dump())
     db.add(driver)
-    db.commit()
-    db.refresh(driver)
+    await db.commit()
+    await db.refresh(driver)
     return driver
 
 @app.get("/drivers", response_model=List[DriverResponse])
-async def list_drivers(active_only: bool = True, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    query = db.query(Driver)
+async def list_drivers(active_only: bool = True, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    query = select(Driver)
     if active_only:
-        query = query.filter(Driver.is_active == True)
-    return query.all()
+        query = query.where(Driver.is_active == True)
+    return (await db.scalars(query)).all()
 
 # Requisitions
 @app.post("/requisitions", response_model=RequisitionResponse)
-async def create_requisition(requisition_data: RequisitionCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    year = datetime.now().year
-    count = db.query(VehicleRequisition).filter(VehicleRequisition.requisition_number.like(f"VR{year}%")).count()
-    requisition_number = f"VR{year}{count + 1:06d}"
+async def create_requisition(requisition_data: RequisitionCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    requisition_number = await REQUISITION_NUMBERS.next()
 
     requester_id = _get_user_id(current_user)
     if not requester_id:
@@ -193,20 +201,20 @@ async def create_requisition(requisition_data: RequisitionCreate, db: Session =
         requester_id=requester_id,
     )
     db.add(requisition)
-    db.commit()
-    db.refresh(requisition)
+    await db.commit()
+    await db.refresh(requisition)
     return requisition
 
 @app.get("/requisitions", response_model=List[RequisitionResponse])
-async def list_requisitions(status: Optional[RequisitionStatus] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    query = db.query(VehicleRequisition)
+async def list_requisitions(status: Optional[RequisitionStatus] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    query = select(VehicleRequisition)
     if status:
-        query = query.filter(VehicleRequisition.status == status)
-    return query.order_by(VehicleRequisition.departure_date.desc()).offset(skip).limit(limit).all()
+        query = query.where(VehicleRequisition.status == status)
+    return (await db.scalars(query.order_by(VehicleRequisition.departure_date.desc()).offset(skip).limit(limit))).all()
 
 @app.post("/requisitions/{requisition_id}/approve")
-async def approve_requisition(requisition_id: str, vehicle_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    requisition = db.query(VehicleRequisition).filter(VehicleRequisition.id == requisition_id).first()
+async def approve_requisition(requisition_id: str, vehicle_id: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    requisition = await db.get(VehicleRequisition, requisition_id)
     if not requisition:
         raise HTTPException(status_code=404, detail="Requisition not found")
     approver_id = _get_user_id(current_user)
@@ -217,21 +225,21 @@ async def approve_requisition(requisition_id: str, vehicle_id: str, db: Session
     requisition.vehicle_id = vehicle_id
     requisition.approver_id = approver_id
     requisition.approved_at = datetime.now()
-    db.commit()
+    await db.commit()
     return {"message": "Requisition approved", "requisition_id": requisition_id}
 
 # Trips
 @app.post("/trips", response_model=TripResponse)
-async def create_trip(trip_data: TripCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_trip(trip_data: TripCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     trip = Trip(**trip_data.model_dump())
     db.add(trip)
-    db.commit()
-    db.refresh(trip)
+    await db.commit()
+    await db.refresh(trip)
     return trip
 
 @app.put("/trips/{trip_id}/start")
-async def start_trip(trip_id: str, start_odometer: float, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    trip = db.query(Trip).filter(Trip.id == trip_id).first()
+async def start_trip(trip_id: str, start_odometer: float, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    trip = await db.get(Trip, trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     
@@ -239,16 +247,16 @@ async def start_trip(trip_id: str, start_odometer: float, db: Session = Depends(
     trip.start_odometer = start_odometer
     trip.status = TripStatus.IN_PROGRESS
     
-    requisition = db.query(VehicleRequisition).filter(VehicleRequisition.id == trip.requisition_id).first()
-    vehicle = db.query(Vehicle).filter(Vehicle.id == requisition.vehicle_id).first()
+    requisition = await db.get(VehicleRequisition, trip.requisition_id)
+    vehicle = await db.get(Vehicle, requisition.vehicle_id)
     vehicle.status = VehicleStatus.IN_USE
     
-    db.commit()
+    await db.commit()
     return {"message": "Trip started", "trip_id": trip_id}
 
 @app.put("/trips/{trip_id}/end")
-async def end_trip(trip_id: str, end_odometer: float, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    trip = db.query(Trip).filter(Trip.id == trip_id).first()
+async def end_trip(trip_id: str, end_odometer: float, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    trip = await db.get(Trip, trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     
@@ -257,30 +265,30 @@ async def end_trip(trip_id: str, end_odometer: float, db: Session = Depends(get_
     trip.distance_km = end_odometer - trip.start_odometer
     trip.status = TripStatus.COMPLETED
     
-    requisition = db.query(VehicleRequisition).filter(VehicleRequisition.id == trip.requisition_id).first()
+    requisition = await db.get(VehicleRequisition, trip.requisition_id)
     requisition.status = RequisitionStatus.COMPLETED
-    vehicle = db.query(Vehicle).filter(Vehicle.id == requisition.vehicle_id).first()
+    vehicle = await db.get(Vehicle, requisition.vehicle_id)
     vehicle.status = VehicleStatus.AVAILABLE
     vehicle.current_odometer = end_odometer
     
-    driver = db.query(Driver).filter(Driver.id == trip.driver_id).first()
+    driver = await db.get(Driver, trip.driver_id)
     driver.total_trips += 1
     
-    db.commit()
+    await db.commit()
     return {"message": "Trip completed", "trip_id": trip_id, "distance_km": trip.distance_km}
 
 # Fuel Logs
 @app.post("/fuel-logs", response_model=FuelLogResponse)
-async def create_fuel_log(log_data: FuelLogCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_fuel_log(log_data: FuelLogCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     fuel_log = FuelLog(**log_data.model_dump())
     db.add(fuel_log)
-    db.commit()
-    db.refresh(fuel_log)
+    await db.commit()
+    await db.refresh(fuel_log)
     return fuel_log
 
 # Feedback
 @app.post("/feedback", response_model=FeedbackResponse)
-async def create_feedback(feedback_data: FeedbackCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_feedback(feedback_data: FeedbackCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     submitted_by_id = _get_user_id(current_user)
     if not submitted_by_id:
         raise HTTPException(status_code=401, detail="Invalid user")
@@ -289,62 +297,54 @@ async def create_feedback(feedback_data: FeedbackCreate, db: Session = Depends(g
     db.add(feedback)
     
     # Update driver rating
-    trip = db.query(Trip).filter(Trip.id == feedback_data.trip_id).first()
-    driver = db.query(Driver).filter(Driver.id == trip.driver_id).first()
+    trip = await db.get(Trip, feedback_data.trip_id)
+    driver = await db.get(Driver, trip.driver_id)
     
-    all_feedback = db.query(TripFeedback).join(Trip).filter(Trip.driver_id == driver.id).all()
+    all_feedback = (await db.scalars(select(TripFeedback).join(Trip).where(Trip.driver_id == driver.id))).all()
     total_ratings = sum([f.driver_rating for f in all_feedback]) + feedback_data.driver_rating
     driver.rating = total_ratings / (len(all_feedback) + 1)
     
-    db.commit()
-    db.refresh(feedback)
+    await db.commit()
+    await db.refresh(feedback)
     return feedback
 
 # Dashboard Stats
 @app.get("/dashboard/stats", response_model=DashboardStats)
-async def get_dashboard_stats(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    total_vehicles = db.query(Vehicle).count()
-    available_vehicles = db.query(Vehicle).filter(Vehicle.status == VehicleStatus.AVAILABLE).count()
-    in_use_vehicles = db.query(Vehicle).filter(Vehicle.status == VehicleStatus.IN_USE).count()
-    maintenance_vehicles = db.query(Vehicle).filter(Vehicle.status == VehicleStatus.MAINTENANCE).count()
-    total_requisitions = db.query(VehicleRequisition).count()
-    pending_approvals = db.query(VehicleRequisition).filter(VehicleRequisition.status == RequisitionStatus.REQUESTED).count()
-    pending_requisitions = db.query(VehicleRequisition).filter(VehicleRequisition.status == RequisitionStatus.REQUESTED).count()
-    approved_requisitions = db.query(VehicleRequisition).filter(VehicleRequisition.status == RequisitionStatus.APPROVED).count()
-    active_trips = db.query(Trip).filter(Trip.status == TripStatus.IN_PROGRESS).count()
-    
-    total_distance = db.query(Trip).filter(Trip.distance_km.isnot(None))
-    total_distance_km = sum([t.distance_km for t in total_distance.all()])
-
+async def get_dashboard_stats(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
     today = datetime.utcnow().date()
-    total_km_today = db.query(func.sum(Trip.distance_km)).filter(
-        Trip.distance_km.isnot(None),
-        func.date(Trip.start_time) == today
-    ).scalar() or 0
-
-    fuel_cost_today = db.query(func.sum(FuelLog.fuel_cost)).filter(
-        func.date(FuelLog.filled_at) == today
-    ).scalar() or 0
-    
-    drivers = db.query(Driver).filter(Driver.rating > 0).all()
-    avg_driver_rating = sum([d.rating for d in drivers]) / len(drivers) if drivers else 0
+    stats = await collect(db, Aggregate(
+        Vehicle,
+        total_vehicles=count(),
+        available_vehicles=count(Vehicle.status == VehicleStatus.AVAILABLE),
+        in_use_vehicles=count(Vehicle.status == VehicleStatus.IN_USE),
+        maintenance_vehicles=count(Vehicle.status == VehicleStatus.MAINTENANCE),
+    ), Aggregate(
+        VehicleRequisition,
+        total_requisitions=count(),
+        pending_approvals=count(VehicleRequisition.status == RequisitionStatus.REQUESTED),
+        pending_requisitions=count(VehicleRequisition.status == RequisitionStatus.REQUESTED),
+        approved_requisitions=count(VehicleRequisition.status == RequisitionStatus.APPROVED),
+    ), Aggregate(
+        Trip,
+        active_trips=count(Trip.status == TripStatus.IN_PROGRESS),
+        total_distance_km=total(Trip.distance_km),
+        total_km_today=total(Trip.distance_km, func.date(Trip.start_time) == today),
+    ), Aggregate(
+        FuelLog,
+        fuel_cost_today=total(FuelLog.fuel_cost, func.date(FuelLog.filled_at) == today),
+    ), Aggregate(
+        Driver,
+        avg_driver_rating=average(Driver.rating, Driver.rating > 0),
+    ))
     
     return {
-        "total_vehicles": total_vehicles,
-        "available_vehicles": available_vehicles,
-        "in_use_vehicles": in_use_vehicles,
-        "maintenance_vehicles": maintenance_vehicles,
-        "total_requisitions": total_requisitions,
-        "pending_approvals": pending_approvals,
-        "pending_requisitions": pending_requisitions,
-        "approved_requisitions": approved_requisitions,
-        "active_trips": active_trips,
-        "total_distance_km": round(total_distance_km, 2),
-        "total_km_today": round(total_km_today, 2),
-        "fuel_cost_today": round(fuel_cost_today, 2),
-        "avg_driver_rating": round(avg_driver_rating, 2)
+        **stats,
+        "total_distance_km": round(stats["total_distance_km"], 2),
+        "total_km_today": round(stats["total_km_today"], 2),
+        "fuel_cost_today": round(stats["fuel_cost_today"], 2),
+        "avg_driver_rating": round(stats["avg_driver_rating"] or 0, 2)
     }
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8005)
+    from shared.server import serve
+    serve(app, "vehicle", port=8005)
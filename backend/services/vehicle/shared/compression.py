@@ -0,0 +1,194 @@
+"""
+Response compression with Accept-Encoding negotiation (zstd, brotli, gzip).
+
+Replaces Starlette's GZipMiddleware in the gateway and the services. A body
+that already carries a Content-Encoding, such as a service response streamed
+through the gateway, is passed on untouched, so each response is compressed
+exactly once along the chain. brotli and zstandard are optional; without them
+only gzip is offered.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import zlib
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional
+    zstandard = None
+
+# Compressing bodies at least this large is moved off the event loop
+_THREAD_MINIMUM_SIZE = 128 * 1024
+
+# Media types that are already compressed or must not be buffered
+_EXCLUDED_TYPES = ("text/event-stream", "image/", "audio/", "video/", "application/zip", "application/gzip")
+
+
+def _gzip() -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    compressor = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return compressor.compress, compressor.flush
+
+
+def _brotli() -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    compressor = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+    return compressor.process, compressor.finish
+
+
+def _zstd() -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    compressor = zstandard.ZstdCompressor(level=settings.ZSTD_LEVEL).compressobj()
+    return compressor.compress, compressor.flush
+
+
+def available_encodings() -> Dict[str, Callable]:
+    """Encoders this process can produce, by Content-Encoding token"""
+    encoders = {"gzip": _gzip}
+    if brotli is not None:
+        encoders["br"] = _brotli
+    if zstandard is not None:
+        encoders["zstd"] = _zstd
+    return encoders
+
+
+ENCODERS = available_encodings()
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Pick an encoding for an Accept-Encoding header.
+
+    The client's q-values decide first; among equals, COMPRESSION_ENCODINGS
+    order (the server's preference) does. None means send the body as is.
+    """
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in settings.COMPRESSION_ENCODINGS:
+        if encoding not in ENCODERS:
+            continue
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(encoding: str, body: bytes) -> bytes:
+    """Compress a whole body in one go"""
+    process, finish = ENCODERS[encoding]()
+    return process(body) + finish()
+
+
+def _is_excluded(media_type: str) -> bool:
+    return any(media_type.startswith(excluded) for excluded in _EXCLUDED_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses in the negotiated encoding"""
+
+    def __init__(self, app, minimum_size: int = 1000):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressingResponder:
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start: Optional[dict] = None
+        self.passthrough = False
+        self.streaming: Optional[Tuple[Callable, Callable]] = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+            # Already encoded upstream: forward the bytes untouched
+            self.passthrough = (
+                "content-encoding" in headers or message["status"] in (204, 206, 304) or _is_excluded(media_type)
+            )
+            if self.passthrough:
+                await self.send(message)
+            else:
+                self.start = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.streaming is not None:
+            process, finish = self.streaming
+            chunk = process(body)
+            if not more_body:
+                chunk += finish()
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            return
+
+        headers = MutableHeaders(raw=self.start["headers"])
+        if not more_body:
+            if len(body) < self.minimum_size:
+                await self.send(self.start)
+                await self.send(message)
+                return
+            if len(body) >= _THREAD_MINIMUM_SIZE:
+                body = await anyio.to_thread.run_sync(compress, self.encoding, body)
+            else:
+                body = compress(self.encoding, body)
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+
+        # Streamed body: compress chunk by chunk without a Content-Length
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        self.streaming = ENCODERS[self.encoding]()
+        await self.send(self.start)
+        process, _ = self.streaming
+        await self.send({"type": "http.response.body", "body": process(body), "more_body": True})
+
+
+def supported_encodings() -> List[str]:
+    return [encoding for encoding in settings.COMPRESSION_ENCODINGS if encoding in ENCODERS]
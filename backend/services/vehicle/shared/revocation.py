@@ -0,0 +1,160 @@
+"""
+Revoked token ids (access tokens, refresh tokens and refresh families).
+
+Each entry only needs to outlive the token it revokes, so entries expire with
+it. The gateway keeps the set in Redis when it is reachable so every worker
+sees a logout; otherwise, and inside the services, a per-process dict is used.
+Lookups are O(1) either way.
+"""
+from typing import Dict, Optional
+import logging
+import time
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "epos:revoked"
+
+# Expired entries are swept after this many revocations
+_SWEEP_EVERY = 1000
+
+
+def _redis():
+    """redis.asyncio, imported only once Redis is configured: it is slow to import"""
+    try:
+        import redis.asyncio as aioredis
+    except ImportError:  # redis is optional; the in-memory set is used instead
+        return None
+    return aioredis
+
+
+class MemoryRevocations:
+    """Revoked ids with their expiry, swept now and then"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._entries: Dict[str, float] = {}
+        self._since_sweep = 0
+
+    async def revoke(self, key: str, expires_at: float) -> None:
+        self._entries[key] = expires_at
+        self._since_sweep += 1
+        if self._since_sweep >= _SWEEP_EVERY:
+            now = time.time()
+            self._entries = {k: exp for k, exp in self._entries.items() if exp > now}
+            self._since_sweep = 0
+
+    async def spend(self, key: str, expires_at: float) -> bool:
+        # No await between the check and the write: one caller wins
+        if self._entries.get(key, 0) > time.time():
+            return False
+        await self.revoke(key, expires_at)
+        return True
+
+    async def any_revoked(self, keys: list) -> bool:
+        now = time.time()
+        return any(self._entries.get(key, 0) > now for key in keys)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+def _ttl(expires_at: float) -> int:
+    return max(1, int(expires_at - time.time()) + 1)
+
+
+class RedisRevocations:
+    """One expiring Redis key per revoked id"""
+
+    name = "redis"
+
+    def __init__(self, client):
+        self.client = client
+
+    async def revoke(self, key: str, expires_at: float) -> None:
+        await self.client.set(f"{KEY_PREFIX}:{key}", 1, ex=_ttl(expires_at))
+
+    async def spend(self, key: str, expires_at: float) -> bool:
+        # SET NX: exactly one caller, across every worker, creates the key
+        return bool(await self.client.set(f"{KEY_PREFIX}:{key}", 1, ex=_ttl(expires_at), nx=True))
+
+    async def any_revoked(self, keys: list) -> bool:
+        return await self.client.exists(*(f"{KEY_PREFIX}:{key}" for key in keys)) > 0
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def size(self) -> None:
+        return None
+
+
+class RevocationStore:
+    """Revocation set shared by login, refresh, logout and get_current_user"""
+
+    def __init__(self):
+        self.backend = MemoryRevocations()
+
+    async def start(self) -> None:
+        """Switch to Redis when configured and reachable"""
+        if settings.CACHE_BACKEND != "redis":
+            return
+        aioredis = _redis()
+        if aioredis is None:
+            return
+        client = aioredis.from_url(settings.REDIS_URL, socket_connect_timeout=1)
+        try:
+            await client.ping()
+        except Exception as exc:
+            logger.warning(f"Redis unavailable at {settings.REDIS_URL}, using in-memory revocations: {exc}")
+            await client.aclose()
+            return
+        self.backend = RedisRevocations(client)
+
+    async def aclose(self) -> None:
+        await self.backend.close()
+        self.backend = MemoryRevocations()
+
+    async def revoke(self, key: str, expires_at: float) -> None:
+        if expires_at > time.time():
+            await self.backend.revoke(key, expires_at)
+
+    async def spend(self, key: str, expires_at: float) -> Optional[bool]:
+        """
+        Revoke a single-use id, atomically.
+
+        True for the one caller that spent it, False if it was already
+        spent, None if the store could not be reached.
+        """
+        try:
+            return await self.backend.spend(key, expires_at)
+        except Exception as exc:
+            logger.warning(f"Revocation store unavailable: {exc}")
+            return None
+
+    async def is_revoked(self, *keys: str, strict: bool = False) -> bool:
+        """
+        True if any of the ids is revoked.
+
+        If the lookup fails, strict callers (refresh rotation) treat the ids as
+        revoked. Access-token checks let the token through instead, because it
+        expires within minutes anyway.
+        """
+        keys = [key for key in keys if key]
+        if not keys:
+            return False
+        try:
+            return await self.backend.any_revoked(keys)
+        except Exception as exc:
+            logger.warning(f"Revocation lookup failed: {exc}")
+            return strict
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": self.backend.name, "entries": self.backend.size()}
+
+
+revoked_tokens = RevocationStore()
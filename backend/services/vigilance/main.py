@@ -1,6 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Request
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, select
 from typing import List, Optional
 from datetime import datetime, timedelta
 import sys
@@ -11,11 +13,16 @@ import os
 import tempfile
 sys.path.append('../..')
 
-from shared.database import get_db, init_db
+from shared.database import SessionLocal, get_db, init_db
+from shared.aggregates import Aggregate, collect, count, count_distinct
 from shared.auth import get_current_user
-from shared.middleware import setup_cors, setup_gzip, setup_exception_handlers
+from shared.middleware import setup_cors, setup_etags, setup_compression, setup_exception_handlers, setup_deadlines
+from shared.events import setup_events, publish_event
+from shared.etag import conditional_get
 from shared.config import settings
 from shared.file_handler import save_upload_file
+from shared.sequences import DocumentNumbers, seed_document_counters
+from shared.pagination import paginate
 
 from models import (
     DutyRoster, Checkpoint, PatrolLog, Incident, IncidentAttachment, SOSAlert,
@@ -30,6 +37,13 @@ from schemas import (
     DashboardStats
 )
 
+# Document numbers, reserved in blocks from document_counters
+ROSTER_NUMBERS = DocumentNumbers("DR", DutyRoster.roster_number)
+CHECKPOINT_NUMBERS = DocumentNumbers("CP", Checkpoint.checkpoint_number, width=4, yearly=False)
+PATROL_LOG_NUMBERS = DocumentNumbers("PL", PatrolLog.log_number)
+INCIDENT_NUMBERS = DocumentNumbers("INC", Incident.incident_number)
+SOS_NUMBERS = DocumentNumbers("SOS", SOSAlert.alert_number)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Night Vigilance Management Service",
@@ -39,8 +53,11 @@ app = FastAPI(
 
 # Setup middleware
 setup_cors(app, settings.CORS_ORIGINS)
-setup_gzip(app)
+setup_etags(app)
+setup_compression(app)
 setup_exception_handlers(app)
+setup_deadlines(app)
+setup_events(app)
 
 
 @app.on_event("startup")
@@ -48,12 +65,9 @@ async def startup_event():
     """Initialize database on startup"""
     init_db()
     if _should_seed() and _should_seed_first_boot("vigilance"):
-        db = next(get_db())
-        try:
-            _seed_vigilance_data(db)
-            _mark_seeded("vigilance")
-        finally:
-            db.close()
+        _seed_with_session()
+        _mark_seeded("vigilance")
+    seed_document_counters()
 
 
 def _should_seed() -> bool:
@@ -120,29 +134,34 @@ async def root():
     return {"service": "Night Vigilance Management", "status": "running", "port": 8004}
 
 
-@app.post("/admin/seed")
-async def seed_vigilance_data(request: Request, current_user: dict = Depends(get_current_user)):
-    _require_seed_token(request)
-    db = next(get_db())
+def _seed_with_session() -> None:
+    db = SessionLocal()
     try:
         _seed_vigilance_data(db)
-        return {"seeded": True}
     finally:
         db.close()
 
 
+@app.post("/admin/seed")
+async def seed_vigilance_data(request: Request, current_user: dict = Depends(get_current_user)):
+    _require_seed_token(request)
+    # Bulk seeding is synchronous; keep it off the event loop
+    await run_in_threadpool(_seed_with_session)
+    await run_in_threadpool(seed_document_counters)
+    return {"seeded": True}
+
+
 # ========== Duty Roster Endpoints ==========
 
 @app.post("/roster", response_model=DutyRosterResponse)
 async def create_duty_roster(
     roster_data: DutyRosterCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new duty roster"""
     # Generate roster number
-    count = db.query(DutyRoster).count()
-    roster_number = f"DR{datetime.now().year}{count + 1:06d}"
+    roster_number = await ROSTER_NUMBERS.next()
     
     # Create roster
     roster = DutyRoster(
@@ -152,8 +171,8 @@ async def create_duty_roster(
     )
     
     db.add(roster)
-    db.commit()
-    db.refresh(roster)
+    await db.commit()
+    await db.refresh(roster)
     
     return roster
 
@@ -167,25 +186,25 @@ async def get_duty_rosters(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all duty rosters"""
-    query = db.query(DutyRoster)
+    query = select(DutyRoster)
     
     if status:
-        query = query.filter(DutyRoster.status == status)
+        query = query.where(DutyRoster.status == status)
     
     if shift_type:
-        query = query.filter(DutyRoster.shift_type == shift_type)
+        query = query.where(DutyRoster.shift_type == shift_type)
     
     if guard_id:
-        query = query.filter(DutyRoster.guard_id == guard_id)
+        query = query.where(DutyRoster.guard_id == guard_id)
     
     if date:
         target_date = datetime.fromisoformat(date).date()
-        query = query.filter(func.date(DutyRoster.duty_date) == target_date)
+        query = query.where(func.date(DutyRoster.duty_date) == target_date)
     
-    rosters = query.order_by(DutyRoster.duty_date.desc()).offset(skip).limit(limit).all()
+    rosters = (await db.scalars(query.order_by(DutyRoster.duty_date.desc()).offset(skip).limit(limit))).all()
     return rosters
 
 
@@ -193,10 +212,10 @@ async def get_duty_rosters(
 async def get_duty_roster(
     roster_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific duty roster"""
-    roster = db.query(DutyRoster).filter(DutyRoster.id == roster_id).first()
+    roster = await db.get(DutyRoster, roster_id)
     if not roster:
         raise HTTPException(status_code=404, detail="Duty roster not found")
     return roster
@@ -207,10 +226,10 @@ async def update_duty_roster(
     roster_id: str,
     roster_data: DutyRosterUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a duty roster"""
-    roster = db.query(DutyRoster).filter(DutyRoster.id == roster_id).first()
+    roster = await db.get(DutyRoster, roster_id)
     if not roster:
         raise HTTPException(status_code=404, detail="Duty roster not found")
     
@@ -218,8 +237,8 @@ async def update_duty_roster(
         setattr(roster, field, value)
     
     roster.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(roster)
+    await db.commit()
+    await db.refresh(roster)
     
     return roster
 
@@ -228,18 +247,18 @@ async def update_duty_roster(
 async def check_in_duty(
     roster_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Guard checks in for duty"""
-    roster = db.query(DutyRoster).filter(DutyRoster.id == roster_id).first()
+    roster = await db.get(DutyRoster, roster_id)
     if not roster:
         raise HTTPException(status_code=404, detail="Duty roster not found")
     
     roster.check_in_time = datetime.utcnow()
     roster.status = DutyStatus.ACTIVE
     
-    db.commit()
-    db.refresh(roster)
+    await db.commit()
+    await db.refresh(roster)
     
     return {"message": "Checked in successfully", "roster": roster}
 
@@ -248,18 +267,18 @@ async def check_in_duty(
 async def check_out_duty(
     roster_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Guard checks out from duty"""
-    roster = db.query(DutyRoster).filter(DutyRoster.id == roster_id).first()
+    roster = await db.get(DutyRoster, roster_id)
     if not roster:
         raise HTTPException(status_code=404, detail="Duty roster not found")
     
     roster.check_out_time = datetime.utcnow()
     roster.status = DutyStatus.COMPLETED
     
-    db.commit()
-    db.refresh(roster)
+    await db.commit()
+    await db.refresh(roster)
     
     return {"message": "Checked out successfully", "roster": roster}
 
@@ -284,12 +303,11 @@ def generate_checkpoint_qr(checkpoint_number: str, checkpoint_name: str) -> str:
 async def create_checkpoint(
     checkpoint_data: CheckpointCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new checkpoint"""
     # Generate checkpoint number
-    count = db.query(Checkpoint).count()
-    checkpoint_number = f"CP{count + 1:04d}"
+    checkpoint_number = await CHECKPOINT_NUMBERS.next()
     
     # Create checkpoint
     checkpoint = Checkpoint(
@@ -301,42 +319,54 @@ async def create_checkpoint(
     checkpoint.qr_code = generate_checkpoint_qr(checkpoint_number, checkpoint_data.checkpoint_name)
     
     db.add(checkpoint)
-    db.commit()
-    db.refresh(checkpoint)
+    await db.commit()
+    await db.refresh(checkpoint)
     
     return checkpoint
 
 
 @app.get("/checkpoints", response_model=List[CheckpointResponse])
 async def get_checkpoints(
+    request: Request,
+    response: Response,
     is_active: Optional[bool] = None,
     sector: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all checkpoints"""
-    query = db.query(Checkpoint)
+    query = select(Checkpoint)
     
     if is_active is not None:
-        query = query.filter(Checkpoint.is_active == is_active)
+        query = query.where(Checkpoint.is_active == is_active)
     
     if sector:
-        query = query.filter(Checkpoint.sector == sector)
+        query = query.where(Checkpoint.sector == sector)
     
-    checkpoints = query.order_by(Checkpoint.patrol_sequence).offset(skip).limit(limit).all()
+    not_modified = await conditional_get(request, response, db, query, Checkpoint.updated_at)
+    if not_modified is not None:
+        return not_modified
+    
+    checkpoints = (await db.scalars(query.order_by(Checkpoint.patrol_sequence).offset(skip).limit(limit))).all()
     return checkpoints
 
 
 @app.get("/checkpoints/{checkpoint_id}", response_model=CheckpointResponse)
 async def get_checkpoint(
     checkpoint_id: str,
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific checkpoint"""
-    checkpoint = db.query(Checkpoint).filter(Checkpoint.id == checkpoint_id).first()
+    query = select(Checkpoint).where(Checkpoint.id == checkpoint_id)
+    not_modified = await conditional_get(request, response, db, query, Checkpoint.updated_at)
+    if not_modified is not None:
+        return not_modified
+    checkpoint = await db.scalar(query)
     if not checkpoint:
         raise HTTPException(status_code=404, detail="Checkpoint not found")
     return checkpoint
@@ -347,10 +377,10 @@ async def update_checkpoint(
     checkpoint_id: str,
     checkpoint_data: CheckpointUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a checkpoint"""
-    checkpoint = db.query(Checkpoint).filter(Checkpoint.id == checkpoint_id).first()
+    checkpoint = await db.get(Checkpoint, checkpoint_id)
     if not checkpoint:
         raise HTTPException(status_code=404, detail="Checkpoint not found")
     
@@ -358,8 +388,8 @@ async def update_checkpoint(
         setattr(checkpoint, field, value)
     
     checkpoint.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(checkpoint)
+    await db.commit()
+    await db.refresh(checkpoint)
     
     return checkpoint
 
@@ -370,15 +400,14 @@ async def update_checkpoint(
 async def create_patrol_log(
     log_data: PatrolLogCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a patrol log entry (checkpoint scan)"""
     # Generate log number
-    count = db.query(PatrolLog).count()
-    log_number = f"PL{datetime.now().year}{count + 1:06d}"
+    log_number = await PATROL_LOG_NUMBERS.next()
     
     # Get checkpoint details
-    checkpoint = db.query(Checkpoint).filter(Checkpoint.id == log_data.checkpoint_id).first()
+    checkpoint = await db.get(Checkpoint, log_data.checkpoint_id)
     if not checkpoint:
         raise HTTPException(status_code=404, detail="Checkpoint not found")
     
@@ -399,36 +428,37 @@ async def create_patrol_log(
         patrol_log.location_verified = True
     
     db.add(patrol_log)
-    db.commit()
-    db.refresh(patrol_log)
+    await db.commit()
+    await db.refresh(patrol_log)
     
     return patrol_log
 
 
 @app.get("/patrol-log", response_model=List[PatrolLogResponse])
 async def get_patrol_logs(
+    response: Response,
     duty_roster_id: Optional[str] = None,
     checkpoint_id: Optional[str] = None,
     guard_id: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get patrol logs"""
-    query = db.query(PatrolLog)
+    query = select(PatrolLog)
     
     if duty_roster_id:
-        query = query.filter(PatrolLog.duty_roster_id == duty_roster_id)
+        query = query.where(PatrolLog.duty_roster_id == duty_roster_id)
     
     if checkpoint_id:
-        query = query.filter(PatrolLog.checkpoint_id == checkpoint_id)
+        query = query.where(PatrolLog.checkpoint_id == checkpoint_id)
     
     if guard_id:
-        query = query.filter(PatrolLog.guard_id == guard_id)
+        query = query.where(PatrolLog.guard_id == guard_id)
     
-    logs = query.order_by(PatrolLog.scan_time.desc()).offset(skip).limit(limit).all()
-    return logs
+    return await paginate(db, query, PatrolLog.scan_time, PatrolLog.id, response, skip, limit, cursor)
 
 
 @app.post("/patrol-log/upload-photo")
@@ -436,10 +466,10 @@ async def upload_patrol_photo(
     log_id: str = Query(...),
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Upload photo for patrol log"""
-    log = db.query(PatrolLog).filter(PatrolLog.id == log_id).first()
+    log = await db.get(PatrolLog, log_id)
     if not log:
         raise HTTPException(status_code=404, detail="Patrol log not found")
     
@@ -447,8 +477,8 @@ async def upload_patrol_photo(
     file_path = await save_upload_file(file, "patrol_photos")
     log.photo_path = file_path
     
-    db.commit()
-    db.refresh(log)
+    await db.commit()
+    await db.refresh(log)
     
     return {"message": "Photo uploaded successfully", "photo_path": file_path}
 
@@ -459,12 +489,11 @@ async def upload_patrol_photo(
 async def create_incident(
     incident_data: IncidentCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Report a new incident"""
     # Generate incident number
-    count = db.query(Incident).count()
-    incident_number = f"INC{datetime.now().year}{count + 1:06d}"
+    incident_number = await INCIDENT_NUMBERS.next()
     
     # Create incident
     incident = Incident(
@@ -473,8 +502,8 @@ async def create_incident(
     )
     
     db.add(incident)
-    db.commit()
-    db.refresh(incident)
+    await db.commit()
+    await db.refresh(incident)
     
     return incident
 
@@ -487,21 +516,21 @@ async def get_incidents(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all incidents"""
-    query = db.query(Incident)
+    query = select(Incident)
     
     if status:
-        query = query.filter(Incident.status == status)
+        query = query.where(Incident.status == status)
     
     if severity:
-        query = query.filter(Incident.severity == severity)
+        query = query.where(Incident.severity == severity)
     
     if incident_type:
-        query = query.filter(Incident.incident_type == incident_type)
+        query = query.where(Incident.incident_type == incident_type)
     
-    incidents = query.order_by(Incident.incident_time.desc()).offset(skip).limit(limit).all()
+    incidents = (await db.scalars(query.order_by(Incident.incident_time.desc()).offset(skip).limit(limit))).all()
     return incidents
 
 
@@ -509,10 +538,10 @@ async def get_incidents(
 async def get_incident(
     incident_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific incident"""
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     return incident
@@ -523,10 +552,10 @@ async def update_incident(
     incident_id: str,
     incident_data: IncidentUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update an incident"""
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
@@ -534,8 +563,8 @@ async def update_incident(
         setattr(incident, field, value)
     
     incident.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(incident)
+    await db.commit()
+    await db.refresh(incident)
     
     return incident
 
@@ -544,10 +573,10 @@ async def update_incident(
 async def acknowledge_incident(
     incident_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Acknowledge an incident"""
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
@@ -555,8 +584,8 @@ async def acknowledge_incident(
     incident.acknowledged_by = current_user["id"]
     incident.acknowledged_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(incident)
+    await db.commit()
+    await db.refresh(incident)
     
     return {"message": "Incident acknowledged", "incident": incident}
 
@@ -566,10 +595,10 @@ async def resolve_incident(
     incident_id: str,
     resolution_notes: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Resolve an incident"""
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
@@ -578,8 +607,8 @@ async def resolve_incident(
     incident.resolved_by = current_user["id"]
     incident.resolved_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(incident)
+    await db.commit()
+    await db.refresh(incident)
     
     return {"message": "Incident resolved", "incident": incident}
 
@@ -590,10 +619,10 @@ async def upload_incident_photo(
     description: Optional[str] = None,
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Upload photo for incident"""
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    incident = await db.get(Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
@@ -612,8 +641,8 @@ async def upload_incident_photo(
     )
     
     db.add(attachment)
-    db.commit()
-    db.refresh(attachment)
+    await db.commit()
+    await db.refresh(attachment)
     
     return {"message": "Photo uploaded successfully", "attachment": attachment}
 
@@ -624,12 +653,11 @@ async def upload_incident_photo(
 async def create_sos_alert(
     alert_data: SOSAlertCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create SOS emergency alert"""
     # Generate alert number
-    count = db.query(SOSAlert).count()
-    alert_number = f"SOS{datetime.now().year}{count + 1:06d}"
+    alert_number = await SOS_NUMBERS.next()
     
     # Create alert
     alert = SOSAlert(
@@ -638,40 +666,45 @@ async def create_sos_alert(
     )
     
     db.add(alert)
-    db.commit()
-    db.refresh(alert)
-    
-    # In production: Send real-time notifications to supervisors
-    
+    await db.commit()
+    await db.refresh(alert)
+    
+    # Supervisors subscribed to vigilance.sos see it within the second
+    publish_event("vigilance.sos", "created", {
+        "id": alert.id, "alert_number": alert.alert_number, "alert_type": alert.alert_type,
+        "status": alert.status, "guard_name": alert.guard_name, "location": alert.location,
+        "alert_time": alert.alert_time,
+    })
     return alert
 
 
 @app.get("/sos", response_model=List[SOSAlertResponse])
 async def get_sos_alerts(
+    response: Response,
     status: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all SOS alerts"""
-    query = db.query(SOSAlert)
+    query = select(SOSAlert)
     
     if status:
-        query = query.filter(SOSAlert.status == status)
+        query = query.where(SOSAlert.status == status)
     
-    alerts = query.order_by(SOSAlert.alert_time.desc()).offset(skip).limit(limit).all()
-    return alerts
+    return await paginate(db, query, SOSAlert.alert_time, SOSAlert.id, response, skip, limit, cursor)
 
 
 @app.get("/sos/{alert_id}", response_model=SOSAlertResponse)
 async def get_sos_alert(
     alert_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific SOS alert"""
-    alert = db.query(SOSAlert).filter(SOSAlert.id == alert_id).first()
+    alert = await db.get(SOSAlert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="SOS alert not found")
     return alert
@@ -681,10 +714,10 @@ async def get_sos_alert(
 async def acknowledge_sos_alert(
     alert_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Acknowledge SOS alert"""
-    alert = db.query(SOSAlert).filter(SOSAlert.id == alert_id).first()
+    alert = await db.get(SOSAlert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="SOS alert not found")
     
@@ -692,9 +725,12 @@ async def acknowledge_sos_alert(
     alert.acknowledged_by = current_user["id"]
     alert.acknowledged_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(alert)
+    await db.commit()
+    await db.refresh(alert)
     
+    publish_event("vigilance.sos", "updated", {
+        "id": alert.id, "status": alert.status, "acknowledged_at": alert.acknowledged_at,
+    })
     return {"message": "SOS alert acknowledged", "alert": alert}
 
 
@@ -705,10 +741,10 @@ async def resolve_sos_alert(
     false_alarm: bool = False,
     false_alarm_reason: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Resolve SOS alert"""
-    alert = db.query(SOSAlert).filter(SOSAlert.id == alert_id).first()
+    alert = await db.get(SOSAlert, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="SOS alert not found")
     
@@ -722,9 +758,12 @@ async def resolve_sos_alert(
     alert.resolution_notes = resolution_notes
     alert.resolved_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(alert)
+    await db.commit()
+    await db.refresh(alert)
     
+    publish_event("vigilance.sos", "updated", {
+        "id": alert.id, "status": alert.status, "resolved_at": alert.resolved_at,
+    })
     return {"message": "SOS alert resolved", "alert": alert}
 
 
@@ -733,86 +772,51 @@ async def resolve_sos_alert(
 @app.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard statistics"""
     today = datetime.utcnow().date()
     
-    # Total guards (unique guards in rosters)
-    total_guards = db.query(func.count(func.distinct(DutyRoster.guard_id))).scalar()
-    
-    # Active patrols (rosters with active status)
-    active_patrols = db.query(DutyRoster).filter(
-        DutyRoster.status == DutyStatus.ACTIVE
-    ).count()
-    
-    # Completed patrols today
-    completed_patrols = db.query(DutyRoster).filter(
-        and_(
+    stats = await collect(db, Aggregate(
+        DutyRoster,
+        # Unique guards in rosters
+        total_guards=count_distinct(DutyRoster.guard_id),
+        active_patrols=count(DutyRoster.status == DutyStatus.ACTIVE),
+        completed_patrols=count(
             DutyRoster.status == DutyStatus.COMPLETED,
             func.date(DutyRoster.duty_date) == today
-        )
-    ).count()
-    
-    # Total checkpoints
-    total_checkpoints = db.query(Checkpoint).filter(
-        Checkpoint.is_active == True
-    ).count()
-    
-    # Incidents today
-    incidents_today = db.query(Incident).filter(
-        func.date(Incident.incident_time) == today
-    ).count()
-    
-    # Open incidents
-    incidents_open = db.query(Incident).filter(
-        Incident.status.in_([
+        ),
+    ), Aggregate(
+        Checkpoint,
+        total_checkpoints=count(Checkpoint.is_active == True),
+    ), Aggregate(
+        Incident,
+        incidents_today=count(func.date(Incident.incident_time) == today),
+        incidents_open=count(Incident.status.in_([
             IncidentStatus.REPORTED,
             IncidentStatus.ACKNOWLEDGED,
             IncidentStatus.INVESTIGATING
-        ])
-    ).count()
-    
-    # Active SOS alerts
-    sos_alerts_active = db.query(SOSAlert).filter(
-        SOSAlert.status.in_([SOSStatus.ACTIVE, SOSStatus.RESPONDING])
-    ).count()
-    
-    # SOS alerts today
-    sos_alerts_today = db.query(SOSAlert).filter(
-        func.date(SOSAlert.alert_time) == today
-    ).count()
-    
-    # Missed patrols (logs marked as missed)
-    missed_patrols = db.query(PatrolLog).filter(
-        and_(
+        ])),
+        # High or critical severity, not closed
+        critical_incidents=count(
+            Incident.severity.in_(["high", "critical"]),
+            Incident.status != IncidentStatus.CLOSED
+        ),
+    ), Aggregate(
+        SOSAlert,
+        sos_alerts_active=count(SOSAlert.status.in_([SOSStatus.ACTIVE, SOSStatus.RESPONDING])),
+        sos_alerts_today=count(func.date(SOSAlert.alert_time) == today),
+    ), Aggregate(
+        PatrolLog,
+        missed_patrols=count(
             PatrolLog.status == PatrolStatus.MISSED,
             func.date(PatrolLog.scan_time) == today
-        )
-    ).count()
+        ),
+    ))
     
-    # Critical incidents (high or critical severity, not closed)
-    critical_incidents = db.query(Incident).filter(
-        and_(
-            Incident.severity.in_(["high", "critical"]),
-            Incident.status != IncidentStatus.CLOSED
-        )
-    ).count()
-    
-    return DashboardStats(
-        total_guards=total_guards,
-        active_patrols=active_patrols,
-        completed_patrols=completed_patrols,
-        total_checkpoints=total_checkpoints,
-        incidents_today=incidents_today,
-        incidents_open=incidents_open,
-        sos_alerts_active=sos_alerts_active,
-        sos_alerts_today=sos_alerts_today,
-        missed_patrols=missed_patrols,
-        critical_incidents=critical_incidents
-    )
+    return DashboardStats(**stats)
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8004)
+    from shared.server import serve
+    serve(app, "vigilance", port=8004)
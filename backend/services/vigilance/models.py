@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, Boolean, Enum as SQLEnum, Float, Integer, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, Boolean, Enum as SQLEnum, Float, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -139,6 +139,8 @@ class Checkpoint(Base):
 
 class PatrolLog(Base):
     __tablename__ = "patrol_logs"
+    # Keyset paging for GET /patrol-log
+    __table_args__ = (Index("ix_patrol_logs_scan_time_id", "scan_time", "id"),)
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     log_number = Column(String(50), unique=True, nullable=False, index=True)
@@ -262,6 +264,8 @@ class IncidentAttachment(Base):
 
 class SOSAlert(Base):
     __tablename__ = "sos_alerts"
+    # Keyset paging for GET /sos
+    __table_args__ = (Index("ix_sos_alerts_alert_time_id", "alert_time", "id"),)
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     alert_number = Column(String(50), unique=True, nullable=False, index=True)
@@ -0,0 +1,75 @@
+"""
+Dashboard statistics as conditional aggregates.
+
+A dashboard used to run one COUNT per metric, so a dozen metrics over
+three tables meant a dozen round trips and a dozen scans. Here each metric
+is a named predicate (or a column to sum or average) over its table; an
+Aggregate compiles all of a table's metrics into one
+SELECT SUM(CASE WHEN ... THEN 1 ELSE 0 END), ... and collect() runs every
+table's aggregate in a single statement, one scan per table:
+
+    stats = await collect(db, Aggregate(
+        Room,
+        total_rooms=count(),
+        available_rooms=count(Room.status == RoomStatus.AVAILABLE),
+    ), Aggregate(
+        Billing,
+        revenue_today=total(Billing.total_amount, func.date(Billing.created_at) == today),
+    ))
+"""
+from typing import Any, Dict
+
+from sqlalchemy import Float, and_, case, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def _when(criteria, value):
+    return case((and_(*criteria), value)) if criteria else value
+
+
+def count(*criteria):
+    """Rows matching every criterion (all rows with none)"""
+    if not criteria:
+        return func.count()
+    return func.coalesce(func.sum(case((and_(*criteria), 1), else_=0)), 0)
+
+
+def count_distinct(column, *criteria):
+    """Distinct non-null values of `column` among the matching rows"""
+    return func.count(func.distinct(_when(criteria, column)))
+
+
+def total(column, *criteria):
+    """Sum of `column` over the matching rows, 0 when there are none"""
+    return func.coalesce(func.sum(_when(criteria, column)), 0)
+
+
+def average(column, *criteria):
+    """Mean of the non-null `column` values of the matching rows, None when there are none"""
+    return func.avg(_when(criteria, column), type_=Float)
+
+
+class Aggregate:
+    """Named metrics over one table, computed by a single scan"""
+
+    def __init__(self, model, **metrics):
+        self.model = model
+        self.metrics = metrics
+
+    def statement(self):
+        return select(*(metric.label(name) for name, metric in self.metrics.items())).select_from(self.model)
+
+
+async def collect(db: AsyncSession, *aggregates: Aggregate) -> Dict[str, Any]:
+    """Every metric of every aggregate, by name, in one round trip"""
+    names = [name for aggregate in aggregates for name in aggregate.metrics]
+    if len(set(names)) != len(names):
+        raise ValueError("Metric names must be unique across aggregates")
+    # Each subquery is exactly one row, so their cross join is one row too
+    subqueries = [aggregate.statement().subquery() for aggregate in aggregates]
+    joined = subqueries[0]
+    for subquery in subqueries[1:]:
+        joined = joined.join(subquery, true())
+    columns = [column for subquery in subqueries for column in subquery.c]
+    row = (await db.execute(select(*columns).select_from(joined))).one()
+    return dict(zip(names, row))
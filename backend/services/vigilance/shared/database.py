@@ -1,9 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Column, DateTime, MetaData, String, Table, create_engine, event, func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.engine.url import make_url
-from typing import Generator
+from sqlalchemy.engine.url import URL, make_url
+from typing import Any, AsyncIterator, Dict, Tuple
 from .config import settings
+from .deadline import check_deadline
+import hashlib
 import os
 
 # Ensure SQLite database directory exists (use DATABASE_URL path, not repo paths)
@@ -38,6 +42,7 @@ _ensure_sqlite_dir(settings.DATABASE_URL)
 # Create database engine with SQLite-specific settings
 connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
 
+# Synchronous engine: schema creation, seeding and command-line scripts
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args=connect_args,
@@ -45,26 +50,129 @@ engine = create_engine(
     echo=settings.DEBUG
 )
 
-# Create session factory
+
+def async_database_url(database_url: str) -> Tuple[URL, Dict[str, Any]]:
+    """
+    The same database through an asyncio driver: aiosqlite for SQLite,
+    asyncpg for Postgres. asyncpg takes `ssl` rather than libpq's `sslmode`.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    options: Dict[str, Any] = {}
+    if backend == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+        options["check_same_thread"] = False
+    elif backend == "postgresql":
+        sslmode = url.query.get("sslmode")
+        url = url.set(drivername="postgresql+asyncpg").difference_update_query(["sslmode"])
+        if sslmode and sslmode != "disable":
+            options["ssl"] = sslmode
+    return url, options
+
+
+# Asynchronous engine: request handlers await queries instead of blocking the event loop
+_async_url, _async_connect_args = async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    _async_url,
+    connect_args=_async_connect_args,
+    pool_pre_ping=True,
+    echo=settings.DEBUG
+)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _check_request_deadline(conn, cursor, statement, parameters, context, executemany):
+    """Stop issuing queries for a request whose caller has given up"""
+    check_deadline()
+
+
+def sqlite_pragmas(database_url: str) -> Dict[str, Any]:
+    """PRAGMAs run on every new connection: SQLITE_PRAGMAS, for SQLite under the production profile"""
+    if make_url(database_url).get_backend_name() != "sqlite" or settings.SQLITE_PROFILE != "production":
+        return {}
+    return dict(settings.SQLITE_PRAGMAS)
+
+
+_pragmas = sqlite_pragmas(settings.DATABASE_URL)
+if _pragmas:
+    @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in _pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay loaded after commit: touching an expired attribute would need
+# a lazy load, which an AsyncSession cannot do implicitly
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db() -> Generator[Session, None, None]:
+async def get_db() -> AsyncIterator[AsyncSession]:
     """
     Database session dependency for FastAPI
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+# Schemas already created in this database, by fingerprint. Kept outside
+# Base.metadata so it is not part of what it fingerprints.
+schema_versions = Table(
+    "epos_schema_versions",
+    MetaData(),
+    Column("version", String(32), primary_key=True),
+    Column("created_at", DateTime, server_default=func.now()),
+)
+
+
+def schema_version() -> str:
+    """Fingerprint of every table, column and index the loaded models declare"""
+    tables = sorted(Base.metadata.tables.values(), key=lambda table: table.name)
+    signature = "\n".join(
+        f"{table.name}(" + ",".join(f"{column.name}:{column.type}" for column in table.columns) + ")"
+        + "".join(sorted(f" {index.name}" for index in table.indexes))
+        for table in tables
+    )
+    return hashlib.sha256(signature.encode()).hexdigest()[:32]
 
 
 def init_db():
     """
-    Initialize database tables
+    Initialize database tables.
+
+    A cold start whose models match a stamp already in the database does one
+    lookup instead of create_all inspecting every table. Services sharing a
+    database each leave their own stamp.
     """
+    version = schema_version()
+    try:
+        with engine.connect() as conn:
+            stamped = conn.execute(
+                select(schema_versions.c.version).where(schema_versions.c.version == version)
+            ).first()
+        if stamped is not None:
+            return
+    except SQLAlchemyError:
+        pass  # no stamp table yet
+
     Base.metadata.create_all(bind=engine)
+    # create_all leaves tables that already exist alone, new indexes included
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    schema_versions.create(bind=engine, checkfirst=True)
+    try:
+        with engine.begin() as conn:
+            conn.execute(schema_versions.insert().values(version=version))
+    except SQLAlchemyError:
+        pass  # stamped concurrently by another worker
@@ -0,0 +1,115 @@
+"""
+Weak ETags and conditional GETs.
+
+List and detail routes that are mostly refetched unchanged compute their
+ETag from a row-version signature (newest updated_at plus row count of the
+filtered query), which is one aggregate query. A matching If-None-Match is
+answered with 304 before the rows are loaded and serialised.
+
+Every other GET falls back to ETagMiddleware, which hashes the body: the
+handler still runs, but an unchanged body is not sent again.
+"""
+from typing import Any, Optional
+import hashlib
+
+from fastapi import Request, Response
+from sqlalchemy import Select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers, MutableHeaders
+
+# Media types whose bodies are streamed or too large to be worth hashing
+_EXCLUDED_TYPES = ("text/event-stream", "image/", "audio/", "video/", "application/zip", "application/pdf")
+
+
+def weak_etag(*parts: Any) -> str:
+    digest = hashlib.blake2b("\x1f".join(str(part) for part in parts).encode(), digest_size=12)
+    return f'W/"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison against an If-None-Match header"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+async def conditional_get(
+    request: Request, response: Response, db: AsyncSession, statement: Select, updated_at, *extra: Any
+) -> Optional[Response]:
+    """
+    304 for a query whose rows have not changed since the client's copy.
+
+    `statement` is the filtered select before ordering and paging; the
+    request's path and query string (skip, limit, filters) are part of the
+    ETag. Returns the 304 to send, or None after setting the ETag on
+    `response` so the handler goes on to load and return the rows.
+    """
+    signature = statement.order_by(None).with_only_columns(func.max(updated_at), func.count())
+    latest, count = (await db.execute(signature)).one()
+    etag = weak_etag(request.url.path, request.url.query, latest, count, *extra)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return None
+
+
+class ETagMiddleware:
+    """Body-hash ETags for buffered 200 responses to GETs that set none of their own"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Optional[dict] = None
+        passthrough = False
+
+        async def send_tagged(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").lower()
+                passthrough = (
+                    message["status"] != 200
+                    or "etag" in headers
+                    or "content-encoding" in headers
+                    or media_type.startswith(_EXCLUDED_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Streamed body: too late to hash it, send it as it comes
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            etag = weak_etag(hashlib.blake2b(message.get("body", b""), digest_size=16).hexdigest())
+            if etag_matches(if_none_match, etag):
+                await send({"type": "http.response.start", "status": 304, "headers": [(b"etag", etag.encode())]})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            MutableHeaders(raw=start["headers"])["ETag"] = etag
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_tagged)
@@ -1,6 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, and_, exists, select
 from typing import List, Optional
 from datetime import datetime, timedelta
 import sys
@@ -11,11 +13,16 @@ import os
 import tempfile
 sys.path.append('../..')
 
-from shared.database import get_db, init_db
+from shared.database import SessionLocal, get_db, init_db
+from shared.aggregates import Aggregate, collect, count
 from shared.auth import get_current_user
-from shared.middleware import setup_cors, setup_gzip, setup_exception_handlers
+from shared.middleware import setup_cors, setup_etags, setup_compression, setup_exception_handlers, setup_deadlines
+from shared.events import setup_events, publish_event
+from shared.etag import conditional_get
 from shared.config import settings
 from shared.file_handler import save_upload_file
+from shared.sequences import DocumentNumbers, seed_document_counters
+from shared.pagination import paginate
 
 from models import (
     VisitorRequest, SafetyTraining, TrainingCertificate, 
@@ -32,6 +39,11 @@ from schemas import (
     DashboardStats
 )
 
+# Document numbers, reserved in blocks from document_counters
+REQUEST_NUMBERS = DocumentNumbers("VR", VisitorRequest.request_number)
+CERTIFICATE_NUMBERS = DocumentNumbers("SC", TrainingCertificate.certificate_number)
+GATE_PASS_NUMBERS = DocumentNumbers("GP", GatePass.pass_number)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Visitor Gate Pass Management Service",
@@ -41,8 +53,11 @@ app = FastAPI(
 
 # Setup middleware
 setup_cors(app, settings.CORS_ORIGINS)
-setup_gzip(app)
+setup_etags(app)
+setup_compression(app)
 setup_exception_handlers(app)
+setup_deadlines(app)
+setup_events(app)
 
 
 @app.on_event("startup")
@@ -50,12 +65,9 @@ async def startup_event():
     """Initialize database on startup"""
     init_db()
     if _should_seed() and _should_seed_first_boot("visitor"):
-        db = next(get_db())
-        try:
-            _seed_visitor_data(db)
-            _mark_seeded("visitor")
-        finally:
-            db.close()
+        _seed_with_session()
+        _mark_seeded("visitor")
+    seed_document_counters()
 
 
 def _should_seed() -> bool:
@@ -140,29 +152,34 @@ async def root():
     return {"service": "Visitor Gate Pass Management", "status": "running", "port": 8006}
 
 
-@app.post("/admin/seed")
-async def seed_visitor_data(request: Request, current_user: dict = Depends(get_current_user)):
-    _require_seed_token(request)
-    db = next(get_db())
+def _seed_with_session() -> None:
+    db = SessionLocal()
     try:
         _seed_visitor_data(db)
-        return {"seeded": True}
     finally:
         db.close()
 
 
+@app.post("/admin/seed")
+async def seed_visitor_data(request: Request, current_user: dict = Depends(get_current_user)):
+    _require_seed_token(request)
+    # Bulk seeding is synchronous; keep it off the event loop
+    await run_in_threadpool(_seed_with_session)
+    await run_in_threadpool(seed_document_counters)
+    return {"seeded": True}
+
+
 # ========== Visitor Request Endpoints ==========
 
 @app.post("/requests", response_model=VisitorRequestResponse)
 async def create_visitor_request(
     request_data: VisitorRequestCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new visitor request"""
     # Generate request number
-    count = db.query(VisitorRequest).count()
-    request_number = f"VR{datetime.now().year}{count + 1:06d}"
+    request_number = await REQUEST_NUMBERS.next()
     
     # Create request
     request = VisitorRequest(
@@ -171,8 +188,8 @@ async def create_visitor_request(
     )
     
     db.add(request)
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     
     # Create safety training record if required
     if request.safety_required:
@@ -184,8 +201,8 @@ async def create_visitor_request(
     if request.medical_required and not request.safety_required:
         request.status = RequestStatus.MEDICAL_PENDING
     
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     
     return request
 
@@ -197,18 +214,18 @@ async def get_visitor_requests(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all visitor requests"""
-    query = db.query(VisitorRequest)
+    query = select(VisitorRequest)
     
     if status:
-        query = query.filter(VisitorRequest.status == status)
+        query = query.where(VisitorRequest.status == status)
     
     if visitor_type:
-        query = query.filter(VisitorRequest.visitor_type == visitor_type)
+        query = query.where(VisitorRequest.visitor_type == visitor_type)
     
-    requests = query.order_by(VisitorRequest.created_at.desc()).offset(skip).limit(limit).all()
+    requests = (await db.scalars(query.order_by(VisitorRequest.created_at.desc()).offset(skip).limit(limit))).all()
     return requests
 
 
@@ -216,10 +233,10 @@ async def get_visitor_requests(
 async def get_visitor_request(
     request_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific visitor request"""
-    request = db.query(VisitorRequest).filter(VisitorRequest.id == request_id).first()
+    request = await db.get(VisitorRequest, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     return request
@@ -230,10 +247,10 @@ async def update_visitor_request(
     request_id: str,
     request_data: VisitorRequestUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a visitor request"""
-    request = db.query(VisitorRequest).filter(VisitorRequest.id == request_id).first()
+    request = await db.get(VisitorRequest, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     
@@ -241,8 +258,8 @@ async def update_visitor_request(
         setattr(request, field, value)
     
     request.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     
     return request
 
@@ -252,10 +269,10 @@ async def approve_request(
     request_id: str,
     level: str = Query(..., description="sponsor, safety, security, or final"),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Approve visitor request at different levels"""
-    request = db.query(VisitorRequest).filter(VisitorRequest.id == request_id).first()
+    request = await db.get(VisitorRequest, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     
@@ -284,8 +301,8 @@ async def approve_request(
         request.final_approved_by = current_user["id"]
         request.final_approved_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     
     return {"message": f"Request approved at {level} level", "request": request}
 
@@ -295,18 +312,18 @@ async def reject_request(
     request_id: str,
     reason: str = Query(..., description="Rejection reason"),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Reject visitor request"""
-    request = db.query(VisitorRequest).filter(VisitorRequest.id == request_id).first()
+    request = await db.get(VisitorRequest, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
     request.status = RequestStatus.REJECTED
     request.rejection_reason = reason
     request.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(request)
+    await db.commit()
+    await db.refresh(request)
     return {"message": "Request rejected", "request": request}
 
 
@@ -316,10 +333,10 @@ async def reject_request(
 async def get_safety_training(
     request_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get safety training details for a request"""
-    training = db.query(SafetyTraining).filter(SafetyTraining.request_id == request_id).first()
+    training = await db.scalar(select(SafetyTraining).where(SafetyTraining.request_id == request_id))
     if not training:
         raise HTTPException(status_code=404, detail="Training record not found")
     return training
@@ -330,10 +347,10 @@ async def complete_video_training(
     request_id: str,
     watch_duration: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Mark video training as completed"""
-    training = db.query(SafetyTraining).filter(SafetyTraining.request_id == request_id).first()
+    training = await db.scalar(select(SafetyTraining).where(SafetyTraining.request_id == request_id))
     if not training:
         raise HTTPException(status_code=404, detail="Training record not found")
     
@@ -342,8 +359,8 @@ async def complete_video_training(
     training.video_completed_at = datetime.utcnow()
     training.status = TrainingStatus.IN_PROGRESS
     
-    db.commit()
-    db.refresh(training)
+    await db.commit()
+    await db.refresh(training)
     
     return {"message": "Video training completed", "training": training}
 
@@ -354,10 +371,10 @@ async def submit_quiz(
     score: int,
     total: int = 10,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Submit quiz results"""
-    training = db.query(SafetyTraining).filter(SafetyTraining.request_id == request_id).first()
+    training = await db.scalar(select(SafetyTraining).where(SafetyTraining.request_id == request_id))
     if not training:
         raise HTTPException(status_code=404, detail="Training record not found")
     
@@ -372,10 +389,9 @@ async def submit_quiz(
         training.status = TrainingStatus.COMPLETED
         
         # Generate certificate
-        cert_count = db.query(TrainingCertificate).count()
-        certificate_number = f"SC{datetime.now().year}{cert_count + 1:06d}"
+        certificate_number = await CERTIFICATE_NUMBERS.next()
         
-        request = db.query(VisitorRequest).filter(VisitorRequest.id == request_id).first()
+        request = await db.get(VisitorRequest, request_id)
         
         certificate = TrainingCertificate(
             training_id=training.id,
@@ -399,8 +415,8 @@ async def submit_quiz(
     else:
         training.status = TrainingStatus.FAILED
     
-    db.commit()
-    db.refresh(training)
+    await db.commit()
+    await db.refresh(training)
     
     return {
         "message": "Quiz submitted successfully",
@@ -416,14 +432,14 @@ async def upload_medical_clearance(
     request_id: str = Query(...),
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Upload medical clearance document"""
     # Save file
     file_path = await save_upload_file(file, "medical_documents")
     
     # Check if medical clearance already exists
-    medical = db.query(MedicalClearance).filter(MedicalClearance.request_id == request_id).first()
+    medical = await db.scalar(select(MedicalClearance).where(MedicalClearance.request_id == request_id))
     
     if medical:
         # Update existing record
@@ -445,11 +461,11 @@ async def upload_medical_clearance(
         db.add(medical)
     
     # Update request status
-    request = db.query(VisitorRequest).filter(VisitorRequest.id == request_id).first()
+    request = await db.get(VisitorRequest, request_id)
     request.status = RequestStatus.MEDICAL_UPLOADED
     
-    db.commit()
-    db.refresh(medical)
+    await db.commit()
+    await db.refresh(medical)
     
     return medical
 
@@ -458,10 +474,10 @@ async def upload_medical_clearance(
 async def get_medical_clearance(
     request_id: str,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get medical clearance details"""
-    medical = db.query(MedicalClearance).filter(MedicalClearance.request_id == request_id).first()
+    medical = await db.scalar(select(MedicalClearance).where(MedicalClearance.request_id == request_id))
     if not medical:
         raise HTTPException(status_code=404, detail="Medical clearance not found")
     return medical
@@ -474,10 +490,10 @@ async def verify_medical_clearance(
     verification_notes: Optional[str] = None,
     valid_until: Optional[datetime] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Verify medical clearance"""
-    medical = db.query(MedicalClearance).filter(MedicalClearance.id == medical_id).first()
+    medical = await db.get(MedicalClearance, medical_id)
     if not medical:
         raise HTTPException(status_code=404, detail="Medical clearance not found")
     
@@ -489,12 +505,12 @@ async def verify_medical_clearance(
     medical.valid_until = valid_until or (datetime.utcnow() + timedelta(days=180))
     
     # Update request status
-    request = db.query(VisitorRequest).filter(VisitorRequest.id == medical.request_id).first()
+    request = await db.get(VisitorRequest, medical.request_id)
     if verified:
         request.status = RequestStatus.PENDING_APPROVAL
     
-    db.commit()
-    db.refresh(medical)
+    await db.commit()
+    await db.refresh(medical)
     
     return {"message": "Medical clearance verified", "medical": medical}
 
@@ -519,11 +535,11 @@ def generate_qr_code(data: str) -> str:
 async def generate_gate_pass(
     pass_data: GatePassCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Generate gate pass with QR code"""
     # Check if request is approved
-    request = db.query(VisitorRequest).filter(VisitorRequest.id == pass_data.request_id).first()
+    request = await db.get(VisitorRequest, pass_data.request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     
@@ -531,8 +547,7 @@ async def generate_gate_pass(
         raise HTTPException(status_code=400, detail="Request not approved yet")
     
     # Generate pass number
-    count = db.query(GatePass).count()
-    pass_number = f"GP{datetime.now().year}{count + 1:06d}"
+    pass_number = await GATE_PASS_NUMBERS.next()
     
     # Create gate pass
     gate_pass = GatePass(
@@ -551,38 +566,54 @@ async def generate_gate_pass(
     # Update request status
     request.status = RequestStatus.GATE_PASS_ISSUED
     
-    db.commit()
-    db.refresh(gate_pass)
+    await db.commit()
+    await db.refresh(gate_pass)
     
+    publish_event("visitor.gate", "pass_issued", {
+        "id": gate_pass.id, "pass_number": gate_pass.pass_number,
+        "visitor_name": gate_pass.visitor_name, "valid_until": gate_pass.valid_until,
+    })
     return gate_pass
 
 
 @app.get("/gate-pass", response_model=List[GatePassResponse])
 async def get_gate_passes(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all gate passes"""
-    query = db.query(GatePass)
+    query = select(GatePass)
     
     if status:
-        query = query.filter(GatePass.status == status)
+        query = query.where(GatePass.status == status)
+    
+    not_modified = await conditional_get(request, response, db, query, GatePass.updated_at)
+    if not_modified is not None:
+        return not_modified
     
-    passes = query.order_by(GatePass.created_at.desc()).offset(skip).limit(limit).all()
-    return passes
+    return await paginate(db, query, GatePass.created_at, GatePass.id, response, skip, limit, cursor)
 
 
 @app.get("/gate-pass/{pass_id}", response_model=GatePassResponse)
 async def get_gate_pass(
     pass_id: str,
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific gate pass"""
-    gate_pass = db.query(GatePass).filter(GatePass.id == pass_id).first()
+    query = select(GatePass).where(GatePass.id == pass_id)
+    not_modified = await conditional_get(request, response, db, query, GatePass.updated_at)
+    if not_modified is not None:
+        return not_modified
+    gate_pass = await db.scalar(query)
     if not gate_pass:
         raise HTTPException(status_code=404, detail="Gate pass not found")
     return gate_pass
@@ -591,10 +622,10 @@ async def get_gate_pass(
 @app.get("/gate-pass/number/{pass_number}", response_model=GatePassResponse)
 async def get_gate_pass_by_number(
     pass_number: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get gate pass by pass number (for QR scanning)"""
-    gate_pass = db.query(GatePass).filter(GatePass.pass_number == pass_number).first()
+    gate_pass = await db.scalar(select(GatePass).where(GatePass.pass_number == pass_number))
     if not gate_pass:
         raise HTTPException(status_code=404, detail="Gate pass not found")
     return gate_pass
@@ -606,11 +637,11 @@ async def get_gate_pass_by_number(
 async def log_entry_exit(
     log_data: EntryExitCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Log visitor entry or exit"""
     # Verify gate pass
-    gate_pass = db.query(GatePass).filter(GatePass.id == log_data.gate_pass_id).first()
+    gate_pass = await db.get(GatePass, log_data.gate_pass_id)
     if not gate_pass:
         raise HTTPException(status_code=404, detail="Gate pass not found")
     
@@ -625,62 +656,67 @@ async def log_entry_exit(
     # Create log entry
     log = EntryExit(**log_data.dict())
     db.add(log)
-    db.commit()
-    db.refresh(log)
+    await db.commit()
+    await db.refresh(log)
     
+    publish_event("visitor.gate", EntryExitType(log.log_type).value, {
+        "id": log.id, "gate_pass_id": log.gate_pass_id, "gate_number": log.gate_number,
+        "timestamp": log.timestamp,
+    })
     return log
 
 
 @app.get("/entry-exit", response_model=List[EntryExitResponse])
 async def get_entry_exit_logs(
+    response: Response,
     request_id: Optional[str] = None,
     gate_pass_id: Optional[str] = None,
     log_type: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get entry/exit logs"""
-    query = db.query(EntryExit)
+    query = select(EntryExit)
     
     if request_id:
-        query = query.filter(EntryExit.request_id == request_id)
+        query = query.where(EntryExit.request_id == request_id)
     
     if gate_pass_id:
-        query = query.filter(EntryExit.gate_pass_id == gate_pass_id)
+        query = query.where(EntryExit.gate_pass_id == gate_pass_id)
     
     if log_type:
-        query = query.filter(EntryExit.log_type == log_type)
+        query = query.where(EntryExit.log_type == log_type)
     
-    logs = query.order_by(EntryExit.timestamp.desc()).offset(skip).limit(limit).all()
-    return logs
+    return await paginate(db, query, EntryExit.timestamp, EntryExit.id, response, skip, limit, cursor)
 
 
 @app.get("/entry-exit/active-visitors")
 async def get_active_visitors(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get list of currently active visitors (entered but not exited)"""
     # Find all entries without corresponding exits
-    entries = db.query(EntryExit).filter(
+    entries = (await db.scalars(select(EntryExit).where(
         EntryExit.log_type == EntryExitType.ENTRY
-    ).all()
+    ))).all()
     
     active_visitors = []
     for entry in entries:
         # Check if there's a corresponding exit
-        exit_log = db.query(EntryExit).filter(
+        exit_log = await db.scalar(select(EntryExit).where(
             and_(
                 EntryExit.gate_pass_id == entry.gate_pass_id,
                 EntryExit.log_type == EntryExitType.EXIT,
                 EntryExit.timestamp > entry.timestamp
             )
-        ).first()
+        ))
         
         if not exit_log:
-            gate_pass = db.query(GatePass).filter(GatePass.id == entry.gate_pass_id).first()
+            gate_pass = await db.get(GatePass, entry.gate_pass_id)
             active_visitors.append({
                 "entry_id": entry.id,
                 "gate_pass": gate_pass,
@@ -694,17 +730,17 @@ async def get_active_visitors(
 @app.get("/active")
 async def get_active_visitors_simple(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get list of currently active visitors - simplified endpoint"""
     # Get all approved requests for today
     today = datetime.now().date()
-    active = db.query(VisitorRequest).filter(
+    active = (await db.scalars(select(VisitorRequest).where(
         and_(
             VisitorRequest.status == RequestStatus.APPROVED,
             func.date(VisitorRequest.visit_date) == today
         )
-    ).all()
+    ))).all()
     return active
 
 
@@ -713,104 +749,57 @@ async def get_active_visitors_simple(
 @app.get("/dashboard/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard statistics"""
-    total_requests = db.query(VisitorRequest).count()
+    today = datetime.utcnow().date()
+    entered_today = and_(
+        EntryExit.log_type == EntryExitType.ENTRY,
+        func.date(EntryExit.timestamp) == today
+    )
+    # Active visitors: today's entries with no later exit on the same gate pass
+    later_exit = aliased(EntryExit)
+    exited = exists().where(
+        later_exit.gate_pass_id.is_not_distinct_from(EntryExit.gate_pass_id),
+        later_exit.log_type == EntryExitType.EXIT,
+        later_exit.timestamp > EntryExit.timestamp
+    )
     
-    pending_approvals = db.query(VisitorRequest).filter(
-        VisitorRequest.status.in_([
+    stats = await collect(db, Aggregate(
+        VisitorRequest,
+        total_requests=count(),
+        pending_approvals=count(VisitorRequest.status.in_([
             RequestStatus.PENDING_APPROVAL,
             RequestStatus.MEDICAL_UPLOADED,
             RequestStatus.TRAINING_COMPLETED
-        ])
-    ).count()
-
-    pending_requests = db.query(VisitorRequest).filter(
-        VisitorRequest.status.in_([
+        ])),
+        pending_requests=count(VisitorRequest.status.in_([
             RequestStatus.SUBMITTED,
             RequestStatus.PENDING_APPROVAL,
             RequestStatus.MEDICAL_UPLOADED,
             RequestStatus.TRAINING_COMPLETED
-        ])
-    ).count()
-
-    approved_requests = db.query(VisitorRequest).filter(
-        VisitorRequest.status == RequestStatus.APPROVED
-    ).count()
-    
-    completed_visits = db.query(VisitorRequest).filter(
-        VisitorRequest.status == RequestStatus.GATE_PASS_ISSUED
-    ).count()
-    
-    training_pending = db.query(VisitorRequest).filter(
-        VisitorRequest.status == RequestStatus.TRAINING_PENDING
-    ).count()
-    
-    medical_pending = db.query(VisitorRequest).filter(
-        VisitorRequest.status == RequestStatus.MEDICAL_PENDING
-    ).count()
-    
-    gate_passes_issued = db.query(GatePass).filter(
-        GatePass.status == GatePassStatus.ACTIVE
-    ).count()
-    
-    # Active visitors (entries without exits)
-    today = datetime.utcnow().date()
-    entries = db.query(EntryExit).filter(
-        and_(
-            EntryExit.log_type == EntryExitType.ENTRY,
-            func.date(EntryExit.timestamp) == today
-        )
-    ).all()
-    
-    active_count = 0
-    for entry in entries:
-        exit_log = db.query(EntryExit).filter(
-            and_(
-                EntryExit.gate_pass_id == entry.gate_pass_id,
-                EntryExit.log_type == EntryExitType.EXIT,
-                EntryExit.timestamp > entry.timestamp
-            )
-        ).first()
-        if not exit_log:
-            active_count += 1
-    
-    today_entries = db.query(EntryExit).filter(
-        and_(
-            EntryExit.log_type == EntryExitType.ENTRY,
-            func.date(EntryExit.timestamp) == today
-        )
-    ).count()
-    
-    today_exits = db.query(EntryExit).filter(
-        and_(
+        ])),
+        approved_requests=count(VisitorRequest.status == RequestStatus.APPROVED),
+        completed_visits=count(VisitorRequest.status == RequestStatus.GATE_PASS_ISSUED),
+        training_pending=count(VisitorRequest.status == RequestStatus.TRAINING_PENDING),
+        medical_pending=count(VisitorRequest.status == RequestStatus.MEDICAL_PENDING),
+        visitors_today=count(func.date(VisitorRequest.visit_date) == today),
+    ), Aggregate(
+        GatePass,
+        gate_passes_issued=count(GatePass.status == GatePassStatus.ACTIVE),
+    ), Aggregate(
+        EntryExit,
+        active_visitors=count(entered_today, ~exited),
+        today_entries=count(entered_today),
+        today_exits=count(
             EntryExit.log_type == EntryExitType.EXIT,
             func.date(EntryExit.timestamp) == today
-        )
-    ).count()
-
-    visitors_today = db.query(VisitorRequest).filter(
-        func.date(VisitorRequest.visit_date) == today
-    ).count()
-    
-    return DashboardStats(
-        total_requests=total_requests,
-        pending_requests=pending_requests,
-        approved_requests=approved_requests,
-        pending_approvals=pending_approvals,
-        active_visitors=active_count,
-        completed_visits=completed_visits,
-        training_pending=training_pending,
-        medical_pending=medical_pending,
-        gate_passes_issued=gate_passes_issued,
-        visitors_today=visitors_today,
-        visitors_onsite=active_count,
-        today_entries=today_entries,
-        today_exits=today_exits
-    )
+        ),
+    ))
+    
+    return DashboardStats(**stats, visitors_onsite=stats["active_visitors"])
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8006)
+    from shared.server import serve
+    serve(app, "visitor", port=8006)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, Boolean, Enum as SQLEnum, Float, Integer, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, Boolean, Enum as SQLEnum, Float, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -218,6 +218,8 @@ class MedicalClearance(Base):
 
 class GatePass(Base):
     __tablename__ = "gate_passes"
+    # Keyset paging for GET /gate-pass
+    __table_args__ = (Index("ix_gate_passes_created_at_id", "created_at", "id"),)
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     request_id = Column(String(36), ForeignKey("visitor_requests.id", ondelete="CASCADE"), unique=True)
@@ -279,6 +281,8 @@ class GatePass(Base):
 
 class EntryExit(Base):
     __tablename__ = "entry_exit_logs"
+    # Keyset paging for GET /entry-exit
+    __table_args__ = (Index("ix_entry_exit_logs_timestamp_id", "timestamp", "id"),)
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     request_id = Column(String(36), ForeignKey("visitor_requests.id", ondelete="CASCADE"))
@@ -0,0 +1,21 @@
+"""
+Service launcher: a TCP port, or a Unix domain socket on single-host installs
+"""
+import os
+
+from .config import settings
+
+
+def serve(app, name: str, port: int) -> None:
+    """Run a service on its SERVICE_SOCKETS path when one is configured, else on its port"""
+    import uvicorn
+
+    path = settings.SERVICE_SOCKETS.get(name)
+    if not path:
+        uvicorn.run(app, host="0.0.0.0", port=port)
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        # Left behind by a previous run that did not shut down cleanly
+        os.unlink(path)
+    uvicorn.run(app, uds=path)
@@ -0,0 +1,185 @@
+"""
+Priority admission control for the API gateway.
+
+Every request is classified by ADMISSION_RULES. Each class has its own
+concurrency limit and waiting queue, so a spike of dashboard or report reads
+queues (and past the queue, is shed) inside its own class instead of in
+front of SOS alerts and gate entries. Classes with limit 0 are never queued.
+"""
+from collections import deque
+from typing import Any, Dict, Optional
+import asyncio
+import fnmatch
+import json
+import time
+
+from fastapi import FastAPI
+
+from .config import settings
+
+# Recent waits kept per class for the p95 figure
+_WAIT_SAMPLES = 500
+
+
+class AdmissionRejected(Exception):
+    """Raised when a class is at its limit and its queue is full or timed out"""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"{name} requests {reason}")
+        self.name = name
+        self.reason = reason
+
+
+class PriorityClass:
+    """Concurrency limit with a bounded FIFO of waiters"""
+
+    def __init__(self, name: str, limit: int = 0, queue: int = 0, timeout: float = 0.0):
+        self.name = name
+        self.limit = limit
+        self.max_queue = queue
+        self.timeout = timeout
+
+        self.active = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._waits = deque(maxlen=_WAIT_SAMPLES)
+
+    async def acquire(self) -> None:
+        if self.limit <= 0 or (self.active < self.limit and not self._waiters):
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            raise AdmissionRejected(self.name, "shed")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.queued += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout=self.timeout or None)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise AdmissionRejected(self.name, "timed out in queue")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted the slot just as we were cancelled; hand it on
+                self.release()
+            raise
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+            waited = time.perf_counter() - started
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self._waits.append(waited)
+        # The releasing request passed its slot over without decrementing
+        self.admitted += 1
+
+    def release(self) -> None:
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        p95 = waits[int(len(waits) * 0.95)] if waits else 0.0
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(self.total_wait / self.queued * 1000, 2) if self.queued else 0.0,
+            "p95_wait_ms": round(p95 * 1000, 2),
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+class AdmissionController:
+    """Classifies requests and tracks one PriorityClass per configured class"""
+
+    def __init__(self):
+        self.classes = {
+            name: PriorityClass(name, **config)
+            for name, config in settings.ADMISSION_CLASSES.items()
+        }
+
+    def classify(self, method: str, path: str) -> str:
+        """First ADMISSION_RULES entry matching the method and gateway path"""
+        for rule in settings.ADMISSION_RULES:
+            methods = rule.get("methods")
+            if methods and method not in methods:
+                continue
+            if fnmatch.fnmatchcase(path, rule["path"]):
+                return rule["class"]
+        return settings.ADMISSION_DEFAULT_CLASS
+
+    def get(self, name: str) -> Optional[PriorityClass]:
+        return self.classes.get(name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: priority.stats() for name, priority in self.classes.items()}
+
+
+admission = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware holding a class slot for the whole request, including a
+    streamed response body. Rejected requests get a 503 with Retry-After.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        priority = admission.get(admission.classify(scope["method"], scope["path"]))
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await priority.acquire()
+        except AdmissionRejected as exc:
+            await _send_busy(send, exc)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            priority.release()
+
+
+async def _send_busy(send, exc: AdmissionRejected) -> None:
+    body = json.dumps({"detail": "Server busy, please retry shortly", "class": exc.name}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", b"1"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def setup_admission(app: FastAPI):
+    """Add the admission layer; call before CORS so shed responses get CORS headers"""
+    app.add_middleware(AdmissionMiddleware)
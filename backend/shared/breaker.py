@@ -0,0 +1,126 @@
+"""
+Circuit breaker guarding each upstream service
+"""
+from collections import deque
+from typing import Any, Dict
+import time
+
+from .config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit open for {name} service")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Rolling-window breaker.
+
+    A call is bad if it errors, returns 5xx or takes longer than the slow-call
+    threshold. Once the bad rate over the last calls reaches the limit the
+    circuit opens and calls fail immediately. After the cool-down a few trial
+    calls are let through (half-open): a good one closes the circuit, a bad
+    one opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        open_seconds: float,
+        half_open_calls: int,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)  # True for a bad call
+        self._opened_at = 0.0
+        self._trials = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_settings(cls, name: str) -> "CircuitBreaker":
+        return cls(
+            name,
+            window=settings.BREAKER_WINDOW,
+            min_calls=settings.BREAKER_MIN_CALLS,
+            failure_rate=settings.BREAKER_FAILURE_RATE,
+            slow_call_seconds=settings.BREAKER_SLOW_CALL_SECONDS,
+            open_seconds=settings.BREAKER_OPEN_SECONDS,
+            half_open_calls=settings.BREAKER_HALF_OPEN_CALLS,
+        )
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError"""
+        if self.state == OPEN:
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = HALF_OPEN
+            self._trials = 0
+        if self.state == HALF_OPEN:
+            if self._trials >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.open_seconds)
+            self._trials += 1
+
+    def record(self, failed: bool, elapsed: float) -> None:
+        """Record the outcome of an admitted call"""
+        bad = failed or elapsed > self.slow_call_seconds
+        if self.state == OPEN:
+            # A call admitted before the circuit opened; it must not extend the cool-down
+            return
+        if self.state == HALF_OPEN:
+            if bad:
+                self._open()
+            else:
+                self.state = CLOSED
+                self._outcomes.clear()
+            return
+
+        self._outcomes.append(bad)
+        if len(self._outcomes) >= self.min_calls and self.bad_rate() >= self.failure_rate:
+            self._open()
+
+    def abandon(self) -> None:
+        """An admitted call was cancelled by its caller; give back a half-open trial"""
+        if self.state == HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def bad_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(self._outcomes) / len(self._outcomes)
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "bad_rate": round(self.bad_rate(), 3),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,64 @@
+"""
+Change events published by the services.
+
+A handler calls publish_event() after a write; the events ride back to the
+gateway on the response in the X-Epos-Events header, and the gateway pushes
+them to subscribed clients. Events only leave the service if the write
+succeeded, and a service needs no connection of its own to the gateway.
+"""
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+
+EVENTS_HEADER = "x-epos-events"
+
+# Events raised by the request being served; None outside a request
+_pending: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("epos_pending_events", default=None)
+
+
+def publish_event(topic: str, action: str, data: Dict[str, Any]) -> None:
+    """
+    Queue a change event for the current response.
+
+    Keep data to the id and the fields that changed; clients merge it into
+    what they already have. Calls outside a request (seeding, scripts) are ignored.
+    """
+    pending = _pending.get()
+    if pending is not None:
+        pending.append({"topic": topic, "action": action, "data": jsonable_encoder(data)})
+
+
+def encode_events(events: List[Dict[str, Any]]) -> str:
+    return json.dumps(events, separators=(",", ":"))
+
+
+def decode_events(raw: str) -> List[Dict[str, Any]]:
+    try:
+        events = json.loads(raw)
+    except ValueError:
+        return []
+    return [event for event in events if isinstance(event, dict) and "topic" in event]
+
+
+async def events_middleware(request: Request, call_next):
+    """Attach the events a successful write raised to its response"""
+    if request.method in ("GET", "HEAD", "OPTIONS"):
+        return await call_next(request)
+
+    pending: List[Dict[str, Any]] = []
+    token = _pending.set(pending)
+    try:
+        response = await call_next(request)
+    finally:
+        _pending.reset(token)
+    if pending and response.status_code < 400:
+        response.headers[EVENTS_HEADER] = encode_events(pending)
+    return response
+
+
+def setup_events(app: FastAPI):
+    """Send published change events back with write responses"""
+    app.middleware("http")(events_middleware)
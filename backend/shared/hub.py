@@ -0,0 +1,253 @@
+"""
+Server-Sent Events hub in the gateway.
+
+Clients subscribe to topics (canteen.orders, vigilance.sos, visitor.gate,
+guesthouse.rooms) on GET /api/events and receive each change as a small
+delta, instead of polling dashboard stats on a timer. Events come from the
+services on their write responses (see events.py).
+
+With Redis reachable, events go through a pub/sub channel so a client
+connected to any gateway worker sees writes made through every worker.
+Recent events are kept so a reconnecting client resumes from Last-Event-ID;
+a client that fell too far behind is told to resync instead.
+"""
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+
+from .config import settings
+from .events import EVENTS_HEADER, decode_events
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "epos:events"
+SEQUENCE_KEY = "epos:events:seq"
+RESYNC = b"event: resync\ndata: {}\n\n"
+
+
+def _redis():
+    """redis.asyncio, imported only once Redis is configured: it is slow to import"""
+    try:
+        import redis.asyncio as aioredis
+    except ImportError:  # redis is optional; events stay within this process
+        return None
+    return aioredis
+
+
+def format_sse(event: Dict[str, Any]) -> bytes:
+    data = json.dumps(
+        {"topic": event["topic"], "action": event["action"], "data": event["data"]},
+        separators=(",", ":"),
+    )
+    return f"id: {event['id']}\nevent: {event['topic']}\ndata: {data}\n\n".encode()
+
+
+class Subscriber:
+    """One connected client and the events waiting to be written to it"""
+
+    def __init__(self, topics: Set[str]):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENTS_SUBSCRIBER_QUEUE)
+        self.overflowed = False
+
+    def wants(self, topic: str) -> bool:
+        return not self.topics or topic in self.topics
+
+    def offer(self, event: Dict[str, Any]) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # A slow client gets a resync instead of holding events for everyone
+            self.overflowed = True
+            return False
+
+
+class EventHub:
+    """Topic fan-out with a bounded replay buffer"""
+
+    def __init__(self, backlog: int):
+        self._subscribers: Set[Subscriber] = set()
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=backlog)
+        self._sequence = 0
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def backend(self) -> str:
+        return "redis" if self._redis is not None else "memory"
+
+    async def start(self) -> None:
+        """Relay events through Redis when configured and reachable"""
+        if not settings.EVENTS_ENABLED or settings.CACHE_BACKEND != "redis":
+            return
+        aioredis = _redis()
+        if aioredis is None:
+            return
+        client = aioredis.from_url(settings.REDIS_URL, socket_connect_timeout=1)
+        try:
+            await client.ping()
+        except Exception as exc:
+            logger.warning(f"Redis unavailable at {settings.REDIS_URL}, events stay in this process: {exc}")
+            await client.aclose()
+            return
+        pubsub = client.pubsub()
+        await pubsub.subscribe(CHANNEL)
+        self._redis = client
+        self._listener = asyncio.ensure_future(self._listen(pubsub))
+
+    async def aclose(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def _listen(self, pubsub) -> None:
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    self._deliver(json.loads(message["data"]))
+        finally:
+            await pubsub.aclose()
+
+    async def publish(self, topic: str, action: str, data: Dict[str, Any]) -> None:
+        event = {"topic": topic, "action": action, "data": data}
+        self.published += 1
+        if self._redis is not None:
+            try:
+                event["id"] = await self._redis.incr(SEQUENCE_KEY)
+                await self._redis.publish(CHANNEL, json.dumps(event, separators=(",", ":")))
+                return
+            except Exception as exc:
+                logger.warning(f"Event relay through Redis failed, delivering locally: {exc}")
+        self._sequence += 1
+        event["id"] = self._sequence
+        self._deliver(event)
+
+    def _deliver(self, event: Dict[str, Any]) -> None:
+        self._sequence = max(self._sequence, event["id"])
+        self._recent.append(event)
+        for subscriber in self._subscribers:
+            if subscriber.wants(event["topic"]):
+                if subscriber.offer(event):
+                    self.delivered += 1
+                else:
+                    self.dropped += 1
+
+    def subscribe(self, topics: Set[str], last_event_id: Optional[int] = None) -> Subscriber:
+        """Register a client, queueing what it missed since last_event_id"""
+        if len(self._subscribers) >= settings.EVENTS_MAX_SUBSCRIBERS:
+            raise OverflowError("Too many event subscribers")
+        subscriber = Subscriber(topics)
+        if last_event_id is not None:
+            oldest = self._recent[0]["id"] if self._recent else self._sequence + 1
+            if last_event_id < oldest - 1:
+                subscriber.overflowed = True
+            else:
+                for event in self._recent:
+                    if event["id"] > last_event_id and subscriber.wants(event["topic"]):
+                        subscriber.offer(event)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        """SSE body for one subscriber; heartbeats keep proxies from closing it"""
+        try:
+            yield f"retry: {settings.EVENTS_RETRY_MS}\n\n".encode()
+            while True:
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
+                    yield RESYNC
+                    continue
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=settings.EVENTS_HEARTBEAT
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "last_event_id": self._sequence,
+        }
+
+
+event_hub = EventHub(settings.EVENTS_BACKLOG)
+
+
+def parse_topics(raw: Optional[str]) -> Set[str]:
+    """Comma-separated topics; empty means every topic"""
+    return {topic.strip() for topic in (raw or "").split(",") if topic.strip()}
+
+
+def parse_last_event_id(raw: Optional[str]) -> Optional[int]:
+    try:
+        return int(raw) if raw else None
+    except ValueError:
+        return None
+
+
+async def publish_all(events: List[Dict[str, Any]]) -> None:
+    if not settings.EVENTS_ENABLED:
+        return
+    for event in events:
+        await event_hub.publish(event["topic"], event.get("action", "updated"), event.get("data", {}))
+
+
+class EventRelay:
+    """
+    ASGI wrapper for services mounted in-process: their write responses skip
+    the proxy, so the events header is taken off and published here instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        header = EVENTS_HEADER.encode()
+
+        async def relay(message):
+            if message["type"] == "http.response.start":
+                raw = None
+                headers = []
+                for key, value in message.get("headers", []):
+                    if key.lower() == header:
+                        raw = value
+                    else:
+                        headers.append((key, value))
+                if raw is not None:
+                    message = {**message, "headers": headers}
+                    if message["status"] < 400:
+                        await publish_all(decode_events(raw.decode("latin-1")))
+            await send(message)
+
+        await self.app(scope, receive, relay)
@@ -0,0 +1,124 @@
+"""
+Last-known-good responses for gateway dashboard routes.
+
+The last successful payload per route is kept in process and served at once
+with its Age, while a refresh runs in the background. A partial outage then
+shows the last real figures instead of zeros, and the UI has no reason to
+retry in a loop.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlencode
+import asyncio
+import logging
+import time
+
+import httpx
+from fastapi.responses import Response
+
+from .config import settings
+from .singleflight import inflight_gets
+
+logger = logging.getLogger(__name__)
+
+
+class LastGoodEntry:
+    """A successful upstream body and when it was fetched"""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.stored_at = time.monotonic()
+        self.due = False  # a write made it out of date
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    def to_response(self) -> Response:
+        stale = self.due or self.age() >= settings.LAST_GOOD_REFRESH_AFTER
+        return Response(
+            content=self.body,
+            media_type=self.media_type,
+            headers={"Age": str(int(self.age())), "X-Last-Good": "stale" if stale else "fresh"},
+        )
+
+
+class LastKnownGood:
+    """Bounded per-route store with single-flight background refreshes"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, LastGoodEntry]" = OrderedDict()
+        self._refreshes: Dict[str, asyncio.Task] = {}
+        self.served = 0
+        self.refreshed = 0
+        self.refresh_failures = 0
+
+    def key(self, service: str, path: str, query_items: list) -> str:
+        return f"{service}:{path}?{urlencode(sorted(query_items))}"
+
+    def get(self, key: str) -> Optional[LastGoodEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.age() > settings.LAST_GOOD_MAX_AGE:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, body: bytes, media_type: str) -> LastGoodEntry:
+        entry = LastGoodEntry(body, media_type)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def mark_due(self, service: str) -> None:
+        """Refresh a service's entries on their next read"""
+        prefix = f"{service}:"
+        for key, entry in self._entries.items():
+            if key.startswith(prefix):
+                entry.due = True
+
+    def needs_refresh(self, entry: LastGoodEntry) -> bool:
+        return entry.due or entry.age() >= settings.LAST_GOOD_REFRESH_AFTER
+
+    async def fetch(self, key: str, fetch: Callable) -> LastGoodEntry:
+        """Fetch through single-flight and keep the result if it succeeded"""
+        response: httpx.Response = await inflight_gets.do(f"last-good:{key}", fetch)
+        if not response.is_success:
+            raise httpx.HTTPStatusError(
+                f"Upstream answered {response.status_code}", request=response.request, response=response
+            )
+        return self.put(key, response.content, response.headers.get("content-type", "application/json"))
+
+    def refresh(self, key: str, fetch: Callable) -> None:
+        """Refresh an entry without holding up the request that noticed it was due"""
+        if key in self._refreshes:
+            return
+
+        async def run():
+            try:
+                await self.fetch(key, fetch)
+                self.refreshed += 1
+            except Exception as exc:
+                self.refresh_failures += 1
+                logger.info(f"Background refresh of {key} failed, keeping last good: {exc}")
+
+        task = asyncio.ensure_future(run())
+        self._refreshes[key] = task
+        task.add_done_callback(lambda done: self._refreshes.pop(key, None))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "served": self.served,
+            "refreshing": len(self._refreshes),
+            "refreshed": self.refreshed,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+last_good = LastKnownGood(settings.LAST_GOOD_MAX_ENTRIES)
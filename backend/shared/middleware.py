@@ -1,12 +1,17 @@
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import time
 import logging
 
+from .config import settings
+from .compression import CompressionMiddleware
+from .etag import ETagMiddleware
+from .deadline import DeadlineExceeded, budget_from_header, reset_deadline, set_deadline
+from .events import setup_events
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,12 +24,24 @@ def setup_cors(app: FastAPI, origins: list):
         allow_credentials=False,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Keyset-paged lists return the next page's cursor here (shared.pagination)
+        expose_headers=["X-Next-Cursor"],
     )
 
 
+def setup_compression(app: FastAPI):
+    """Setup response compression (zstd, brotli or gzip, as the client accepts)"""
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+
+def setup_etags(app: FastAPI):
+    """Setup body-hash ETags and 304s for GETs whose routes set no ETag themselves"""
+    app.add_middleware(ETagMiddleware)
+
+
 def setup_gzip(app: FastAPI):
-    """Setup GZip compression"""
-    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    """Alias for setup_compression"""
+    setup_compression(app)
 
 
 async def catch_exceptions_middleware(request: Request, call_next):
@@ -62,6 +79,34 @@ async def log_requests_middleware(request: Request, call_next):
     return response
 
 
+async def deadline_middleware(request: Request, call_next):
+    """
+    Run reads under the deadline the gateway forwarded.
+
+    Queries check it before they execute, so list and dashboard work stops
+    once the caller has given up. Writes always run to completion.
+    """
+    budget = budget_from_header(request)
+    if budget is None or request.method not in ("GET", "HEAD"):
+        return await call_next(request)
+    if budget <= 0:
+        return JSONResponse(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            content={"detail": "Request deadline exceeded"}
+        )
+
+    token = set_deadline(budget)
+    try:
+        return await call_next(request)
+    finally:
+        reset_deadline(token)
+
+
+def setup_deadlines(app: FastAPI):
+    """Honour gateway deadlines on read requests"""
+    app.middleware("http")(deadline_middleware)
+
+
 def setup_exception_handlers(app: FastAPI):
     """Setup global exception handlers"""
     
@@ -69,7 +114,8 @@ def setup_exception_handlers(app: FastAPI):
     async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         return JSONResponse(
             status_code=exc.status_code,
-            content={"detail": exc.detail}
+            content={"detail": exc.detail},
+            headers=getattr(exc, "headers", None)
         )
     
     @app.exception_handler(RequestValidationError)
@@ -79,6 +125,14 @@ def setup_exception_handlers(app: FastAPI):
             content={"detail": exc.errors()}
         )
     
+    @app.exception_handler(DeadlineExceeded)
+    async def deadline_exception_handler(request: Request, exc: DeadlineExceeded):
+        logger.info(f"{request.method} {request.url.path} abandoned: {exc}")
+        return JSONResponse(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            content={"detail": "Request deadline exceeded"}
+        )
+    
     @app.exception_handler(Exception)
     async def general_exception_handler(request: Request, exc: Exception):
         logger.error(f"Unhandled exception: {str(exc)}", exc_info=True)
@@ -91,8 +145,11 @@ def setup_exception_handlers(app: FastAPI):
 def setup_middleware(app: FastAPI):
     """Setup all middleware for microservices"""
     setup_cors(app, ["http://localhost:3000", "http://localhost:8000"])
-    setup_gzip(app)
+    setup_etags(app)
+    setup_compression(app)
     setup_exception_handlers(app)
+    setup_deadlines(app)
+    setup_events(app)
     app.middleware("http")(log_requests_middleware)
 
 
@@ -0,0 +1,113 @@
+"""
+In-process ("monolith") hosting of the services inside the API gateway
+"""
+from contextlib import AsyncExitStack, asynccontextmanager
+from pathlib import Path
+from typing import Dict
+import importlib.util
+import sys
+
+import httpx
+from fastapi import FastAPI
+
+from .config import settings
+from .hub import EventRelay
+from .revocation import revoked_tokens
+from .upstream import SERVICE_URL_SETTINGS, upstreams
+
+SERVICES_DIR = Path(__file__).resolve().parent.parent / "services"
+
+# Gateway route prefix -> service directory under backend/services
+SERVICE_DIRS = {
+    "colony": "colony-maintenance",
+    "guesthouse": "guesthouse",
+    "equipment": "equipment",
+    "vigilance": "vigilance",
+    "vehicle": "vehicle",
+    "visitor": "visitor",
+    "canteen": "canteen",
+}
+
+# Top-level modules every service resolves from its own directory
+_SERVICE_LOCAL_MODULES = ("models", "schemas")
+
+
+def local_service_names() -> list:
+    """Services configured with mode "local" in SERVICE_MODES"""
+    return [
+        name for name in SERVICE_URL_SETTINGS
+        if settings.SERVICE_MODES.get(name, "remote") == "local"
+    ]
+
+
+def _is_service_local(module_name: str) -> bool:
+    return (
+        module_name in _SERVICE_LOCAL_MODULES
+        or module_name == "shared"
+        or module_name.startswith("shared.")
+    )
+
+
+def load_service_app(name: str) -> FastAPI:
+    """
+    Import a service's main.py and return its FastAPI app.
+
+    Each service resolves `models`, `schemas` and `shared` from its own
+    directory, so those modules are swapped out of sys.modules for the import
+    and the gateway's own copies restored afterwards. The service's auth is
+    then pointed at the gateway's revocation store: its own copy is never
+    started, and a logout at the gateway only reaches the gateway's.
+    """
+    service_dir = SERVICES_DIR / SERVICE_DIRS[name]
+    saved = {key: sys.modules.pop(key) for key in list(sys.modules) if _is_service_local(key)}
+    sys.path.insert(0, str(service_dir))
+    try:
+        spec = importlib.util.spec_from_file_location(
+            f"epos_{name}_service", service_dir / "main.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        service_auth = sys.modules["shared.auth"]
+    finally:
+        sys.path.remove(str(service_dir))
+        for key in list(sys.modules):
+            if _is_service_local(key):
+                del sys.modules[key]
+        sys.modules.update(saved)
+    service_auth.revoked_tokens = revoked_tokens
+    return module.app
+
+
+def mount_local_services(app: FastAPI) -> Dict[str, FastAPI]:
+    """
+    Mount every local-mode service under /api/<service>.
+
+    Call this before the proxy routes are registered so the mounts match
+    first. Mounted services authenticate requests with their own
+    get_current_user, as when they are reached on their own port, but check
+    revocations against the gateway's store.
+    """
+    mounted = {}
+    for name in local_service_names():
+        service_app = load_service_app(name)
+        app.mount(f"/api/{name}", EventRelay(service_app))
+        mounted[name] = service_app
+    return mounted
+
+
+@asynccontextmanager
+async def local_services_lifespan(services: Dict[str, FastAPI]):
+    """
+    Run startup/shutdown for mounted apps, which Starlette does not do for
+    mounts, and point their upstream pools at an in-process ASGI transport so
+    gateway-internal callers skip the network too.
+    """
+    async with AsyncExitStack() as stack:
+        for name, service_app in services.items():
+            upstreams.configure(
+                name,
+                base_url=f"http://{name}.local",
+                transport=httpx.ASGITransport(app=service_app),
+            )
+            await stack.enter_async_context(service_app.router.lifespan_context(service_app))
+        yield
@@ -0,0 +1,78 @@
+"""
+Keyset (cursor) paging for list endpoints.
+
+skip/limit makes the database walk and throw away every row before the
+page, so deep pages of the append-only tables (orders, patrol logs,
+entry/exit logs, ...) get slower as they grow. A cursor names the last row
+of the previous page by its (sort column, id); the next page seeks
+straight past it through the matching composite index, at the same cost
+at any depth.
+
+Cursors are opaque to clients: a full page returns one in the
+X-Next-Cursor header, and passing it back as ?cursor= fetches the page
+after. Requests without a cursor page by skip/limit as before.
+"""
+from datetime import date, datetime
+from typing import Any, Optional, Tuple
+import base64
+import json
+
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    if isinstance(sort_value, (date, datetime)):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_column) -> Tuple[Any, Any]:
+    """(sort value, id) of a cursor from encode_cursor; 400 for anything else"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        python_type = sort_column.type.python_type
+        if python_type is datetime:
+            sort_value = datetime.fromisoformat(sort_value)
+        elif python_type is date:
+            sort_value = date.fromisoformat(sort_value)
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, row_id
+
+
+async def paginate(
+    db: AsyncSession,
+    statement: Select,
+    sort_column,
+    id_column,
+    response: Response,
+    skip: int,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> list:
+    """
+    One page of `statement`, newest `sort_column` first.
+
+    Ties are broken by `id_column`, so the order is total and a cursor
+    never skips or repeats a row. Sets X-Next-Cursor on `response` when
+    the page is full. `skip` is ignored when a cursor is given: the page
+    starts right after the cursor's row.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort_column)
+        statement = statement.where(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+        skip = 0
+    statement = statement.order_by(sort_column.desc(), id_column.desc()).offset(skip).limit(limit)
+    rows = (await db.scalars(statement)).all()
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, sort_column.key), getattr(last, id_column.key)
+        )
+    return rows
@@ -0,0 +1,49 @@
+"""
+Single-flight coalescing of identical concurrent upstream calls
+"""
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time.
+
+    Callers arriving while a call for their key is in flight wait for it and
+    share its result (or exception). The call runs as its own task, so a
+    caller that gives up does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._tasks),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
+
+
+# Identical gateway GETs (same cache key) share one upstream call
+inflight_gets = SingleFlight()
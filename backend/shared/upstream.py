@@ -0,0 +1,585 @@
+"""
+Pooled upstream HTTP clients used by the API gateway to reach the services
+"""
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+import asyncio
+import time
+
+import httpx
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from .auth import IDENTITY_HEADER, sign_identity
+from .breaker import CircuitBreaker, CircuitOpenError
+from .config import settings
+from .deadline import DEADLINE_HEADER, client_budget
+from .cache import WRITE_METHODS, CachedResponse, response_cache
+from .compression import negotiate
+from .pagination import NEXT_CURSOR_HEADER
+from .events import EVENTS_HEADER, decode_events
+from .hub import publish_all
+from .lastgood import last_good
+from .replicas import Replica, choose_replica, probe_replica
+from .singleflight import inflight_gets
+
+# Gateway route prefix -> settings attribute holding the service base URL
+SERVICE_URL_SETTINGS = {
+    "colony": "COLONY_SERVICE_URL",
+    "guesthouse": "GUESTHOUSE_SERVICE_URL",
+    "equipment": "EQUIPMENT_SERVICE_URL",
+    "vigilance": "VIGILANCE_SERVICE_URL",
+    "vehicle": "VEHICLE_SERVICE_URL",
+    "visitor": "VISITOR_SERVICE_URL",
+    "canteen": "CANTEEN_SERVICE_URL",
+}
+
+# Connection-scoped headers that must not be relayed across the proxy hop
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+
+class UpstreamPool:
+    """Long-lived keep-alive client for one upstream service and its replicas"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        timeout: float,
+        connect_timeout: float,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        replicas: Optional[List[str]] = None,
+        socket: Optional[str] = None,
+    ):
+        self.name = name
+        self.socket = socket
+        self.replicas = [Replica(url) for url in replicas or [base_url]]
+        self.base_url = ", ".join(replica.url for replica in self.replicas)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker.from_settings(name) if settings.BREAKER_ENABLED else None
+
+        # Utilisation counters
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self.total_errors = 0
+        self.cancelled = 0
+        self.total_time = 0.0
+
+    def open(self) -> httpx.AsyncClient:
+        """Return the pooled client, creating it on first use"""
+        if self.client is None or self.client.is_closed:
+            transport = self.transport
+            if transport is None and self.socket:
+                # Same host: skip the TCP stack; the URL then only sets the Host header
+                transport = httpx.AsyncHTTPTransport(uds=self.socket, limits=self.limits)
+            # No base_url: each request goes to the replica chosen for it
+            self.client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=transport,
+            )
+        return self.client
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _admit(self) -> None:
+        if self.breaker is not None:
+            self.breaker.before_call()
+
+    def _begin(self) -> Tuple[float, Replica]:
+        replica = choose_replica(self.replicas)
+        replica.outstanding += 1
+        replica.total_requests += 1
+        self.in_flight += 1
+        self.total_requests += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.perf_counter(), replica
+
+    def _record(self, started: float, failed: bool) -> None:
+        if self.breaker is not None:
+            self.breaker.record(failed, time.perf_counter() - started)
+
+    def _abandon(self) -> None:
+        # The caller went away; that says nothing about the upstream's health
+        self.cancelled += 1
+        if self.breaker is not None:
+            self.breaker.abandon()
+
+    def _end(self, started: float, replica: Replica) -> None:
+        replica.outstanding -= 1
+        self.in_flight -= 1
+        self.total_time += time.perf_counter() - started
+
+    async def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        """Send a request through the pooled client"""
+        client = self.open()
+        self._admit()
+        started, replica = self._begin()
+        failed = False
+        cancelled = False
+        try:
+            response = await client.request(method, replica.url + path, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        except httpx.RequestError:
+            failed = True
+            self.total_errors += 1
+            raise
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if cancelled:
+                self._abandon()
+            else:
+                self._record(started, failed)
+            self._end(started, replica)
+
+    async def stream(self, method: str, path: str, **kwargs: Any) -> "UpstreamStream":
+        """Send a request and return the response with its body still unread"""
+        client = self.open()
+        self._admit()
+        started, replica = self._begin()
+        try:
+            request = client.build_request(method, replica.url + path, **kwargs)
+            response = await client.send(request, stream=True)
+        except BaseException as exc:
+            failed = isinstance(exc, httpx.RequestError)
+            if failed:
+                self.total_errors += 1
+            if isinstance(exc, asyncio.CancelledError):
+                self._abandon()
+            else:
+                self._record(started, failed)
+            self._end(started, replica)
+            raise
+        self._record(started, response.status_code >= 500)
+        return UpstreamStream(self, response, started, replica)
+
+    def _connection_counts(self) -> Dict[str, Optional[int]]:
+        # httpx does not expose pool state publicly; read it best-effort from httpcore
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return {"open_connections": None, "idle_connections": None}
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"open_connections": len(connections), "idle_connections": idle}
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool utilisation snapshot"""
+        max_connections = self.limits.max_connections
+        completed = self.total_requests - self.in_flight
+        return {
+            "base_url": self.base_url,
+            "socket": self.socket,
+            "max_connections": max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilisation": round(self.in_flight / max_connections, 3) if max_connections else None,
+            "total_requests": self.total_requests,
+            "total_errors": self.total_errors,
+            "cancelled": self.cancelled,
+            "avg_latency_ms": round(self.total_time / completed * 1000, 2) if completed else 0.0,
+            **self._connection_counts(),
+            "circuit": self.breaker.stats() if self.breaker is not None else None,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+    async def probe(self) -> None:
+        """Probe every replica concurrently"""
+        client = self.open()
+        await asyncio.gather(*(probe_replica(client, replica) for replica in self.replicas))
+
+
+class UpstreamStream:
+    """Open upstream response whose body is relayed chunk by chunk"""
+
+    def __init__(self, pool: UpstreamPool, response: httpx.Response, started: float, replica: Replica):
+        self.pool = pool
+        self.response = response
+        self.started = started
+        self.replica = replica
+        self._closed = False
+
+    async def body(self) -> AsyncIterator[bytes]:
+        """Raw body bytes, still in the upstream content-encoding"""
+        try:
+            async for chunk in self.response.aiter_raw():
+                yield chunk
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        """Release the pooled connection (safe to call more than once)"""
+        if self._closed:
+            return
+        self._closed = True
+        await self.response.aclose()
+        self.pool._end(self.started, self.replica)
+
+
+class UpstreamClients:
+    """Registry of pooled clients, one per upstream service"""
+
+    def __init__(self):
+        self._pools: Dict[str, UpstreamPool] = {}
+        self._prober: Optional[asyncio.Task] = None
+
+    def configure(
+        self,
+        name: str,
+        base_url: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        **overrides: Any,
+    ) -> UpstreamPool:
+        """
+        Build the pool for a service from settings plus any overrides.
+
+        Replicas come from SERVICE_REPLICAS, falling back to the single
+        *_SERVICE_URL. A Unix socket in SERVICE_SOCKETS takes precedence over
+        both. An explicit base_url pins the pool to that one URL.
+        """
+        replicas = None
+        socket = None
+        if base_url is None:
+            base_url = getattr(settings, SERVICE_URL_SETTINGS[name])
+            socket = settings.SERVICE_SOCKETS.get(name) if transport is None else None
+            replicas = None if socket else settings.SERVICE_REPLICAS.get(name)
+        options = {
+            "max_connections": settings.UPSTREAM_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": settings.UPSTREAM_KEEPALIVE_EXPIRY,
+            "timeout": settings.UPSTREAM_TIMEOUT,
+            "connect_timeout": settings.UPSTREAM_CONNECT_TIMEOUT,
+        }
+        options.update(settings.UPSTREAM_OVERRIDES.get(name, {}))
+        options.update(overrides)
+        pool = UpstreamPool(name, base_url, transport=transport, replicas=replicas, socket=socket, **options)
+        self._pools[name] = pool
+        return pool
+
+    def get(self, name: str) -> UpstreamPool:
+        pool = self._pools.get(name)
+        if pool is None:
+            pool = self.configure(name)
+        return pool
+
+    async def start(self) -> None:
+        """Create clients for every service not configured yet and start probing"""
+        for name in SERVICE_URL_SETTINGS:
+            self.get(name).open()
+        if settings.HEALTH_PROBE_INTERVAL > 0 and self._probed_pools():
+            self._prober = asyncio.ensure_future(self._probe_forever())
+
+    def _probed_pools(self) -> List[UpstreamPool]:
+        # With a single replica there is nothing to drain to, so only replica sets are probed
+        return [pool for pool in self._pools.values() if len(pool.replicas) > 1]
+
+    async def _probe_forever(self) -> None:
+        while True:
+            await asyncio.gather(*(pool.probe() for pool in self._probed_pools()))
+            await asyncio.sleep(settings.HEALTH_PROBE_INTERVAL)
+
+    async def aclose(self) -> None:
+        """Stop probing and close all pooled connections"""
+        if self._prober is not None:
+            self._prober.cancel()
+            try:
+                await self._prober
+            except asyncio.CancelledError:
+                pass
+            self._prober = None
+        for pool in self._pools.values():
+            await pool.close()
+        self._pools.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+    def circuit_states(self) -> Dict[str, str]:
+        return {
+            name: pool.breaker.state
+            for name, pool in self._pools.items()
+            if pool.breaker is not None
+        }
+
+
+upstreams = UpstreamClients()
+
+
+def _forward_headers(
+    request: Request, current_user: Optional[dict] = None, relay_encoding: bool = False
+) -> Dict[str, str]:
+    """
+    Headers for the upstream call.
+
+    With relay_encoding the client's Accept-Encoding goes along, and the body
+    comes back already compressed by the service for the gateway to pass on
+    untouched. Otherwise the gateway reads the body itself, so it asks for
+    identity: compressing it in the service only to decompress it here is
+    wasted CPU on both sides.
+    """
+    headers = {
+        key: value
+        for key, value in request.headers.items()
+        if key not in HOP_BY_HOP_HEADERS and key not in ("host", IDENTITY_HEADER)
+    }
+    # Services trust this instead of decoding the bearer token again
+    if current_user is not None:
+        headers[IDENTITY_HEADER] = sign_identity(current_user)
+    # Without this httpx would advertise its own encodings and a streamed body
+    # could come back compressed for a client that never asked for it
+    if not relay_encoding:
+        headers["accept-encoding"] = "identity"
+    headers.setdefault("accept-encoding", "identity")
+    return headers
+
+
+def _identity(headers: Dict[str, str]) -> Dict[str, str]:
+    """The same headers, asking for an unencoded body the gateway will read"""
+    return {**headers, "accept-encoding": "identity"}
+
+
+def _has_body(request: Request) -> bool:
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        return content_length != "0"
+    return "transfer-encoding" in request.headers
+
+
+def _response_headers(response: httpx.Response) -> Dict[str, str]:
+    return {
+        key: value
+        for key, value in response.headers.items()
+        if key not in HOP_BY_HOP_HEADERS and key != EVENTS_HEADER
+    }
+
+
+async def _publish_events(request: Request, response: httpx.Response) -> None:
+    """Hand the change events a successful write raised to the event hub"""
+    raw = response.headers.get(EVENTS_HEADER)
+    if raw and request.method in WRITE_METHODS and response.status_code < 400:
+        await publish_all(decode_events(raw))
+
+
+async def _buffered_proxy(
+    request: Request,
+    pool: UpstreamPool,
+    path: str,
+    headers: Dict[str, str],
+    timeout: httpx.Timeout,
+):
+    response = await pool.request(
+        method=request.method,
+        path=path,
+        headers=_identity(headers),
+        content=await request.body(),
+        params=request.query_params,
+        timeout=timeout,
+    )
+    await _publish_events(request, response)
+    # The same headers the streaming path relays (ETag, X-Next-Cursor, ...),
+    # less those describing the encoded body httpx has already decoded
+    relayed = {
+        key: value
+        for key, value in _response_headers(response).items()
+        if key not in ("content-encoding", "content-length")
+    }
+    # Bytes as the service sent them; the gateway's middleware compresses once
+    return Response(
+        content=response.content,
+        status_code=response.status_code,
+        media_type=response.headers.get("content-type") or "text/plain",
+        headers=relayed,
+    )
+
+
+async def _streaming_proxy(
+    request: Request,
+    pool: UpstreamPool,
+    path: str,
+    headers: Dict[str, str],
+    timeout: httpx.Timeout,
+):
+    upstream = await pool.stream(
+        method=request.method,
+        path=path,
+        headers=headers,
+        content=request.stream() if _has_body(request) else None,
+        params=request.query_params,
+        timeout=timeout,
+    )
+    await _publish_events(request, upstream.response)
+    # The background task covers a client that disconnects before the body is drained
+    return StreamingResponse(
+        upstream.body(),
+        status_code=upstream.response.status_code,
+        headers=_response_headers(upstream.response),
+        background=BackgroundTask(upstream.aclose),
+    )
+
+
+async def _cached_proxy(
+    request: Request,
+    pool: UpstreamPool,
+    path: str,
+    headers: Dict[str, str],
+    timeout: httpx.Timeout,
+    rule: Dict[str, Any],
+    current_user: Optional[dict],
+):
+    user_id = None
+    if rule.get("per_user"):
+        user_id = (current_user or {}).get("id")
+        if user_id is None:
+            return await _buffered_proxy(request, pool, path, headers, timeout)
+
+    key = response_cache.key(pool.name, path, request.query_params.multi_items(), user_id)
+    encoding = negotiate(request.headers.get("accept-encoding", "")) if settings.COMPRESSION_ENABLED else None
+    variant = response_cache.variant(key, encoding)
+    if_none_match = request.headers.get("if-none-match")
+    cached = await response_cache.get(variant)
+    if cached is not None:
+        return cached.to_response("HIT", if_none_match)
+
+    # Concurrent misses for the same key share one upstream call. The body is
+    # fetched unencoded and compressed once per encoding, then cached as is;
+    # the full body is needed for the cache, so the client's validator stays here.
+    headers = {key: value for key, value in _identity(headers).items() if key != "if-none-match"}
+    # Read by whichever caller starts the upstream call; callers that join it
+    # leave it None and do not store, as the response may predate their view
+    generation = None
+
+    async def fetch():
+        nonlocal generation
+        generation = await response_cache.generation(pool.name)
+        return await pool.request(
+            method="GET", path=path, headers=headers, params=request.query_params, timeout=timeout
+        )
+
+    response = await inflight_gets.do(key, fetch)
+    media_type = response.headers.get("content-type", "text/plain")
+    if response.status_code != 200:
+        return Response(content=response.content, status_code=response.status_code, media_type=media_type)
+
+    entry = CachedResponse(
+        response.content,
+        media_type,
+        etag=response.headers.get("etag"),
+        next_cursor=response.headers.get(NEXT_CURSOR_HEADER),
+    ).encoded(encoding)
+    await response_cache.set(variant, pool.name, entry, rule["ttl"], generation)
+    return entry.to_response("MISS", if_none_match)
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the upstream answered"""
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _unless_disconnected(request: Request, awaitable: Awaitable) -> Any:
+    """Await an upstream call, cancelling it if the client disconnects first"""
+    call = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({call, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        call.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if call in done:
+        return call.result()
+    call.cancel()
+    raise ClientDisconnected()
+
+
+async def _dispatch(
+    request: Request,
+    pool: UpstreamPool,
+    path: str,
+    headers: Dict[str, str],
+    timeout: httpx.Timeout,
+    current_user: Optional[dict],
+):
+    if request.method == "GET":
+        rule = response_cache.rule_for(pool.name, path)
+        if rule is not None:
+            return await _cached_proxy(request, pool, path, headers, timeout, rule, current_user)
+
+    if settings.PROXY_STREAMING:
+        return await _streaming_proxy(request, pool, path, headers, timeout)
+    return await _buffered_proxy(request, pool, path, headers, timeout)
+
+
+async def proxy_request(request: Request, service: str, path: str, current_user: Optional[dict] = None):
+    """Proxy request to microservice"""
+    pool = upstreams.get(service)
+    headers = _forward_headers(request, current_user, relay_encoding=True)
+
+    # Never wait longer than the client will, and tell the service how long that is
+    budget = client_budget(request, pool.timeout.read)
+    headers[DEADLINE_HEADER] = str(int(budget * 1000))
+    timeout = httpx.Timeout(budget, connect=min(pool.timeout.connect, budget))
+
+    try:
+        dispatch = _dispatch(request, pool, path, headers, timeout, current_user)
+        if request.method in ("GET", "HEAD"):
+            # Reads nobody will see are cancelled; writes always run to completion
+            response = await _unless_disconnected(request, dispatch)
+        else:
+            response = await dispatch
+
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            await response_cache.invalidate(service)
+            last_good.mark_due(service)
+        return response
+    except ClientDisconnected:
+        # Nothing reaches the client; the status is only for the access log
+        return Response(status_code=499)
+    except CircuitOpenError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{exc}; failing fast",
+            headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+        )
+    except httpx.TimeoutException:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Upstream service at {pool.base_url} did not answer within {budget:g}s"
+        )
+    except httpx.RequestError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Upstream service unavailable at {pool.base_url}. Error: {exc}"
+        )
@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import uuid
 import importlib.util
 from pathlib import Path
@@ -98,6 +99,37 @@ def test_canteen():
         _assert_status(response, label="canteen update worker")
 
 
+def test_document_numbers_continue_from_issued_numbers():
+    app = _load_app("canteen")
+    with _make_client(app) as client:
+        from sqlalchemy import text
+        from shared.database import engine
+        from shared.sequences import seed_document_counters
+
+        def create_worker():
+            response = client.post("/workers", json={
+                "full_name": "Numbered Worker",
+                "employee_id": f"EMP-{uuid.uuid4().hex[:8]}",
+                "worker_type": "permanent",
+            })
+            _assert_status(response, label="canteen create worker")
+            return response.json()
+
+        year = datetime.now().year
+        first, second = create_worker(), create_worker()
+        assert first["worker_number"] != second["worker_number"]
+        assert first["worker_number"].startswith(f"W{year}")
+
+        # A number issued before the counters existed (count()+1, an import)
+        with engine.begin() as conn:
+            conn.execute(
+                text("UPDATE workers SET worker_number = :number WHERE id = :id"),
+                {"number": f"W{year}900041", "id": second["id"]},
+            )
+        seed_document_counters()
+        assert create_worker()["worker_number"] == f"W{year}900042"
+
+
 def test_colony_maintenance():
     app = _load_app("colony-maintenance")
     with _make_client(app) as client:
@@ -167,9 +199,14 @@ def test_guesthouse():
 
         response = client.get("/rooms")
         _assert_status(response, label="guesthouse list rooms")
+        list_etag = response.headers["etag"]
+        response = client.get("/rooms", headers={"If-None-Match": list_etag})
+        _assert_status(response, 304, label="guesthouse list rooms unchanged")
 
         response = client.get(f"/rooms/{room_id}")
         _assert_status(response, label="guesthouse get room")
+        room_etag = response.headers["etag"]
+        assert room_etag.startswith('W/"') and room_etag != list_etag
 
         response = client.put(
             f"/rooms/{room_id}",
@@ -177,6 +214,57 @@ def test_guesthouse():
         )
         _assert_status(response, label="guesthouse update room")
 
+        response = client.get(f"/rooms/{room_id}", headers={"If-None-Match": room_etag})
+        _assert_status(response, label="guesthouse get changed room")
+        assert response.json()["capacity"] == 2
+
+        # Routes without a row version fall back to a body hash
+        response = client.get("/bookings")
+        _assert_status(response, label="guesthouse list bookings")
+        response = client.get("/bookings", headers={"If-None-Match": response.headers["etag"]})
+        _assert_status(response, 304, label="guesthouse list bookings unchanged")
+
+
+def test_expired_deadline_fails_list_reads():
+    import asyncio
+
+    app = _load_app("guesthouse")
+    from shared.database import get_db
+    from shared.deadline import DEADLINE_HEADER
+
+    async def _slow_db():
+        # Outlive the request's 10 ms deadline before the handler's first query
+        await asyncio.sleep(0.05)
+        async for session in get_db():
+            yield session
+
+    with _make_client(app) as client:
+        app.dependency_overrides[get_db] = _slow_db
+        for path in ("/rooms", "/bookings", "/dashboard/stats"):
+            response = client.get(path, headers={DEADLINE_HEADER: "10"})
+            _assert_status(response, expected=504, label=f"guesthouse {path} past deadline")
+        del app.dependency_overrides[get_db]
+        _assert_status(client.get("/rooms", headers={DEADLINE_HEADER: "5000"}), label="guesthouse rooms in time")
+
+
+def test_room_list_validator_failure_is_an_error():
+    app = _load_app("guesthouse")
+    from sqlalchemy import text
+    from shared.auth import get_current_user
+    from shared.database import engine
+
+    app.dependency_overrides[get_current_user] = _fake_user
+    with TestClient(app, raise_server_exceptions=False) as client:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE guesthouse_rooms RENAME TO guesthouse_rooms_hidden"))
+        try:
+            response = client.get("/rooms")
+        finally:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE guesthouse_rooms_hidden RENAME TO guesthouse_rooms"))
+        _assert_status(response, expected=500, label="guesthouse rooms validator failure")
+        assert "etag" not in response.headers
+
 
 def test_visitor():
     app = _load_app("visitor")
@@ -239,6 +327,75 @@ def test_vigilance():
         )
         _assert_status(response, label="vigilance update roster")
 
+        response = client.post("/sos", json={"guard_id": payload["guard_id"], "guard_name": "Guard Alpha"})
+        _assert_status(response, label="vigilance raise sos")
+        events = json.loads(response.headers["x-epos-events"])
+        assert [(event["topic"], event["action"]) for event in events] == [("vigilance.sos", "created")]
+        assert events[0]["data"]["id"] == response.json()["id"]
+
+
+def test_cursor_paging_walks_every_row_once():
+    app = _load_app("vigilance")
+    with _make_client(app) as client:
+        from sqlalchemy import text
+        from shared.database import engine
+
+        for _ in range(5):
+            response = client.post("/sos", json={"guard_id": str(uuid.uuid4()), "guard_name": "Guard Beta"})
+            _assert_status(response, label="vigilance raise sos")
+        # Equal sort values: the order between them comes from the id
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE sos_alerts SET alert_time = '2026-01-01 08:00:00.000000'"))
+
+        expected = [alert["id"] for alert in client.get("/sos").json()]
+        walked, cursor = [], None
+        while True:
+            response = client.get("/sos", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+            _assert_status(response, label="vigilance sos page")
+            walked += [alert["id"] for alert in response.json()]
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                break
+        assert walked == expected
+        assert client.get("/sos", params={"limit": 2, "skip": 2}).json() == client.get("/sos").json()[2:4]
+
+        # skip does not apply on top of a cursor
+        cursor = client.get("/sos", params={"limit": 2}).headers["x-next-cursor"]
+        response = client.get("/sos", params={"limit": 2, "skip": 2, "cursor": cursor})
+        _assert_status(response, label="vigilance sos cursor and skip")
+        assert [alert["id"] for alert in response.json()] == expected[2:4]
+
+        response = client.get("/sos", params={"cursor": "not-a-cursor"})
+        _assert_status(response, expected=400, label="vigilance sos bad cursor")
+
+
+def test_dashboard_stats_count_in_one_query():
+    app = _load_app("vigilance")
+    with _make_client(app) as client:
+        from sqlalchemy import event
+        from shared.database import async_engine
+
+        before = client.get("/dashboard/stats").json()
+        response = client.post("/sos", json={"guard_id": str(uuid.uuid4()), "guard_name": "Guard Gamma"})
+        _assert_status(response, label="vigilance raise sos")
+
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            response = client.get("/dashboard/stats")
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+        _assert_status(response, label="vigilance dashboard stats")
+        after = response.json()
+        assert len(statements) == 1, statements
+        assert after["sos_alerts_active"] == before["sos_alerts_active"] + 1
+        assert after["sos_alerts_today"] == before["sos_alerts_today"] + 1
+        assert after["total_guards"] == before["total_guards"]
+
 
 def test_vehicle():
     app = _load_app("vehicle")
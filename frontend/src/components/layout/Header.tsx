@@ -22,6 +22,7 @@ import {
 } from '@mui/icons-material'
 import { useState } from 'react'
 import { logout } from '../../store/slices/authSlice'
+import { authService } from '../../services/authService'
 import { RootState } from '../../store'
 
 interface HeaderProps {
@@ -47,6 +48,8 @@ export default function Header({ drawerWidth, sidebarOpen, onToggle }: HeaderPro
   }
 
   const handleLogout = () => {
+    // Revoke the tokens server-side; the local session ends either way
+    authService.logout().catch(() => undefined)
     dispatch(logout())
     navigate('/login')
   }
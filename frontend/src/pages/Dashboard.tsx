@@ -1,4 +1,4 @@
-import { useState } from 'react'
+import { useEffect, useState } from 'react'
 import {
   Box,
   Grid,
@@ -24,17 +24,15 @@ import {
   CheckCircle,
   Warning,
 } from '@mui/icons-material'
-import { useQueries } from '@tanstack/react-query'
-import { colonyService } from '../services/colonyService'
-import guesthouseService from '../services/guesthouseService'
-import vehicleService from '../services/vehicleService'
-import visitorService from '../services/visitorService'
-import equipmentService from '../services/equipmentService'
-import vigilanceService from '../services/vigilanceService'
-import canteenService from '../services/canteenService'
+import { useQuery, useQueryClient } from '@tanstack/react-query'
+import dashboardService, { DashboardSummary } from '../services/dashboardService'
+import eventsService from '../services/eventsService'
 import { useSelector } from 'react-redux'
 import { RootState } from '../store'
 
+// Summary refresh where no change stream is available
+const SUMMARY_POLL_MS = 30000
+
 // Stat Card Component
 const StatCard = ({ title, value, icon, color }: any) => (
   <Card
@@ -85,25 +83,50 @@ export default function Dashboard() {
   const [activitiesPage, setActivitiesPage] = useState(0)
   const [activitiesRowsPerPage, setActivitiesRowsPerPage] = useState(5)
   const [activeTab, setActiveTab] = useState(0)
-  const [
-    colonyQuery,
-    guestQuery,
-    equipmentQuery,
-    vigilanceQuery,
-    vehicleQuery,
-    visitorQuery,
-    canteenQuery,
-  ] = useQueries({
-    queries: [
-      { queryKey: ['dashboard-colony'], queryFn: colonyService.getDashboardStats, enabled: !!user, refetchOnMount: 'always', refetchOnWindowFocus: true, staleTime: 0 },
-      { queryKey: ['dashboard-guesthouse'], queryFn: guesthouseService.getDashboardStats, enabled: !!user, refetchOnMount: 'always', refetchOnWindowFocus: true, staleTime: 0 },
-      { queryKey: ['dashboard-equipment'], queryFn: equipmentService.getDashboardStats, enabled: !!user, refetchOnMount: 'always', refetchOnWindowFocus: true, staleTime: 0 },
-      { queryKey: ['dashboard-vigilance'], queryFn: vigilanceService.getDashboardStats, enabled: !!user, refetchOnMount: 'always', refetchOnWindowFocus: true, staleTime: 0 },
-      { queryKey: ['dashboard-vehicle'], queryFn: vehicleService.getDashboardStats, enabled: !!user, refetchOnMount: 'always', refetchOnWindowFocus: true, staleTime: 0 },
-      { queryKey: ['dashboard-visitor'], queryFn: visitorService.getDashboardStats, enabled: !!user, refetchOnMount: 'always', refetchOnWindowFocus: true, staleTime: 0 },
-      { queryKey: ['dashboard-canteen'], queryFn: canteenService.getDashboardStats, enabled: !!user, refetchOnMount: 'always', refetchOnWindowFocus: true, staleTime: 0 },
-    ],
-  }) as const
+  const [streamUnavailable, setStreamUnavailable] = useState(false)
+  // Poll on a timer and on focus unless the gateway pushes change events
+  const polling = (data?: DashboardSummary) => streamUnavailable || !data?.live_events
+  // All seven services' stats arrive in a single gateway round trip
+  const summaryQuery = useQuery({
+    queryKey: ['dashboard-summary'],
+    queryFn: dashboardService.getSummary,
+    enabled: !!user,
+    refetchOnMount: 'always',
+    refetchOnWindowFocus: (query) => polling(query.state.data),
+    refetchInterval: (query) => (polling(query.state.data) ? SUMMARY_POLL_MS : false),
+    staleTime: 0,
+  })
+  const liveEvents = summaryQuery.data?.live_events === true && !streamUnavailable
+  // Refetch when something actually changes instead of on a timer or focus
+  const queryClient = useQueryClient()
+  useEffect(() => {
+    if (!user || !liveEvents) return undefined
+    let pending: ReturnType<typeof setTimeout> | null = null
+    const unsubscribe = eventsService.subscribe(
+      ['canteen.orders', 'vigilance.sos', 'visitor.gate', 'guesthouse.rooms'],
+      () => {
+        // A burst of changes costs one summary fetch
+        if (pending) return
+        pending = setTimeout(() => {
+          pending = null
+          queryClient.invalidateQueries({ queryKey: ['dashboard-summary'] })
+        }, 500)
+      },
+      () => setStreamUnavailable(true)
+    )
+    return () => {
+      unsubscribe()
+      if (pending) clearTimeout(pending)
+    }
+  }, [user, liveEvents, queryClient])
+  const summary = summaryQuery.data?.services
+  const colonyQuery = { data: summary?.colony?.data }
+  const guestQuery = { data: summary?.guesthouse?.data }
+  const equipmentQuery = { data: summary?.equipment?.data }
+  const vigilanceQuery = { data: summary?.vigilance?.data }
+  const vehicleQuery = { data: summary?.vehicle?.data }
+  const visitorQuery = { data: summary?.visitor?.data }
+  const canteenQuery = { data: summary?.canteen?.data }
 
   const recentActivities = [
     {
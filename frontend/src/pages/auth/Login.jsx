@@ -51,6 +51,7 @@ export default function Login() {
         setCredentials({
           user: response.user,
           token: response.access_token,
+          refreshToken: response.refresh_token,
         })
       )
 
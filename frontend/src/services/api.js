@@ -1,6 +1,6 @@
 import axios from 'axios'
 import { toast } from 'react-toastify'
-import { API_BASE_URL, readToken, clearAuth } from './storage'
+import { API_BASE_URL, readToken, readRefreshToken, writeAuth, clearAuth } from './storage'
 
 // Create axios instance
 const axiosInstance = axios.create({
@@ -8,6 +8,8 @@ const axiosInstance = axios.create({
   timeout: 30000,
   headers: {
     'Content-Type': 'application/json',
+    // Lets the gateway and services drop work once we have stopped waiting
+    'X-Request-Timeout': '30',
   },
 })
 
@@ -25,12 +27,47 @@ axiosInstance.interceptors.request.use(
   }
 )
 
+// One refresh at a time; concurrent 401s wait for the same attempt
+let refreshing = null
+
+export const refreshSession = () => {
+  if (!refreshing) {
+    const refreshToken = readRefreshToken()
+    refreshing = (
+      refreshToken
+        ? axios
+            .post(`${API_BASE_URL}/api/auth/refresh`, { refresh_token: refreshToken })
+            .then(({ data }) => {
+              writeAuth(data.user, data.access_token, data.refresh_token)
+              return data.access_token
+            })
+            .catch(() => null)
+        : Promise.resolve(null)
+    ).finally(() => {
+      refreshing = null
+    })
+  }
+  return refreshing
+}
+
 // Response interceptor
 axiosInstance.interceptors.response.use(
   (response) => {
     return response
   },
-  (error) => {
+  async (error) => {
+    // Expired access token: swap the refresh token for a new pair and retry once
+    const original = error.config
+    const isAuthRequest = /\/auth\/(login|refresh|logout)/.test(original?.url || '')
+    if (error.response?.status === 401 && original && !original._retried && !isAuthRequest) {
+      const token = await refreshSession()
+      if (token) {
+        original._retried = true
+        original.headers.Authorization = `Bearer ${token}`
+        return axiosInstance(original)
+      }
+    }
+
     if (error.response) {
       const { status, data } = error.response
 
@@ -1,4 +1,5 @@
 import axiosInstance from './api'
+import { readRefreshToken } from './storage'
 
 export const authService = {
   login: async (credentials) => {
@@ -24,7 +25,9 @@ export const authService = {
   },
 
   logout: async () => {
-    const response = await axiosInstance.post('/api/auth/logout')
+    const response = await axiosInstance.post('/api/auth/logout', {
+      refresh_token: readRefreshToken(),
+    })
     return response.data
   },
 }
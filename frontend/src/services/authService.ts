@@ -1,4 +1,5 @@
 import axiosInstance from './api'
+import { readRefreshToken } from './storage'
 
 export interface LoginRequest {
   username: string
@@ -7,6 +8,7 @@ export interface LoginRequest {
 
 export interface LoginResponse {
   access_token: string
+  refresh_token?: string
   token_type: string
   user: {
     id: string
@@ -43,7 +45,9 @@ export const authService = {
   },
 
   logout: async () => {
-    const response = await axiosInstance.post('/api/auth/logout')
+    const response = await axiosInstance.post('/api/auth/logout', {
+      refresh_token: readRefreshToken(),
+    })
     return response.data
   },
 }
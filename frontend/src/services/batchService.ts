@@ -0,0 +1,70 @@
+import api from './api'
+
+// Matches BATCH_MAX_ITEMS on the gateway
+const MAX_ITEMS = 20
+
+interface BatchResult {
+  id: string
+  status: number
+  elapsed_ms: number
+  headers?: Record<string, string>
+  body: any
+}
+
+interface PendingGet {
+  path: string
+  query: Record<string, any>
+  resolve: (response: { data: any; status: number }) => void
+  reject: (error: unknown) => void
+}
+
+let queue: PendingGet[] = []
+let scheduled = false
+
+const send = async (items: PendingGet[]) => {
+  if (items.length === 1) {
+    const [item] = items
+    api.get(item.path, { params: item.query }).then(item.resolve, item.reject)
+    return
+  }
+  try {
+    const { data } = await api.post('/api/batch', {
+      requests: items.map((item, index) => ({ id: String(index), method: 'GET', path: item.path, query: item.query })),
+    })
+    ;(data.responses as BatchResult[]).forEach((result, index) => {
+      const item = items[index]
+      if (result.status < 400) {
+        item.resolve({ data: result.body, status: result.status })
+      } else {
+        const error = new Error(`GET ${item.path} failed with ${result.status}`)
+        item.reject(Object.assign(error, { response: { status: result.status, data: result.body } }))
+      }
+    })
+  } catch (error) {
+    items.forEach((item) => item.reject(error))
+  }
+}
+
+const flush = () => {
+  const items = queue
+  queue = []
+  scheduled = false
+  for (let start = 0; start < items.length; start += MAX_ITEMS) {
+    send(items.slice(start, start + MAX_ITEMS))
+  }
+}
+
+const batchService = {
+  // GETs issued in the same tick, such as a page's initial queries, share one
+  // /api/batch round trip; resolves like api.get with { data }
+  get: (path: string, config: { params?: Record<string, any> } = {}) =>
+    new Promise<{ data: any; status: number }>((resolve, reject) => {
+      queue.push({ path, query: config.params ?? {}, resolve, reject })
+      if (!scheduled) {
+        scheduled = true
+        setTimeout(flush, 0)
+      }
+    }),
+}
+
+export default batchService
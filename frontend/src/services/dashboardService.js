@@ -0,0 +1,11 @@
+import api from './api'
+
+const dashboardService = {
+  // One round trip for every service's dashboard stats
+  getSummary: async () => {
+    const { data } = await api.get('/api/dashboard/summary')
+    return data
+  },
+}
+
+export default dashboardService
@@ -0,0 +1,39 @@
+import api from './api'
+
+export type ServiceName =
+  | 'colony'
+  | 'guesthouse'
+  | 'equipment'
+  | 'vigilance'
+  | 'vehicle'
+  | 'visitor'
+  | 'canteen'
+
+export type ServiceSummaryStatus = 'ok' | 'error' | 'timeout' | 'unavailable'
+
+export interface ServiceSummary {
+  status: ServiceSummaryStatus
+  status_code?: number
+  elapsed_ms: number
+  deadline_ms: number
+  data?: Record<string, any>
+  detail?: string
+}
+
+export interface DashboardSummary {
+  services: Record<ServiceName, ServiceSummary>
+  complete: boolean
+  elapsed_ms: number
+  // false where the gateway serves no /api/events, e.g. on Vercel
+  live_events: boolean
+}
+
+const dashboardService = {
+  // One round trip for every service's dashboard stats
+  getSummary: async (): Promise<DashboardSummary> => {
+    const { data } = await api.get('/api/dashboard/summary')
+    return data
+  },
+}
+
+export default dashboardService
@@ -0,0 +1,104 @@
+import { refreshSession } from './api'
+import { API_BASE_URL, readToken } from './storage'
+
+export type EventTopic = 'canteen.orders' | 'vigilance.sos' | 'visitor.gate' | 'guesthouse.rooms'
+
+export interface LiveEvent {
+  id: number
+  topic: EventTopic | 'resync'
+  action: string
+  data: Record<string, any>
+}
+
+// Reconnects back off up to this after repeated failures
+const MAX_RETRY_MS = 60000
+
+// fetch instead of EventSource so the bearer token travels in a header, not the URL
+const eventsService = {
+  // onUnavailable: no stream on this gateway, or no session to renew; poll instead
+  subscribe: (
+    topics: EventTopic[],
+    onEvent: (event: LiveEvent) => void,
+    onUnavailable: () => void
+  ) => {
+    const controller = new AbortController()
+    let lastEventId: string | null = null
+    let retryMs = 3000
+    let failures = 0
+
+    const dispatch = (frame: string) => {
+      let id: string | null = null
+      let name = 'message'
+      let data = ''
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('id: ')) id = line.slice(4)
+        else if (line.startsWith('event: ')) name = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+        else if (line.startsWith('retry: ')) retryMs = Number(line.slice(7)) || retryMs
+      }
+      if (id) lastEventId = id
+      if (name === 'resync') {
+        onEvent({ id: Number(lastEventId ?? 0), topic: 'resync', action: 'resync', data: {} })
+      } else if (data) {
+        onEvent({ id: Number(id ?? 0), ...JSON.parse(data) })
+      }
+    }
+
+    const connect = async () => {
+      let refreshed = false
+      while (!controller.signal.aborted) {
+        try {
+          const headers: Record<string, string> = { Accept: 'text/event-stream' }
+          const token = readToken()
+          if (token) headers.Authorization = `Bearer ${token}`
+          if (lastEventId) headers['Last-Event-ID'] = lastEventId
+          const response = await fetch(
+            `${API_BASE_URL}/api/events?topics=${encodeURIComponent(topics.join(','))}`,
+            { headers, signal: controller.signal }
+          )
+          if (response.status === 404) {
+            onUnavailable()
+            return
+          }
+          if (response.status === 401) {
+            // Expired access token: renew it once, as api does, rather than resend it
+            if (!refreshed && (await refreshSession())) {
+              refreshed = true
+              continue
+            }
+            onUnavailable()
+            return
+          }
+          if (!response.ok || !response.body) throw new Error(`event stream ${response.status}`)
+          failures = 0
+          refreshed = false
+          const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+          let buffer = ''
+          for (;;) {
+            const { value, done } = await reader.read()
+            if (done) break
+            buffer += value
+            let boundary = buffer.indexOf('\n\n')
+            while (boundary >= 0) {
+              dispatch(buffer.slice(0, boundary))
+              buffer = buffer.slice(boundary + 2)
+              boundary = buffer.indexOf('\n\n')
+            }
+          }
+        } catch {
+          failures += 1
+        }
+        if (!controller.signal.aborted) {
+          // The server's retry after a clean close, doubling with each failure in a row
+          const delay = Math.min(retryMs * 2 ** Math.max(failures - 1, 0), MAX_RETRY_MS)
+          await new Promise((resolve) => setTimeout(resolve, delay))
+        }
+      }
+    }
+
+    connect()
+    return () => controller.abort()
+  },
+}
+
+export default eventsService
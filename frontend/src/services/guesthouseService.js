@@ -1,10 +1,11 @@
 import api from './api'
+import batchService from './batchService'
 
 const guesthouseService = {
   // Rooms
   getRooms: async (status) => {
     const params = status ? { status } : {}
-    const response = await api.get('/api/guesthouse/rooms', { params })
+    const response = await batchService.get('/api/guesthouse/rooms', { params })
     return response.data
   },
 
@@ -16,7 +17,7 @@ const guesthouseService = {
   // Bookings
   getBookings: async (status) => {
     const params = status ? { status } : {}
-    const response = await api.get('/api/guesthouse/bookings', { params })
+    const response = await batchService.get('/api/guesthouse/bookings', { params })
     return response.data
   },
 
@@ -53,7 +54,7 @@ const guesthouseService = {
 
   // Dashboard
   getDashboardStats: async () => {
-    const response = await api.get('/api/guesthouse/dashboard/stats')
+    const response = await batchService.get('/api/guesthouse/dashboard/stats')
     return response.data
   },
 }
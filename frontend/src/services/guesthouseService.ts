@@ -1,4 +1,5 @@
 import api from './api';
+import batchService from './batchService';
 
 export interface Room {
   id: string;
@@ -83,7 +84,7 @@ const guesthouseService = {
   // Rooms
   getRooms: async (status?: string): Promise<Room[]> => {
     const params = status ? { status } : {};
-    const response = await api.get('/api/guesthouse/rooms', { params });
+    const response = await batchService.get('/api/guesthouse/rooms', { params });
     return response.data;
   },
 
@@ -95,7 +96,7 @@ const guesthouseService = {
   // Bookings
   getBookings: async (status?: string): Promise<Booking[]> => {
     const params = status ? { status } : {};
-    const response = await api.get('/api/guesthouse/bookings', { params });
+    const response = await batchService.get('/api/guesthouse/bookings', { params });
     return response.data;
   },
 
@@ -132,7 +133,7 @@ const guesthouseService = {
 
   // Dashboard
   getDashboardStats: async (): Promise<DashboardStats> => {
-    const response = await api.get('/api/guesthouse/dashboard/stats');
+    const response = await batchService.get('/api/guesthouse/dashboard/stats');
     return response.data;
   },
 };
@@ -10,6 +10,7 @@ export const API_BASE_URL = isVercel
 const STORAGE_PREFIX = `epos:${API_BASE_URL}`
 export const TOKEN_KEY = `${STORAGE_PREFIX}:token`
 export const USER_KEY = `${STORAGE_PREFIX}:user`
+export const REFRESH_TOKEN_KEY = `${STORAGE_PREFIX}:refresh`
 
 export const readToken = () => {
   if (!hasStorage) return null
@@ -20,6 +21,15 @@ export const readToken = () => {
   }
 }
 
+export const readRefreshToken = () => {
+  if (!hasStorage) return null
+  try {
+    return localStorage.getItem(REFRESH_TOKEN_KEY)
+  } catch {
+    return null
+  }
+}
+
 const parseJwt = (token: string) => {
   try {
     const payload = token.split('.')[1]
@@ -67,11 +77,14 @@ export const readUser = <T>() => {
   }
 }
 
-export const writeAuth = (user: unknown, token: string) => {
+export const writeAuth = (user: unknown, token: string, refreshToken?: string | null) => {
   if (!hasStorage) return
   try {
     localStorage.setItem(TOKEN_KEY, token)
     localStorage.setItem(USER_KEY, JSON.stringify(user))
+    if (refreshToken) {
+      localStorage.setItem(REFRESH_TOKEN_KEY, refreshToken)
+    }
   } catch {
     // ignore
   }
@@ -82,6 +95,7 @@ export const clearAuth = () => {
   try {
     localStorage.removeItem(TOKEN_KEY)
     localStorage.removeItem(USER_KEY)
+    localStorage.removeItem(REFRESH_TOKEN_KEY)
   } catch {
     // ignore
   }
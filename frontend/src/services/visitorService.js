@@ -1,10 +1,11 @@
 import api from './api'
+import batchService from './batchService'
 
 const visitorService = {
   // Visitor Requests
   getRequests: async (status) => {
     const params = status ? { status } : {}
-    const response = await api.get('/api/visitor/requests', { params })
+    const response = await batchService.get('/api/visitor/requests', { params })
     return response.data
   },
 
@@ -87,7 +88,7 @@ const visitorService = {
 
   // Dashboard
   getDashboardStats: async () => {
-    const response = await api.get('/api/visitor/dashboard/stats')
+    const response = await batchService.get('/api/visitor/dashboard/stats')
     const data = response.data || {}
 
     return {
@@ -104,7 +105,7 @@ const visitorService = {
 
   // Active Visitors
   getActiveVisitors: async () => {
-    const response = await api.get('/api/visitor/active')
+    const response = await batchService.get('/api/visitor/active')
     return response.data
   },
 }
@@ -1,4 +1,5 @@
 import api from './api';
+import batchService from './batchService';
 
 export interface VisitorRequest {
   id: string;
@@ -96,7 +97,7 @@ const visitorService = {
   // Visitor Requests
   getRequests: async (status?: string): Promise<VisitorRequest[]> => {
     const params = status ? { status } : {};
-    const response = await api.get('/api/visitor/requests', { params });
+    const response = await batchService.get('/api/visitor/requests', { params });
     return response.data;
   },
 
@@ -179,7 +180,7 @@ const visitorService = {
 
   // Dashboard
   getDashboardStats: async (): Promise<DashboardStats> => {
-    const response = await api.get('/api/visitor/dashboard/stats');
+    const response = await batchService.get('/api/visitor/dashboard/stats');
     const data: RawDashboardStats = response.data || {};
 
     return {
@@ -196,7 +197,7 @@ const visitorService = {
 
   // Active Visitors
   getActiveVisitors: async () => {
-    const response = await api.get('/api/visitor/active');
+    const response = await batchService.get('/api/visitor/active');
     return response.data;
   },
 };
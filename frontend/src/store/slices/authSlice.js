@@ -1,10 +1,12 @@
 import { createSlice } from '@reduxjs/toolkit'
-import { readToken, readUser, writeAuth, clearAuth, isTokenExpired } from '../../services/storage'
+import { readToken, readRefreshToken, readUser, writeAuth, clearAuth, isTokenExpired } from '../../services/storage'
 
 const storedUser = readUser()
 const storedToken = readToken()
 const tokenExpired = isTokenExpired(storedToken)
-const computedAuthenticated = !!storedToken && !!storedUser && !tokenExpired
+// An expired access token is fine while a refresh token can replace it
+const canRefresh = !!readRefreshToken()
+const computedAuthenticated = !!storedToken && !!storedUser && (!tokenExpired || canRefresh)
 
 if (!computedAuthenticated && (storedToken || storedUser)) {
   clearAuth()
@@ -32,7 +34,7 @@ const authSlice = createSlice({
       state.user = action.payload.user
       state.token = action.payload.token
       state.isAuthenticated = true
-      writeAuth(action.payload.user, action.payload.token)
+      writeAuth(action.payload.user, action.payload.token, action.payload.refreshToken)
       console.log('Auth state updated:', {
         hasUser: !!state.user,
         hasToken: !!state.token,
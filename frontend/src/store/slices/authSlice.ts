@@ -1,5 +1,5 @@
 import { createSlice, PayloadAction } from '@reduxjs/toolkit'
-import { readToken, readUser, writeAuth, clearAuth, isTokenExpired } from '../../services/storage'
+import { readToken, readRefreshToken, readUser, writeAuth, clearAuth, isTokenExpired } from '../../services/storage'
 
 interface User {
   id: string
@@ -21,7 +21,9 @@ interface AuthState {
 const storedUser = readUser<User>()
 const storedToken = readToken()
 const tokenExpired = isTokenExpired(storedToken)
-const computedAuthenticated = !!storedToken && !!storedUser && !tokenExpired
+// An expired access token is fine while a refresh token can replace it
+const canRefresh = !!readRefreshToken()
+const computedAuthenticated = !!storedToken && !!storedUser && (!tokenExpired || canRefresh)
 
 if (!computedAuthenticated && (storedToken || storedUser)) {
   clearAuth()
@@ -46,13 +48,13 @@ const authSlice = createSlice({
   reducers: {
     setCredentials: (
       state,
-      action: PayloadAction<{ user: User; token: string }>
+      action: PayloadAction<{ user: User; token: string; refreshToken?: string }>
     ) => {
       console.log('setCredentials called with:', action.payload)
       state.user = action.payload.user
       state.token = action.payload.token
       state.isAuthenticated = true
-      writeAuth(action.payload.user, action.payload.token)
+      writeAuth(action.payload.user, action.payload.token, action.payload.refreshToken)
       console.log('Auth state updated:', {
         hasUser: !!state.user,
         hasToken: !!state.token,